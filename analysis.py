@@ -75,14 +75,21 @@ class PegasusAnalyzer:
         
         print(f"\n[3/4] Processing up to {max_frames} frames...")
         
+        # Re-analysing the same video reuses its cached tracked detections
+        frame_limit = min(max_frames, total_frames)
+        cache = self.detector.open_detection_cache(video_path, frames=frame_limit)
+        
         frame_idx = 0
-        while frame_idx < min(max_frames, total_frames):
+        while frame_idx < frame_limit:
             ret, frame = cap.read()
             if not ret:
                 break
             
             # Process frame
-            processed_frame, events, telemetry = self.detector.process_frame(frame, verbose=False)
+            cached = cache.results(frame_idx) if cache else None
+            processed_frame, events, telemetry = self.detector.process_frame(frame, verbose=False, context_results=cached)
+            if cache:
+                cache.record(self.detector.last_results)
             
             # Collect metrics
             metrics['frames_processed'] += 1
@@ -100,6 +107,8 @@ class PegasusAnalyzer:
             frame_idx += 1
         
         cap.release()
+        if cache:
+            cache.close(complete=frame_idx >= total_frames)
         
         # Compute averages
         if metrics['frames_processed'] > 0:
@@ -0,0 +1,350 @@
+"""
+PEGASUS Background Jobs
+Video processing runs in a bounded pool of worker processes, each with its own
+detector, pulling jobs from a persistent SQLite queue (data/jobs.db). The API
+only inserts and reads job rows, so the event loop never blocks on a video and
+concurrent uploads spread across cores. Jobs interrupted by a restart are
+re-queued on startup.
+"""
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import cv2
+
+JOB_STATES = ('queued', 'running', 'completed', 'failed', 'cancelled')
+FINAL_STATES = ('completed', 'failed', 'cancelled')
+
+class JobCancelled(Exception):
+    pass
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+class JobStore:
+    """SQLite-backed job queue; safe to share between the API process and the workers"""
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000"
+    )
+    COLUMNS = ('id', 'kind', 'status', 'filename', 'input_path', 'params', 'progress', 'frames_done',
+               'total_frames', 'result', 'error', 'worker', 'cancel_requested', 'created_at', 'started_at',
+               'finished_at', 'content_hash')
+
+    def __init__(self, db_path="data/jobs.db"):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    filename TEXT,
+                    input_path TEXT,
+                    params TEXT,
+                    progress REAL DEFAULT 0,
+                    frames_done INTEGER DEFAULT 0,
+                    total_frames INTEGER DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    worker TEXT,
+                    cancel_requested INTEGER DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    content_hash TEXT
+                )
+            ''')
+            # Job stores created before uploads were content-addressed
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+            if 'content_hash' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN content_hash TEXT')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_content_hash ON jobs(content_hash)')
+
+    def _connect(self):
+        # Short-lived connections: jobs are touched a few times per second at most
+        conn = sqlite3.connect(self.db_path, timeout=5.0)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _row(self, row):
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job['params'] = json.loads(job['params']) if job['params'] else {}
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def submit(self, kind, filename, input_path, params=None, content_hash=None):
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn, conn:
+            conn.execute('INSERT INTO jobs (id, kind, status, filename, input_path, params, created_at, content_hash) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         (job_id, kind, 'queued', filename, input_path, json.dumps(params or {}), _now(), content_hash))
+        return self.get(job_id)
+
+    def find_by_hash(self, content_hash, kind="process_video") -> Optional[Dict[str, Any]]:
+        """Newest queued, running or completed job for the same input content"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(f'SELECT {", ".join(self.COLUMNS)} FROM jobs WHERE content_hash = ? AND kind = ? '
+                               "AND status IN ('queued', 'running', 'completed') "
+                               'ORDER BY created_at DESC, rowid DESC LIMIT 1', (content_hash, kind)).fetchone()
+        return self._row(row)
+
+    def get(self, job_id) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(f'SELECT {", ".join(self.COLUMNS)} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row(row)
+
+    def list(self, limit=50, status=None) -> List[Dict[str, Any]]:
+        query = f'SELECT {", ".join(self.COLUMNS)} FROM jobs'
+        params = []
+        if status:
+            query += ' WHERE status = ?'
+            params.append(status)
+        query += ' ORDER BY created_at DESC, rowid DESC LIMIT ?'
+        params.append(limit)
+        with closing(self._connect()) as conn:
+            return [self._row(r) for r in conn.execute(query, params).fetchall()]
+
+    def claim(self, worker) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest queued job"""
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at, rowid LIMIT 1").fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', worker = ?, started_at = ? WHERE id = ?",
+                         (worker, _now(), row[0]))
+            conn.commit()
+        return self.get(row[0])
+
+    def update_progress(self, job_id, frames_done, total_frames) -> bool:
+        """Record progress; returns True if cancellation was requested"""
+        progress = min(100.0, frames_done / total_frames * 100) if total_frames else 0.0
+        with closing(self._connect()) as conn, conn:
+            conn.execute('UPDATE jobs SET frames_done = ?, total_frames = ?, progress = ? WHERE id = ?',
+                         (frames_done, total_frames, round(progress, 1), job_id))
+            row = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def finish(self, job_id, status, result=None, error=None):
+        with closing(self._connect()) as conn, conn:
+            conn.execute('UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, '
+                         'progress = CASE WHEN ? = \'completed\' THEN 100 ELSE progress END WHERE id = ?',
+                         (status, json.dumps(result) if result is not None else None, error, _now(), status, job_id))
+
+    def request_cancel(self, job_id) -> Optional[Dict[str, Any]]:
+        """Queued jobs are cancelled at once; running ones stop at their next progress update"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                         (_now(), job_id))
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        return self.get(job_id)
+
+    def requeue_running(self) -> int:
+        """Jobs left 'running' by a crashed/stopped server start over"""
+        with closing(self._connect()) as conn, conn:
+            cur = conn.execute("UPDATE jobs SET status = 'queued', worker = NULL, started_at = NULL, frames_done = 0, "
+                               "progress = 0 WHERE status = 'running' AND cancel_requested = 0")
+            conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE status = 'running'", (_now(),))
+        return cur.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: n for status, n in rows}
+
+def process_video(detector, file_path, filename, output_filename, output_dir="output", progress=None,
+                  progress_every=30, video_hash=None):
+    """
+    Run the detector over a whole video and write the annotated copy.
+    progress(frames_done, total_frames) is called every `progress_every` frames;
+    returning True cancels the job (JobCancelled). Tracked detections come from
+    the detector's cache when this content (video_hash) was processed before.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    cap = cv2.VideoCapture(file_path)
+    if not cap.isOpened():
+        raise RuntimeError("Could not open video")
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps_v = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    detector.begin_source(filename, fps_v)
+
+    output_path = os.path.join(output_dir, output_filename)
+    # Video writer - CRITICAL: Use H.264 codec for browser compatibility
+    fourcc = cv2.VideoWriter_fourcc(*'avc1')  # H.264 - browser compatible
+    out = cv2.VideoWriter(output_path, fourcc, fps_v, (width, height))
+
+    frame_idx = 0
+    violation_count = 0
+    first_frame = None
+    best_observation_frame = None
+    min_recorded_dist = 99999.0
+    cache = detector.open_detection_cache(file_path, video_hash=video_hash)
+    finished = False
+
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                finished = True
+                break
+
+            if first_frame is None:
+                first_frame = frame.copy()
+
+            # Process with ML (cached detections skip inference)
+            cached = cache.results(frame_idx) if cache else None
+            processed_frame, events, telemetry = detector.process_frame(frame, verbose=False, context_results=cached)
+            if cache:
+                cache.record(detector.last_results)
+            violation_count += len(events)
+
+            # Track frame with closest proximity for forced incident fallback
+            p_dist = telemetry.get('min_proximity')
+            if p_dist is not None and p_dist < min_recorded_dist:
+                min_recorded_dist = p_dist
+                best_observation_frame = frame.copy()
+
+            out.write(processed_frame)
+            frame_idx += 1
+
+            if frame_idx % progress_every == 0:
+                print(f"  Progress: {frame_idx / max(total_frames, 1) * 100:.1f}% ({frame_idx}/{total_frames} frames) "
+                      f"[Min Prox: {min_recorded_dist}]")
+                if progress is not None and progress(frame_idx, total_frames):
+                    raise JobCancelled()
+
+        # MANDATORY EVIDENCE: If no violations found, capture a "Safety Observation"
+        # Preference: 1. Frame where vehicles were closest, 2. First frame
+        capture_frame = best_observation_frame if best_observation_frame is not None else first_frame
+        if violation_count == 0 and capture_frame is not None:
+            print(f"💡 No violations found. Capturing 'Safety Observation' (Min Dist: {min_recorded_dist})")
+            # Same scene as earlier uploads from this camera -> linked, not re-encoded
+            detector.evidence_pipeline.submit(capture_frame, "safety_observation", None,
+                                              vehicle_id="proximity_check", camera_id=detector.camera_id)
+            violation_count = 1
+    finally:
+        cap.release()
+        out.release()
+        detector.clip_recorder.flush() # Close open clips + write event index
+        if cache:
+            cache.close(complete=finished)
+
+    if progress is not None:
+        progress(frame_idx, total_frames)
+    print(f"✓ Processing complete: {output_path}")
+    return {
+        "filename": filename,
+        "output_filename": output_filename,
+        "output_path": f"/{output_dir}/{output_filename}",
+        "frames_processed": frame_idx,
+        "violations_detected": violation_count
+    }
+
+def _worker_main(db_path, worker_index, stop_event, torch_threads, poll_interval=0.5):
+    """Worker process: one detector, jobs run one at a time"""
+    try:
+        import torch
+        torch.set_num_threads(torch_threads) # Workers share the cores instead of oversubscribing them
+    except ImportError:
+        pass
+    from src.detector import TrafficViolationDetector
+
+    name = f"worker-{worker_index}"
+    store = JobStore(db_path)
+    # Own event log: EventLog has a single writer per directory
+    detector = TrafficViolationDetector(event_log_root=os.path.join(JobManager.WORKER_EVENT_LOG_ROOT, str(worker_index)))
+    print(f"SYSTEM: Job {name} ready (pid {os.getpid()}).")
+
+    while not stop_event.is_set():
+        job = store.claim(name)
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+
+        print(f"🔄 {name}: processing job {job['id']} ({job['filename']})")
+        detector.reset()
+        try:
+            result = process_video(detector, job['input_path'], job['filename'], job['params']['output_filename'],
+                                   progress=lambda done, total: store.update_progress(job['id'], done, total),
+                                   video_hash=job['content_hash'])
+            store.finish(job['id'], 'completed', result=result)
+        except JobCancelled:
+            print(f"⏹ {name}: job {job['id']} cancelled")
+            store.finish(job['id'], 'cancelled')
+        except Exception as e:
+            print(f"ERROR: {name}: job {job['id']} failed: {e}")
+            store.finish(job['id'], 'failed', error=str(e))
+
+    detector.finalize(None)
+
+class JobManager:
+    """Owns the job store and the worker processes (started/stopped with the API)"""
+    WORKER_EVENT_LOG_ROOT = "data/event_log/workers"
+
+    def __init__(self, db_path="data/jobs.db", workers=None):
+        self.db_path = db_path
+        self.store = JobStore(db_path)
+        cpus = os.cpu_count() or 2
+        # Each worker holds a model + decoder + encoder; default to half the cores, at most 4
+        self.num_workers = workers or int(os.environ.get("PEGASUS_JOB_WORKERS", 0)) or max(1, min(4, cpus // 2))
+        self.torch_threads = max(1, cpus // self.num_workers)
+        self._ctx = mp.get_context('spawn') # No forked CUDA/torch state
+        self._stop = self._ctx.Event()
+        self._processes: List[Optional[mp.Process]] = [None] * self.num_workers
+
+    def start(self):
+        requeued = self.store.requeue_running()
+        if requeued:
+            print(f"SYSTEM: Re-queued {requeued} interrupted job(s).")
+        self.ensure_workers()
+
+    def ensure_workers(self):
+        """(Re)start any worker that is not running"""
+        for i, proc in enumerate(self._processes):
+            if proc is None or not proc.is_alive():
+                proc = self._ctx.Process(target=_worker_main, args=(self.db_path, i, self._stop, self.torch_threads),
+                                         name=f"pegasus-job-worker-{i}", daemon=True)
+                proc.start()
+                self._processes[i] = proc
+
+    def stop(self, timeout=10.0):
+        self._stop.set()
+        deadline = time.time() + timeout
+        for proc in self._processes:
+            if proc is not None:
+                proc.join(max(0.0, deadline - time.time()))
+                if proc.is_alive():
+                    proc.terminate()
+
+    def submit(self, kind, filename, input_path, params=None, content_hash=None):
+        job = self.store.submit(kind, filename, input_path, params, content_hash)
+        self.ensure_workers()
+        return job
+
+    def event_log_roots(self):
+        return [os.path.join(self.WORKER_EVENT_LOG_ROOT, str(i)) for i in range(self.num_workers)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.num_workers,
+            "alive": sum(1 for p in self._processes if p is not None and p.is_alive()),
+            "jobs": self.store.counts()
+        }
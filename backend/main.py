@@ -2,18 +2,29 @@
 PEGASUS FastAPI Backend - Video Processing API
 Run with: uvicorn backend.main:app --reload
 """
-from fastapi import FastAPI, UploadFile, File, WebSocket
+from fastapi import FastAPI, UploadFile, File, WebSocket, WebSocketDisconnect, Query, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
-import cv2
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 import os
 import sys
+import json
+import time
 from pathlib import Path
+from typing import Optional
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.detector import TrafficViolationDetector
+from src.detector_pool import DetectorPool
+from src.services.live_source import LiveSourceManager
+from src.services.retention_service import RetentionJob, RetentionPolicy
+from src.services.event_log import EventLog, merge_counts, merge_histograms
+from src.utils.database import normalize_timestamp
+from backend.jobs import JobManager
+from backend.uploads import save_upload
+from backend.streaming import StreamHub
+from backend.telemetry_codec import make_encoder
 
 app = FastAPI(title="PEGASUS City Defense API")
 
@@ -29,32 +40,51 @@ app.add_middleware(
 # Global detector instance
 detector = TrafficViolationDetector()
 
+# Evidence retention: TTLs, archive tier, incremental vacuum (throttled background thread)
+retention_job = RetentionJob(detector.db, RetentionPolicy())
+retention_job.start()
+
+# Video processing jobs: persistent queue + worker processes with their own detectors
+job_manager = JobManager()
+
+# Detector sessions for concurrent streams: shared weights/pipeline, isolated tracker and heads
+detector_pool = DetectorPool(detector)
+
+# WebSocket processing streams (detectors run on executor threads, viewers coalesce)
+stream_hub = StreamHub(detector_pool)
+
+# Live cameras/streams: reader thread per source keeps only the newest frame
+live_sources = LiveSourceManager()
+
+@app.on_event("startup")
+def start_job_workers():
+    job_manager.start()
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    job_manager.stop()
+    live_sources.close()
+    stream_hub.close()
+    detector_pool.close()
+
 @app.get("/")
 def root():
     return {"status": "PEGASUS System Online", "version": "4.0"}
 
 @app.post("/api/upload")
 async def upload_video(file: UploadFile = File(...)):
-    """Upload and process video"""
+    """Upload a video (streamed to disk, stored by content hash)"""
     try:
-        # Save uploaded file
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        file_path = os.path.join(upload_dir, file.filename)
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        print(f"✓ Video saved: {file_path}")
-        
-        # Reset detector for new video
-        detector.reset()
+        upload = await save_upload(file)
+        print(f"✓ Video saved: {upload['path']}" + (" (already stored)" if upload['duplicate'] else ""))
         
         return {
             "status": "success",
-            "filename": file.filename,
-            "path": file_path,
+            "filename": upload['filename'],
+            "original_filename": upload['original_filename'],
+            "path": upload['path'],
+            "sha256": upload['sha256'],
+            "size": upload['size'],
             "message": "Video uploaded successfully. Ready for processing."
         }
     except Exception as e:
@@ -63,190 +93,290 @@ async def upload_video(file: UploadFile = File(...)):
             content={"status": "error", "message": str(e)}
         )
 
-@app.post("/api/process-now")
+def _output_exists(result):
+    return result is not None and os.path.exists(result['output_path'].lstrip('/'))
+
+@app.post("/api/process-now", status_code=202)
 async def process_video_now(file: UploadFile = File(...)):
-    """Upload and IMMEDIATELY process video with ML detection"""
+    """
+    Upload a video and queue it for ML processing. Returns a job id at once;
+    poll /api/jobs/{job_id} for progress and fetch /api/jobs/{job_id}/result.
+    Content that was already processed returns the cached result (200) instead,
+    and content that is already queued/running returns that job.
+    """
     try:
-        # Save uploaded file
-        upload_dir = "uploads"
-        output_dir = "output"
-        os.makedirs(upload_dir, exist_ok=True)
-        os.makedirs(output_dir, exist_ok=True)
-        
-        file_path = os.path.join(upload_dir, file.filename)
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        print(f"✓ Video uploaded: {file_path}")
-        print(f"🔄 Processing with ML detection...")
-        
-        # Reset detector
-        detector.reset()
-        
-        # Process video with ML
-        cap = cv2.VideoCapture(file_path)
-        if not cap.isOpened():
-            return JSONResponse(
-                status_code=500,
-                content={"status": "error", "message": "Could not open video"}
-            )
-        
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps_v = cap.get(cv2.CAP_PROP_FPS)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        
-        # Output path
-        output_filename = f"detected_{file.filename}"
-        output_path = os.path.join(output_dir, output_filename)
-        
-        # Video writer - CRITICAL: Use H.264 codec for browser compatibility
-        fourcc = cv2.VideoWriter_fourcc(*'avc1')  # H.264 - browser compatible
-        out = cv2.VideoWriter(output_path, fourcc, fps_v, (width, height))
-        
-        frame_idx = 0
-        violation_count = 0
-        first_frame = None
-        best_observation_frame = None
-        min_recorded_dist = 99999.0
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            if first_frame is None:
-                first_frame = frame.copy()
-            
-            # Process with ML
-            processed_frame, events, telemetry = detector.process_frame(frame, verbose=False)
-            violation_count += len(events)
-            
-            # Track frame with closest proximity for forced incident fallback
-            p_dist = telemetry.get('min_proximity')
-            if p_dist is not None and p_dist < min_recorded_dist:
-                min_recorded_dist = p_dist
-                best_observation_frame = frame.copy()
-            
-            # Write processed frame
-            out.write(processed_frame)
-            
-            frame_idx += 1
-            
-            # Progress logging
-            if frame_idx % 30 == 0:
-                progress = (frame_idx / total_frames) * 100
-                print(f"  Progress: {progress:.1f}% ({frame_idx}/{total_frames} frames) [Min Prox: {min_recorded_dist}]")
-        
-        # MANDATORY EVIDENCE: If no violations found, capture a "Safety Observation"
-        # Preference: 1. Frame where vehicles were closest, 2. First frame
-        capture_frame = best_observation_frame if best_observation_frame is not None else first_frame
-        
-        if violation_count == 0 and capture_frame is not None:
-            print(f"💡 No violations found. Capturing 'Safety Observation' (Min Dist: {min_recorded_dist})")
-            from src.visualization import capture_violation_evidence
-            capture_violation_evidence(capture_frame, "safety_observation", None, vehicle_id="proximity_check", output_dir="data/evidence")
-            violation_count = 1
-
-        cap.release()
-        out.release()
-        
-        print(f"✓ Processing complete: {output_path}")
-        
+        upload = await save_upload(file)
+
+        # Same bytes as an earlier upload: reuse its job / output
+        previous = job_manager.store.find_by_hash(upload['sha256'])
+        if previous is not None and previous['status'] == 'completed' and _output_exists(previous['result']):
+            print(f"✓ Cached result for {upload['original_filename']} (job {previous['id']})")
+            return JSONResponse(status_code=200, content={
+                "status": "completed", "cached": True, "job_id": previous['id'], **previous['result'],
+                "message": "Identical video already processed"
+            })
+        if previous is not None and previous['status'] in ('queued', 'running'):
+            job = previous
+        else:
+            job = job_manager.submit("process_video", upload['original_filename'], upload['path'],
+                                     params={"output_filename": f"detected_{upload['filename']}"},
+                                     content_hash=upload['sha256'])
+        print(f"✓ Video uploaded: {upload['path']} -> job {job['id']}")
         return {
-            "status": "success",
-            "filename": file.filename,
-            "output_filename": output_filename,
-            "output_path": f"/{output_dir}/{output_filename}",
-            "frames_processed": frame_idx,
-            "violations_detected": violation_count,
-            "message": "Video processed successfully with ML detection"
+            "status": job['status'],
+            "cached": job is previous,
+            "job_id": job['id'],
+            "filename": upload['original_filename'],
+            "sha256": upload['sha256'],
+            "status_url": f"/api/jobs/{job['id']}",
+            "result_url": f"/api/jobs/{job['id']}/result",
+            "message": "Video queued for ML processing"
         }
-        
+
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"status": "error", "message": str(e)}
         )
 
+def _job_not_found(job_id):
+    return JSONResponse(status_code=404, content={"status": "error", "message": f"Job not found: {job_id}"})
 
-@app. websocket("/ws/process/{filename}")
-async def process_video_stream(websocket: WebSocket, filename: str):
-    """Process video and stream results via WebSocket"""
+@app.get("/api/jobs")
+def list_jobs(limit: int = Query(50, ge=1, le=500), status: Optional[str] = None):
+    """Recent jobs, newest first"""
+    jobs = job_manager.store.list(limit=limit, status=status)
+    return {"jobs": jobs, "count": len(jobs)}
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """Job status and progress (queued / running / completed / failed / cancelled)"""
+    job = job_manager.store.get(job_id)
+    return job if job is not None else _job_not_found(job_id)
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """Cancel a queued job, or stop a running one at its next progress update"""
+    job = job_manager.store.request_cancel(job_id)
+    return job if job is not None else _job_not_found(job_id)
+
+@app.get("/api/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    """Result of a completed job (409 while it is still queued/running)"""
+    job = job_manager.store.get(job_id)
+    if job is None:
+        return _job_not_found(job_id)
+    if job['status'] != 'completed':
+        return JSONResponse(status_code=409, content={"status": job['status'], "error": job['error'],
+                                                      "message": f"Job is {job['status']}"})
+    return {"status": "success", "job_id": job_id, **job['result']}
+
+
+async def _accept_stream(websocket: WebSocket):
+    """Accept and negotiate the wire format (?format=msgpack, see telemetry_codec)"""
     await websocket.accept()
-    
+    requested = websocket.query_params.get("format")
+    encoder = make_encoder(requested)
+    if requested is not None:
+        await websocket.send_json(encoder.hello())
+    return encoder
+
+async def _pump(websocket: WebSocket, key: str, channel, encoder):
+    """Send the channel's messages until the stream ends or the client leaves"""
+    send = websocket.send_bytes if encoder.binary else websocket.send_text
     try:
-        video_path = os.path.join("uploads", filename)
-        
-        if not os.path.exists(video_path):
-            await websocket.send_json({
-                "type": "error",
-                "message": f"Video not found: {filename}"
-            })
-            return
-        
-        cap = cv2.VideoCapture(video_path)
-        frame_count = 0
-        
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
+        while True:
+            message = await channel.get()
+            if message is None:
                 break
-            
-            # Process frame
-            processed_frame, events, telemetry = detector.process_frame(frame, verbose=False)
-            
-            # Send telemetry
-            await websocket.send_json({
-                "type": "telemetry",
-                "frame": frame_count,
-                "data": telemetry
-            })
-            
-            # Send events
-            if events:
-                for event in events:
-                    await websocket.send_json({
-                        "type": "event",
-                        "data": event
-                    })
-            
-            frame_count += 1
-            
-        cap.release()
-        
-        # Send completion
-        await websocket.send_json({
-            "type": "complete",
-            "total_frames": frame_count,
-            "message": "Processing complete"
-        })
-        
+            t0 = time.monotonic()
+            payload = encoder.encode(message)
+            t1 = time.monotonic()
+            await send(payload)
+            channel.record_send(time.monotonic() - t1, len(payload), t1 - t0)
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
+        try:
+            await websocket.send_json({"type": "error", "message": str(e)})
+        except Exception:
+            pass
+    finally:
+        stream_hub.unsubscribe(key, channel)
+        try:
+            await websocket.close()
+        except Exception:
+            pass # Already closed by the client
+
+@app.websocket("/ws/process/{filename}")
+async def process_video_stream(websocket: WebSocket, filename: str):
+    """
+    Process video and stream results via WebSocket. Processing runs off the event
+    loop; each message carries the latest telemetry plus the events of every frame
+    since the previous message ("skipped_frames" counts coalesced frames).
+    ?format=msgpack selects the compact binary delta format (see telemetry_codec);
+    with a ?format the first message is a JSON "hello" naming the negotiated one.
+    """
+    encoder = await _accept_stream(websocket)
+    
+    video_path = os.path.join("uploads", os.path.basename(filename))
+    if not os.path.exists(video_path):
         await websocket.send_json({
             "type": "error",
-            "message": str(e)
+            "message": f"Video not found: {filename}"
         })
-    finally:
         await websocket.close()
+        return
+    
+    channel = stream_hub.subscribe(filename, video_path, encoder.name)
+    await _pump(websocket, filename, channel, encoder)
+
+# --- Live sources (cameras / streams) ---
+
+@app.post("/api/sources", status_code=201)
+def register_source(source_id: str = Query(..., min_length=1, max_length=64), url: str = Query(...),
+                    weight: float = Query(1.0, gt=0), min_fps: Optional[float] = Query(None, ge=0)):
+    """
+    Start ingesting a live source: rtsp/http URL, device index, replay:<uploaded file>
+    (real-time file stand-in) or loopback[:WxH@FPS] (synthetic frames). weight and
+    min_fps set its share of the scheduled inference (/ws/live).
+    """
+    if url.startswith("replay:"):
+        url = "replay:" + os.path.join("uploads", os.path.basename(url[len("replay:"):]))
+        if not os.path.exists(url[len("replay:"):]):
+            return JSONResponse(status_code=404, content={"status": "error", "message": f"Video not found: {url}"})
+    try:
+        source = live_sources.register(source_id, url, weight=weight, min_fps=min_fps)
+    except ValueError as e:
+        return JSONResponse(status_code=409, content={"status": "error", "message": str(e)})
+    return source.stats()
+
+@app.get("/api/sources")
+def list_sources():
+    """Registered live sources with capture, drop, reconnect and latency counters"""
+    return {"sources": live_sources.stats()}
+
+@app.delete("/api/sources/{source_id}")
+def unregister_source(source_id: str):
+    """Stop a live source (its processing stream completes)"""
+    if not live_sources.unregister(source_id):
+        return JSONResponse(status_code=404, content={"status": "error", "message": f"Source not found: {source_id}"})
+    return {"status": "success", "source_id": source_id}
+
+@app.websocket("/ws/live/{source_id}")
+async def process_live_stream(websocket: WebSocket, source_id: str):
+    """Process the newest frames of a registered live source (same messages as /ws/process)"""
+    encoder = await _accept_stream(websocket)
+    source = live_sources.get(source_id)
+    if source is None:
+        await websocket.send_json({"type": "error", "message": f"Source not found: {source_id}"})
+        await websocket.close()
+        return
+    channel = stream_hub.subscribe_live(source, encoder.name)
+    await _pump(websocket, StreamHub.live_key(source_id), channel, encoder)
+
+def _evidence_links(record):
+    record['image_url'] = f"/api/evidence/{record['id']}/image"
+    record['thumbnail_url'] = f"/api/evidence/{record['id']}/thumbnail"
+    return record
+
+def _time_range(since: Optional[str] = None, until: Optional[str] = None):
+    """since/until of the history endpoints, parsed once (422 instead of a 500 or a string comparison)"""
+    try:
+        return (normalize_timestamp(since) if since else None, normalize_timestamp(until) if until else None)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def _ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
 
 @app.get("/api/evidence")
-def get_evidence():
-    """Get all evidence snapshots"""
-    evidence_dir = "data/evidence"
-    
-    if not os.path.exists(evidence_dir):
-        return {"evidence": []}
-    
-    files = [f for f in os.listdir(evidence_dir) if f.endswith('.jpg')]
+def get_evidence(limit: int = Query(50, ge=1, le=500), cursor: Optional[int] = None,
+                 type: Optional[str] = None, vehicle_id: Optional[str] = None,
+                 camera: Optional[str] = None, time_range: tuple = Depends(_time_range)):
+    """
+    Evidence metadata, newest first. Keyset-paginated: pass `next_cursor` from
+    the previous page as `cursor`. Images are served by id from the evidence store.
+    """
+    since, until = time_range
+    records, next_cursor = detector.db.query_evidence(
+        limit=limit, cursor=cursor, violation_type=type, vehicle_id=vehicle_id,
+        camera_id=camera, since=since, until=until
+    )
     
     return {
-        "evidence": files,
-        "count": len(files),
-        "directory": evidence_dir
+        "evidence": [_evidence_links(r) for r in records],
+        "count": len(records),
+        "next_cursor": next_cursor
     }
 
+@app.get("/api/evidence/export")
+def export_evidence(type: Optional[str] = None, vehicle_id: Optional[str] = None,
+                    camera: Optional[str] = None, time_range: tuple = Depends(_time_range)):
+    """Stream all matching evidence metadata as NDJSON"""
+    since, until = time_range
+    rows = detector.db.iter_evidence(violation_type=type, vehicle_id=vehicle_id, camera_id=camera, since=since, until=until)
+    return StreamingResponse(_ndjson(_evidence_links(r) for r in rows), media_type="application/x-ndjson")
+
+@app.get("/api/evidence/{evidence_id}/image")
+def get_evidence_image(evidence_id: int):
+    """Full-resolution evidence image"""
+    image_bytes = detector.db.get_evidence_image(evidence_id)
+    if image_bytes is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Evidence not found"})
+    return Response(content=image_bytes, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/api/evidence/{evidence_id}/thumbnail")
+def get_evidence_thumbnail(evidence_id: int):
+    """Small thumbnail for list/vault views"""
+    thumb_bytes = detector.db.get_evidence_thumbnail(evidence_id)
+    if thumb_bytes is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Thumbnail not found"})
+    return Response(content=thumb_bytes, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/api/incidents")
+def get_incidents(limit: int = Query(50, ge=1, le=500), cursor: Optional[int] = None,
+                  type: Optional[str] = None, vehicle_id: Optional[str] = None,
+                  camera: Optional[str] = None, time_range: tuple = Depends(_time_range)):
+    """Persisted violation events (START/END), newest first, keyset-paginated"""
+    since, until = time_range
+    incidents, next_cursor = detector.db.query_incidents(
+        limit=limit, cursor=cursor, event_type=type, vehicle_id=vehicle_id,
+        camera_id=camera, since=since, until=until
+    )
+    return {
+        "incidents": incidents,
+        "count": len(incidents),
+        "next_cursor": next_cursor
+    }
+
+@app.get("/api/incidents/export")
+def export_incidents(type: Optional[str] = None, vehicle_id: Optional[str] = None,
+                     camera: Optional[str] = None, time_range: tuple = Depends(_time_range)):
+    """Stream all matching incidents as NDJSON"""
+    since, until = time_range
+    rows = detector.db.iter_incidents(event_type=type, vehicle_id=vehicle_id, camera_id=camera, since=since, until=until)
+    return StreamingResponse(_ndjson(rows), media_type="application/x-ndjson")
+
+@app.get("/api/analytics/events")
+def event_analytics(type: Optional[str] = None, camera: Optional[str] = None,
+                    bucket_seconds: Optional[int] = Query(None, ge=60), time_range: tuple = Depends(_time_range)):
+    """
+    Historical event counts from the event log (only segments overlapping the range are read).
+    `type` accepts a comma-separated list; with bucket_seconds a time histogram is returned.
+    """
+    since, until = time_range
+    types = type.split(',') if type else None
+    # Live log plus read-only snapshots of the job workers' logs
+    logs = [detector.event_log] + [EventLog(root, readonly=True) for root in job_manager.event_log_roots()
+                                   if os.path.exists(root)]
+    if bucket_seconds:
+        return {"buckets": merge_histograms(log.histogram(bucket_seconds, since=since, until=until,
+                                                          types=types, camera_id=camera) for log in logs)}
+    return {"counts": merge_counts(log.count_by_type(since=since, until=until, types=types, camera_id=camera)
+                                   for log in logs)}
+
 @app.get("/api/stats")
 def get_stats():
     """Get current detection statistics"""
@@ -254,7 +384,14 @@ def get_stats():
         "detector_status": "active",
         "fps": detector.last_avg_speed if hasattr(detector, 'last_avg_speed') else 0,
         "safety_index": detector.last_safety_index if hasattr(detector, 'last_safety_index') else 100,
-        "violations_logged": len(detector.violation_log) if hasattr(detector, 'violation_log') else 0
+        "violations_logged": len(detector.violation_log) if hasattr(detector, 'violation_log') else 0,
+        "retention": retention_job.last_run,
+        "jobs": job_manager.stats(),
+        "streams": stream_hub.stats(),
+        "live_sources": live_sources.stats(),
+        "scheduler": stream_hub.live_inference.stats(), # Achieved fps per live camera
+        "detection_cache": detector.detection_cache.stats(),
+        "memory": detector.memory_stats()
     }
 
 # Serve static files (processed videos)
@@ -0,0 +1,309 @@
+"""
+PEGASUS Live Processing Streams
+/ws/process/{filename} viewers subscribe to a ProcessingStream: the video is
+decoded and run through its own detector session (DetectorPool: shared weights,
+isolated tracker/heads) on the hub's executor threads, never on the event loop,
+and one stream per file is shared by all of its viewers. Live cameras
+(/ws/live) share one scheduled inference thread (InferenceScheduler).
+Every viewer has its own ViewerChannel that keeps only the latest telemetry
+and batches the events of the frames it has not sent yet, so a slow client
+only sees fewer (coalesced) updates - it never slows processing or the API.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+import cv2
+
+from src.services.inference_scheduler import ScheduledInference
+
+class ViewerChannel:
+    """Per-connection send slot: latest telemetry + pending events, with backpressure counters"""
+    def __init__(self, max_events=500, wire_format="json"):
+        self.max_events = max_events
+        self.wire_format = wire_format
+        self._ready = asyncio.Event()
+        self._frame = None
+        self._telemetry = None
+        self._events = []
+        self._final = None
+        self._pending_since = None # Monotonic time of the oldest unsent update
+        self._skipped = 0 # Frames coalesced into the pending update
+        self.closed = False
+
+        self.frames_published = 0
+        self.frames_sent = 0
+        self.frames_coalesced = 0
+        self.events_sent = 0
+        self.events_dropped = 0
+        self.send_seconds = 0.0
+        self.max_send_seconds = 0.0
+        self.encode_seconds = 0.0
+        self.bytes_sent = 0
+        self.max_queue_delay = 0.0
+
+    def push(self, frame, telemetry, events):
+        """New frame result (event loop thread); replaces unsent telemetry, appends events"""
+        if self._telemetry is not None:
+            self.frames_coalesced += 1
+            self._skipped += 1
+        else:
+            self._pending_since = time.monotonic()
+        self._frame, self._telemetry = frame, telemetry
+        self._events.extend(events)
+        overflow = len(self._events) - self.max_events
+        if overflow > 0: # Viewer far behind: oldest events go first
+            del self._events[:overflow]
+            self.events_dropped += overflow
+        self.frames_published += 1
+        self._ready.set()
+
+    def finish(self, message):
+        """Terminal message (complete/error), sent after any pending update"""
+        self._final = message
+        self._ready.set()
+
+    async def get(self):
+        """Next message to send, or None once the final message was delivered"""
+        while not self.closed:
+            await self._ready.wait()
+            self._ready.clear()
+            if self._telemetry is not None:
+                self.max_queue_delay = max(self.max_queue_delay, time.monotonic() - self._pending_since)
+                message = {
+                    "type": "telemetry",
+                    "frame": self._frame,
+                    "data": self._telemetry,
+                    "events": self._events,
+                    "skipped_frames": self._skipped
+                }
+                self.frames_sent += 1
+                self.events_sent += len(self._events)
+                self._telemetry, self._events, self._skipped = None, [], 0
+                if self._final is not None:
+                    self._ready.set()
+                return message
+            if self._final is not None:
+                self.closed = True
+                message, self._final = self._final, None
+                message["backpressure"] = self.stats()
+                return message
+        return None
+
+    def record_send(self, seconds, nbytes=0, encode_seconds=0.0):
+        self.send_seconds += seconds
+        self.bytes_sent += nbytes
+        self.encode_seconds += encode_seconds
+        self.max_send_seconds = max(self.max_send_seconds, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        sent = self.frames_sent
+        return {
+            "format": self.wire_format,
+            "frames_published": self.frames_published,
+            "frames_sent": self.frames_sent,
+            "frames_coalesced": self.frames_coalesced,
+            "events_sent": self.events_sent,
+            "events_dropped": self.events_dropped,
+            "avg_send_ms": round(self.send_seconds / sent * 1000, 2) if sent else 0.0,
+            "max_send_ms": round(self.max_send_seconds * 1000, 2),
+            "avg_encode_ms": round(self.encode_seconds / sent * 1000, 3) if sent else 0.0,
+            "bytes_sent": self.bytes_sent,
+            "avg_message_bytes": round(self.bytes_sent / sent) if sent else 0,
+            "max_queue_delay_ms": round(self.max_queue_delay * 1000, 2)
+        }
+
+class ProcessingStream:
+    """One video run through the detector on the hub's executor, fanned out to its viewers"""
+    def __init__(self, hub, key, video_path):
+        self.hub = hub
+        self.key = key
+        self.video_path = video_path
+        self.viewers = []
+        self.frames = 0
+        self.started_at = time.monotonic()
+        self.processing_seconds = 0.0
+        self._cap = None
+        self.detector = None # Pool session, held from _open to _close
+        self._cache = None
+        self._finished = False
+        self.task = None
+
+    # --- Executor thread ---
+
+    def _open(self):
+        self._cap = cv2.VideoCapture(self.video_path)
+        if not self._cap.isOpened():
+            return False
+        self.detector = detector = self.hub.pool.acquire(self.key, self._cap.get(cv2.CAP_PROP_FPS))
+        self._cache = detector.open_detection_cache(self.video_path)
+        return True
+
+    def _step(self):
+        ret, frame = self._cap.read()
+        if not ret:
+            self._finished = True
+            return None
+        t0 = time.perf_counter()
+        detector = self.detector
+        cached = self._cache.results(self.frames) if self._cache else None
+        _, events, telemetry = detector.process_frame(frame, verbose=False, context_results=cached)
+        if self._cache:
+            self._cache.record(detector.last_results)
+        self.processing_seconds += time.perf_counter() - t0
+        self.frames += 1
+        return self.frames - 1, telemetry, events
+
+    def _close(self):
+        if self._cap is not None:
+            self._cap.release()
+        if self._cache:
+            self._cache.close(complete=self._finished)
+        if self.detector is not None:
+            self.hub.pool.release(self.detector)
+
+    # --- Event loop ---
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        executor = self.hub.executor
+        final = None
+        try:
+            if not await loop.run_in_executor(executor, self._open):
+                final = {"type": "error", "message": f"Could not open video: {self.key}"}
+                return
+            while self.viewers:
+                item = await loop.run_in_executor(executor, self._step)
+                if item is None:
+                    final = {"type": "complete", "total_frames": self.frames, "message": "Processing complete"}
+                    break
+                frame_idx, telemetry, events = item
+                for channel in self.viewers:
+                    channel.push(frame_idx, telemetry, events)
+        except Exception as e:
+            final = {"type": "error", "message": str(e)}
+        finally:
+            self.hub._streams.pop(self.key, None)
+            await loop.run_in_executor(executor, self._close)
+            if final is not None:
+                for channel in self.viewers:
+                    channel.finish(dict(final))
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started_at
+        return {
+            "frames": self.frames,
+            "fps": round(self.frames / elapsed, 1) if elapsed > 0 else 0.0,
+            "avg_process_ms": round(self.processing_seconds / self.frames * 1000, 2) if self.frames else 0.0,
+            "viewers": [channel.stats() for channel in self.viewers]
+        }
+
+class LiveProcessingStream(ProcessingStream):
+    """
+    The newest frames of a LiveSource, inferred on the hub's ScheduledInference
+    thread: the multi-camera scheduler decides how often this camera gets a
+    frame (weight, event/motion boosts, min_fps), frames that arrive meanwhile
+    are skipped at the source (counted as dropped there). No detection cache:
+    live video never repeats.
+    """
+    def __init__(self, hub, key, source):
+        super().__init__(hub, key, None)
+        self.source = source
+
+    def _on_result(self, loop, frame_idx, telemetry, events):
+        # Inference thread -> event loop
+        loop.call_soon_threadsafe(self._publish, frame_idx, telemetry, events)
+
+    def _publish(self, frame_idx, telemetry, events):
+        self.frames += 1
+        for channel in self.viewers:
+            channel.push(frame_idx, telemetry, events)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        ended = asyncio.Event()
+        inference = self.hub.live_inference
+        final = None
+        try:
+            inference.add(self.source, lambda *result: self._on_result(loop, *result),
+                          on_end=lambda: loop.call_soon_threadsafe(ended.set))
+            while self.viewers and not ended.is_set():
+                try:
+                    await asyncio.wait_for(ended.wait(), timeout=0.5)
+                except asyncio.TimeoutError:
+                    pass # Re-check viewers
+            if ended.is_set():
+                final = {"type": "complete", "total_frames": self.frames, "message": "Source stopped"}
+        except Exception as e:
+            final = {"type": "error", "message": str(e)}
+        finally:
+            self.hub._streams.pop(self.key, None)
+            inference.remove(self.source.source_id)
+            if final is not None:
+                for channel in self.viewers:
+                    channel.finish(dict(final))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["scheduler"] = self.hub.live_inference.stats().get(self.source.source_id)
+        return stats
+
+class StreamHub:
+    """
+    Processing streams by video key, each on its own pool session; viewers of
+    the same video share its stream. A stream steps one frame at a time, so with
+    `workers` threads the decoding/heads of one video overlap another's inference
+    (model calls themselves are serialized by the detector).
+    """
+    def __init__(self, pool, max_events=500, workers=2, scheduler=None):
+        self.pool = pool
+        self.max_events = max_events
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stream-detector")
+        # Live cameras share one scheduled inference thread instead of the executor
+        self.live_inference = ScheduledInference(pool, scheduler)
+        self._streams: Dict[str, ProcessingStream] = {}
+
+    def _attach(self, key, make_stream, wire_format):
+        channel = ViewerChannel(self.max_events, wire_format)
+        stream = self._streams.get(key)
+        if stream is None:
+            stream = self._streams[key] = make_stream()
+            stream.viewers.append(channel)
+            stream.task = asyncio.get_running_loop().create_task(stream.run())
+        else:
+            stream.viewers.append(channel)
+        return channel
+
+    def subscribe(self, key, video_path, wire_format="json") -> ViewerChannel:
+        """Channel on the stream of `key`, started if nobody is watching it yet"""
+        return self._attach(key, lambda: ProcessingStream(self, key, video_path), wire_format)
+
+    def subscribe_live(self, source, wire_format="json") -> ViewerChannel:
+        """Channel on the processing stream of a registered LiveSource (key live:<source_id>)"""
+        key = self.live_key(source.source_id)
+        return self._attach(key, lambda: LiveProcessingStream(self, key, source), wire_format)
+
+    @staticmethod
+    def live_key(source_id):
+        return f"live:{source_id}"
+
+    def unsubscribe(self, key, channel):
+        """The stream stops after its current frame once its last viewer left"""
+        stream = self._streams.get(key)
+        if stream is not None and channel in stream.viewers:
+            stream.viewers.remove(channel)
+
+    def close(self):
+        for stream in list(self._streams.values()):
+            stream.viewers.clear()
+        self.executor.shutdown(wait=False)
+        self.live_inference.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_streams": len(self._streams),
+            "viewers": sum(len(s.viewers) for s in self._streams.values()),
+            "sessions": self.pool.stats(),
+            "streams": {key: stream.stats() for key, stream in self._streams.items()}
+        }
@@ -0,0 +1,156 @@
+"""
+PEGASUS Telemetry Wire Formats
+Negotiated per WebSocket connection (/ws/process/{filename}?format=...):
+- json (default): every message is the full JSON object.
+- msgpack: binary MessagePack (needs the optional `msgpack` package, else the
+  connection falls back to json). Per connection state makes it a delta stream:
+  * telemetry keys whose value did not change since the last message are omitted
+    (the client keeps the previous value),
+  * flow_history / anomaly_history are sent once, then only the appended entries
+    ({"append": [...], "length": n}: the client keeps its last n entries, or
+    {"reset": [...]} when the window cannot be continued). What was appended
+    comes from the telemetry's "series_seq" counters (entries ever appended),
+    never from matching values, so repeated identical entries are not lost;
+    without counters a changed series is sent in full,
+  * crowd_data points become crowd_xy: bytes of uint8 (x, y) pairs on a 0-255 scale
+    of the 0-100 frame coordinates.
+When a format is requested, the first message is a JSON text "hello" naming the
+negotiated one (json if msgpack is not installed).
+"""
+import json
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError: # Optional: binary format unavailable, json only
+    msgpack = None
+
+SCHEMA_VERSION = 1
+SERIES = ('flow_history', 'anomaly_history')
+CROWD_SCALE = 255 / 100.0
+
+def _default(obj):
+    # numpy scalars/arrays that slipped into a payload
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+def available_formats():
+    return ('json', 'msgpack') if msgpack is not None else ('json',)
+
+def make_encoder(requested):
+    """Encoder for the requested format (json when unknown or unavailable)"""
+    if requested == 'msgpack' and msgpack is not None:
+        return CompactEncoder()
+    return JsonEncoder()
+
+class JsonEncoder:
+    """Full JSON text messages (the original wire format)"""
+    name = 'json'
+    binary = False
+
+    def hello(self):
+        return {"type": "hello", "format": self.name, "schema": SCHEMA_VERSION, "formats": list(available_formats())}
+
+    def encode(self, message):
+        return json.dumps(message, default=_default)
+
+class CompactEncoder:
+    """Per-connection MessagePack delta encoder (see module docstring)"""
+    name = 'msgpack'
+    binary = True
+
+    def __init__(self):
+        self._packer = msgpack.Packer(use_bin_type=True, default=_default)
+        self._last = {} # Telemetry key -> packed value last sent (values may be mutated in place upstream)
+        self._series_seq = {} # Series -> append counter the client is at
+        self._series_packed = {} # Series -> packed list last sent (producers without series_seq)
+
+    def hello(self):
+        return {"type": "hello", "format": self.name, "schema": SCHEMA_VERSION, "formats": list(available_formats()),
+                "series": list(SERIES), "crowd_scale": 1 / CROWD_SCALE}
+
+    def _series_delta(self, name, entries, seq):
+        if seq is None:
+            packed = self._packer.pack(entries)
+            if self._series_packed.get(name) == packed:
+                return None
+            self._series_packed[name] = packed
+            self._series_seq.pop(name, None)
+            return {"reset": entries}
+        last = self._series_seq.get(name)
+        self._series_seq[name] = seq
+        if last is not None:
+            appended = seq - last
+            if appended == 0:
+                return None # Window unchanged
+            if 0 < appended <= len(entries):
+                return {"append": entries[-appended:], "length": len(entries)}
+        return {"reset": entries}
+
+    @staticmethod
+    def _crowd_bytes(points):
+        if not points:
+            return b""
+        xy = np.array([(p['x'], p['y']) for p in points], dtype=np.float64)
+        return np.clip(np.rint(xy * CROWD_SCALE), 0, 255).astype(np.uint8).tobytes()
+
+    def _pack_telemetry(self, data):
+        """Packed map of the keys that changed since the previous message"""
+        pack = self._packer.pack
+        parts = []
+        series_seq = data.get('series_seq') or {}
+        for key, value in data.items():
+            if key == 'series_seq':
+                continue # Consumed here
+            if key in SERIES:
+                delta = self._series_delta(key, value, series_seq.get(key))
+                if delta is not None:
+                    parts.append(pack(key) + pack(delta))
+                continue
+            if key == 'crowd_data':
+                key, value = 'crowd_xy', self._crowd_bytes(value)
+            packed = pack(value)
+            if self._last.get(key) == packed:
+                continue # Client keeps the previous value
+            self._last[key] = packed
+            parts.append(pack(key) + packed)
+        return self._packer.pack_map_header(len(parts)) + b"".join(parts)
+
+    def encode(self, message):
+        if message.get('type') != 'telemetry' or not isinstance(message.get('data'), dict):
+            return self._packer.pack(message)
+        pack = self._packer.pack
+        out = [self._packer.pack_map_header(len(message))]
+        for key, value in message.items():
+            out.append(pack(key))
+            out.append(self._pack_telemetry(value) if key == 'data' else pack(value))
+        return b"".join(out)
+
+class CompactDecoder:
+    """Client side of CompactEncoder: rebuilds full telemetry messages (crowd points quantized)"""
+    def __init__(self, crowd_scale=1 / CROWD_SCALE):
+        self.crowd_scale = crowd_scale
+        self.state = {}
+
+    def decode(self, payload):
+        message = msgpack.unpackb(payload, raw=False)
+        if message.get('type') != 'telemetry':
+            return message
+        state = self.state
+        for key, value in message['data'].items():
+            if key in SERIES:
+                if 'reset' in value:
+                    state[key] = value['reset']
+                else:
+                    state[key] = (state[key] + value['append'])[-value['length']:]
+            elif key == 'crowd_xy':
+                xy = np.frombuffer(value, dtype=np.uint8).reshape(-1, 2) * self.crowd_scale
+                state['crowd_data'] = [{"x": x, "y": y, "z": 1.0} for x, y in xy.tolist()]
+            else:
+                state[key] = value
+        message['data'] = dict(state)
+        return message
@@ -0,0 +1,70 @@
+"""
+PEGASUS Upload Storage
+Uploads are streamed to disk in fixed-size chunks while their SHA-256 is
+computed in the same pass (never the whole video in RAM), then stored once
+as uploads/<sha256><ext>. Identical uploads share one file, and the hash lets
+/api/process-now hand back the results of content it has already processed.
+Disk writes and hashing run in the threadpool, off the event loop.
+"""
+import hashlib
+import os
+import tempfile
+
+from starlette.concurrency import run_in_threadpool
+
+CHUNK_SIZE = 1024 * 1024 # 1 MiB
+DEFAULT_EXT = ".mp4"
+
+def _extension(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if 1 < len(ext) <= 6 and ext[1:].isalnum() else DEFAULT_EXT
+
+def content_path(upload_dir, sha256, filename):
+    return os.path.join(upload_dir, f"{sha256}{_extension(filename)}")
+
+def _write_chunk(f, digest, chunk):
+    digest.update(chunk)
+    f.write(chunk)
+
+def _store(tmp_path, path):
+    """Move the finished upload into place; True if the same bytes were already stored"""
+    if os.path.exists(path):
+        os.remove(tmp_path)
+        return True
+    os.replace(tmp_path, path)
+    return False
+
+async def save_upload(file, upload_dir="uploads", chunk_size=CHUNK_SIZE):
+    """
+    Stream an UploadFile into the content-addressed upload directory.
+    Returns {"path", "filename" (stored name), "original_filename", "sha256", "size", "duplicate"}.
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                await run_in_threadpool(_write_chunk, f, digest, chunk)
+                size += len(chunk)
+
+        sha256 = digest.hexdigest()
+        path = content_path(upload_dir, sha256, file.filename)
+        duplicate = await run_in_threadpool(_store, tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return {
+        "path": path,
+        "filename": os.path.basename(path),
+        "original_filename": os.path.basename(file.filename or ""),
+        "sha256": sha256,
+        "size": size,
+        "duplicate": duplicate
+    }
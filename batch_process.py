@@ -74,6 +74,10 @@ def batch_process_videos(input_dir="videos", output_dir="output"):
         
         print(f"✓ Resolution: {width}x{height} @ {fps_v:.1f}fps ({total_frames} frames)")
         
+        # Fresh session state + event clip index per video
+        detector.reset()
+        detector.begin_source(video_file, fps_v)
+        
         # Video writer
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         out = cv2.VideoWriter(output_path, fourcc, fps_v, (width, height))
@@ -84,14 +88,22 @@ def batch_process_videos(input_dir="videos", output_dir="output"):
         detection_count = 0
         start_time = time.time()
         
+        # Tracked detections of a video seen before (same content + perception settings) skip YOLO
+        cache = detector.open_detection_cache(video_path)
+        finished = False
+        
         try:
             while True:
                 ret, frame = cap.read()
                 if not ret:
+                    finished = True
                     break
                 
                 # Process with ML
-                processed_frame, events, telemetry = detector.process_frame(frame, verbose=False)
+                cached = cache.results(frame_idx) if cache else None
+                processed_frame, events, telemetry = detector.process_frame(frame, verbose=False, context_results=cached)
+                if cache:
+                    cache.record(detector.last_results)
                 
                 # Track stats
                 detection_count += telemetry.get('total_vehicles', 0)
@@ -115,6 +127,9 @@ def batch_process_videos(input_dir="videos", output_dir="output"):
         finally:
             cap.release()
             out.release()
+            detector.clip_recorder.flush()
+            if cache:
+                cache.close(complete=finished)
         
         elapsed_total = time.time() - start_time
         
@@ -0,0 +1,98 @@
+"""
+PEGASUS Counting Benchmark
+Per-frame cost of VehicleCounter with many tracks, count lines and gates,
+against the legacy single-line row-by-row counter.
+
+Usage:
+    python benchmarks/bench_counting.py --tracks 100 200 --lines 1 10 20 --gates 4
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.results import LiteResults
+from src.utils.counting_utils import VehicleCounter
+
+WIDTH, HEIGHT = 1280, 720
+
+class LegacyCounter:
+    """The original single horizontal line, downward-only, row-by-row counter"""
+    def __init__(self, line_y_fraction=0.6):
+        self.line_y_fraction = line_y_fraction
+        self.count = 0
+        self.tracked_vehicles = {}
+
+    def update_count(self, results):
+        h, w = results.orig_shape
+        actual_line_y = h * self.line_y_fraction
+        track_ids = results.boxes.id.int().cpu().tolist()
+        for i, (box, cls) in enumerate(zip(results.boxes.xyxy, results.boxes.cls)):
+            vehicle_id = f"id_{track_ids[i]}"
+            center_y = (box[1] + box[3]) / 2
+            if vehicle_id in self.tracked_vehicles:
+                if self.tracked_vehicles[vehicle_id] < actual_line_y <= center_y:
+                    self.count += 1
+            self.tracked_vehicles[vehicle_id] = center_y
+        return self.count
+
+def make_frames(n_tracks, n_frames, seed=0):
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform([0, 0], [WIDTH, HEIGHT], (n_tracks, 2))
+    vel = rng.normal(0, 5, (n_tracks, 2))
+    cls = rng.choice([2, 3, 5, 7], n_tracks)
+    frames = []
+    for _ in range(n_frames):
+        pos = (pos + vel) % [WIDTH, HEIGHT]
+        xyxy = np.concatenate([pos - 25, pos + 25], axis=1)
+        frames.append(LiteResults(xyxy, cls, np.arange(n_tracks), orig_shape=(HEIGHT, WIDTH)))
+    return frames
+
+def make_lines(n, rng):
+    # Angled lines spread over the frame
+    lines = []
+    for i in range(n):
+        x1, y1 = rng.uniform(0, 1, 2)
+        x2, y2 = rng.uniform(0, 1, 2)
+        lines.append({'name': f"line_{i}", 'points': [(x1, y1), (x2, y2)], 'directions': ('forward', 'backward')})
+    return lines
+
+def make_gates(n):
+    # Vertical lane strips
+    return [{'name': f"lane_{i}", 'polygon': [(i / n, 0.3), ((i + 1) / n, 0.3), ((i + 1) / n, 1.0), (i / n, 1.0)]}
+            for i in range(n)]
+
+def time_counter(counter, frames):
+    t0 = time.perf_counter()
+    for results in frames:
+        counter.update_count(results)
+    return (time.perf_counter() - t0) / len(frames) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Vehicle counting benchmark")
+    parser.add_argument('--tracks', type=int, nargs='+', default=[100, 200])
+    parser.add_argument('--lines', type=int, nargs='+', default=[1, 10, 20])
+    parser.add_argument('--gates', type=int, default=4)
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("PEGASUS COUNTING BENCHMARK (ms/frame)")
+    print("=" * 60)
+    rng = np.random.default_rng(1)
+    for n_tracks in args.tracks:
+        frames = make_frames(n_tracks, args.frames)
+        legacy = time_counter(LegacyCounter(), frames)
+        print(f"{n_tracks} tracks | legacy 1 line: {legacy:7.3f}")
+        for n_lines in args.lines:
+            counter = VehicleCounter(lines=make_lines(n_lines, rng), gates=make_gates(args.gates))
+            ms = time_counter(counter, frames)
+            print(f"{n_tracks} tracks | {n_lines:3d} lines + {args.gates} gates: {ms:7.3f}  (count={counter.get_count()})")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
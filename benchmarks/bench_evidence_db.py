@@ -0,0 +1,122 @@
+"""
+PEGASUS EvidenceDB Benchmark
+Measures insert throughput (legacy connect-per-insert vs batched WAL writer)
+and query latency for the API access patterns at large table sizes.
+
+Usage:
+    python benchmarks/bench_evidence_db.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.database import EvidenceDB
+from src.utils.evidence_store import EvidenceStore
+
+VIOLATION_TYPES = ['collision', 'illegal_boarding', 'stalled_vehicle', 'wrong_way',
+                   'potential_accident', 'traffic_violation', 'accident']
+
+def make_items(n, blob_size, start_time):
+    blob = os.urandom(blob_size)
+    for i in range(n):
+        ts = start_time + timedelta(seconds=i)
+        yield {
+            'type': random.choice(VIOLATION_TYPES),
+            'vehicle_id': f"id_{random.randint(1, 5000)}",
+            'timestamp': ts.strftime("%Y-%m-%d %H:%M:%S"),
+            'image_bytes': blob
+        }
+
+def make_metadata_items(n, start_time):
+    """Rows as written by the save worker: image already in the store, hash only"""
+    for i in range(n):
+        ts = start_time + timedelta(seconds=i)
+        yield {
+            'type': random.choice(VIOLATION_TYPES),
+            'vehicle_id': f"id_{random.randint(1, 5000)}",
+            'timestamp': ts.strftime("%Y-%m-%d %H:%M:%S"),
+            'image_hash': f"{i:064x}"
+        }
+
+def bench_legacy_inserts(db_path, n, blob_size):
+    """Old behaviour: new connection + commit per row"""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("""CREATE TABLE IF NOT EXISTS evidence (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, violation_type TEXT,
+            vehicle_id TEXT, timestamp TEXT, image_blob BLOB)""")
+    t0 = time.perf_counter()
+    for item in make_items(n, blob_size, datetime.now()):
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("INSERT INTO evidence (violation_type, vehicle_id, timestamp, image_blob) VALUES (?, ?, ?, ?)",
+                         (item['type'], item['vehicle_id'], item['timestamp'], item['image_bytes']))
+            conn.commit()
+    return n / (time.perf_counter() - t0)
+
+def bench_batched_inserts(db, n, batch_size):
+    t0 = time.perf_counter()
+    batch = []
+    for item in make_metadata_items(n, datetime(2026, 1, 1)):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            db.insert_many(batch)
+            batch = []
+    db.insert_many(batch)
+    return n / (time.perf_counter() - t0)
+
+def time_query(fn, repeats=50):
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+def main():
+    parser = argparse.ArgumentParser(description="EvidenceDB benchmark")
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Rows to insert for the batched run')
+    parser.add_argument('--legacy-rows', type=int, default=2000, help='Rows for the connect-per-insert baseline')
+    parser.add_argument('--blob-size', type=int, default=256, help='Image blob size in bytes')
+    parser.add_argument('--batch-size', type=int, default=64, help='Rows per transaction')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("PEGASUS EVIDENCE DB BENCHMARK")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_rate = bench_legacy_inserts(os.path.join(tmp, "legacy.db"), args.legacy_rows, args.blob_size)
+        print(f"Legacy inserts (connect/commit per row): {legacy_rate:10.0f} rows/s  ({args.legacy_rows} rows)")
+
+        db = EvidenceDB(db_path=os.path.join(tmp, "batched.db"), store=EvidenceStore(root=os.path.join(tmp, "store")))
+        batched_rate = bench_batched_inserts(db, args.rows, args.batch_size)
+        print(f"Batched WAL inserts (batch={args.batch_size}):      {batched_rate:10.0f} rows/s  ({args.rows} rows)")
+        print(f"Speedup: {batched_rate / legacy_rate:.1f}x")
+
+        print(f"\nQuery latency at {args.rows} rows (median / p95 ms):")
+        queries = {
+            "latest 50 (vault list)": lambda: db.get_all_evidence(limit=50),
+            "latest 50 by type": lambda: db.get_evidence_by_type('collision', limit=50),
+            "single row by id": lambda: db._reader().execute(
+                "SELECT image_hash FROM evidence WHERE id = ?", (random.randint(1, args.rows),)).fetchone(),
+            "1h time-range count": lambda: db._reader().execute(
+                "SELECT COUNT(*) FROM evidence WHERE timestamp BETWEEN ? AND ?",
+                ("2026-01-02 00:00:00", "2026-01-02 01:00:00")).fetchone(),
+        }
+        for name, fn in queries.items():
+            median, p95 = time_query(fn)
+            print(f"  {name:<28} {median:8.3f} / {p95:8.3f}")
+        db.close()
+
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+PEGASUS Replay Benchmark
+Throughput of the full head stack and of each head alone (what a one-head
+threshold sweep runs) replayed over a synthetic recording (crossing traffic
+with pedestrians and a few parked cars), and a determinism check: the event
+digest of every run must match.
+
+Replay is bound by per-frame Python in the heads, not by decoding, so the
+target is a multiple of real time rather than "thousands of fps": at
+TARGET_OBJECTS objects the full stack must replay at >= TARGET_FPS['all']
+frames/s (~7x a 30 fps source) and each single head at >= TARGET_FPS['head'].
+Larger recordings are reported only. Exits 1 when a target is missed.
+
+Usage:
+    python benchmarks/bench_replay.py --objects 10 30 --frames 3000
+"""
+import argparse
+import sys
+import tempfile
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.recording import DetectionRecording, RecordingWriter
+from src.core.replay import HEADS, ReplayEngine, default_heads
+from src.core.results import LiteResults
+
+WIDTH, HEIGHT = 1280, 720
+TARGET_OBJECTS = 10
+TARGET_FPS = {'all': 200, 'head': 500} # frames/s at TARGET_OBJECTS objects
+
+def make_recording(path, n_objects, n_frames, seed=0):
+    """Moving vehicles/pedestrians that re-enter as new tracks, plus parked cars (stopped-vehicle logic)"""
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform([0, 0], [WIDTH, HEIGHT], (n_objects, 2))
+    vel = rng.uniform(-8, 8, (n_objects, 2))
+    cls = np.where(rng.random(n_objects) < 0.25, 0, rng.choice([2, 3, 5, 7], n_objects))
+    parked = rng.random(n_objects) < 0.15
+    vel[parked] = 0
+    vel[cls == 0] *= 0.2
+    size = np.where(cls == 0, 12, 30)[:, None]
+    ids = np.arange(n_objects)
+    writer = RecordingWriter(fps=30.0, source="synthetic")
+    for frame_idx in range(n_frames):
+        pos = pos + vel + rng.normal(0, 0.3, pos.shape) * ~parked[:, None]
+        wrapped = ((pos < 0) | (pos >= [WIDTH, HEIGHT])).any(axis=1)
+        pos %= [WIDTH, HEIGHT]
+        ids = np.where(wrapped, ids + n_objects, ids)
+        xyxy = np.concatenate([pos - size, pos + size], axis=1)
+        writer.append(LiteResults(xyxy, cls, ids, rng.uniform(0.6, 0.95, n_objects), orig_shape=(HEIGHT, WIDTH)))
+    writer.save(path)
+    return DetectionRecording(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay engine benchmark")
+    parser.add_argument('--objects', type=int, nargs='+', default=[10, 30])
+    parser.add_argument('--frames', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=2)
+    parser.add_argument('--no-heads', action='store_true', help="Full stack only, skip the per-head rows")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("PEGASUS REPLAY BENCHMARK")
+    print(f"Targets at {TARGET_OBJECTS} objects: full stack >= {TARGET_FPS['all']} frames/s, "
+          f"single head >= {TARGET_FPS['head']} frames/s")
+    print("=" * 60)
+    missed = []
+    stacks = [('all', HEADS)] + ([] if args.no_heads else [(name, (name,)) for name in HEADS])
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.objects:
+            recording = make_recording(f"{tmp}/rec_{n}", n, args.frames)
+            print(f"{n} objects | {recording.nbytes / 1024:.0f} KB")
+            for label, heads in stacks:
+                runs = [ReplayEngine(recording, partial(default_heads, None, heads)).run()
+                        for _ in range(args.repeat)]
+                fps = max(r['fps'] for r in runs)
+                deterministic = len({r['digest'] for r in runs}) == 1
+                target = TARGET_FPS['all' if label == 'all' else 'head'] if n <= TARGET_OBJECTS else None
+                status = "-" if target is None else ("ok" if fps >= target else f"BELOW {target}")
+                print(f"  {label:10s} {fps:8.0f} frames/s | {len(runs[0]['events']):5d} events | "
+                      f"deterministic: {'yes' if deterministic else 'NO'} | target: {status}")
+                if not deterministic or (target is not None and fps < target):
+                    missed.append(f"{n} objects / {label}")
+    print("=" * 60)
+    if missed:
+        print(f"FAILED: {', '.join(missed)}")
+        sys.exit(1)
+    print("All targets met")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+PEGASUS Telemetry Wire Format Benchmark
+Payload size and encode CPU of the WebSocket telemetry formats over a synthetic
+session shaped like TrafficViolationDetector output (sliding flow/stability
+histories, crowd points, per-line counts, occasional events): the JSON baseline,
+plain MessagePack of the same messages, and the compact delta format.
+The compact stream is decoded back and checked against the source messages
+(including histories with repeated identical entries).
+
+Usage:
+    python benchmarks/bench_telemetry.py --frames 3000 --pedestrians 40
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.telemetry_codec import CompactDecoder, CompactEncoder, JsonEncoder, msgpack
+
+def make_session(n_frames, n_pedestrians, seed=0):
+    """Viewer messages (telemetry envelope) as the stream would send them"""
+    rng = np.random.default_rng(seed)
+    flow, stability = [], []
+    seq = {"flow_history": 0, "anomaly_history": 0}
+    line_counts = {"line_0": {"in": {"car": 0, "truck": 0}, "out": {"car": 0, "truck": 0}}}
+    pos = rng.uniform(0, 100, (n_pedestrians, 2))
+    safety = 100.0
+    messages = []
+    for frame in range(n_frames):
+        if frame % 15 == 0: # Faster than real time: often two identical entries per second
+            flow = (flow + [{"time": time.strftime("%H:%M:%S", time.gmtime(frame // 30)),
+                             "value": int(rng.integers(5, 7))}])[-20:]
+            seq["flow_history"] += 1
+        events = []
+        if rng.random() < 0.02:
+            events.append({"event_type": "collision", "event_id": f"{frame:08d}-0000-0000-0000-000000000000",
+                           "vehicle_id": int(rng.integers(1, 500)), "camera_id": "CAM-01", "duration_seconds": 0,
+                           "confidence": 0.95, "frame_number": frame, "timestamp": "2026-01-01T12:00:00",
+                           "metadata": {"bbox": rng.uniform(0, 1280, 4).round(1).tolist(), "status": "START",
+                                        "details": "Collision detected"}})
+            safety = max(0.0, safety - 10)
+        safety = min(100.0, safety + 0.05)
+        stability = (stability + [{"frame": frame + 1, "stability": round(safety, 2)}])[-50:]
+        seq["anomaly_history"] += 1
+        if rng.random() < 0.1:
+            line_counts["line_0"]["in"]["car"] += 1
+        pos = np.clip(pos + rng.normal(0, 0.2, pos.shape), 0, 100)
+        telemetry = {
+            "type": "telemetry", "fps": round(float(rng.uniform(24, 30)), 1), "total_vehicles": 12,
+            "active_violations": len(events), "min_proximity": round(float(rng.uniform(20, 200)), 1),
+            "violation_stats": [{"type": "Collision", "count": frame // 50}], "flow_rate": 18,
+            "line_counts": json.loads(json.dumps(line_counts)), "conflicts": {},
+            "flow_history": list(flow), "crowd_data": [{"x": x, "y": y, "z": 1.0} for x, y in pos.tolist()],
+            "anomaly_history": list(stability), "series_seq": dict(seq),
+            "system_status": "OPTIMAL" if safety > 80 else "WARNING",
+            "classification_stats": {"car": 9, "truck": 2, "person": n_pedestrians},
+            "avg_speed": float(rng.uniform(20, 40)), "peak_speed": 61.5, "safety_index": safety,
+            "evidence_pipeline": {"queued": 0, "written": frame // 50, "dropped": 0}
+        }
+        messages.append({"type": "telemetry", "frame": frame, "data": telemetry, "events": events,
+                         "skipped_frames": 0})
+    return messages
+
+def measure(encode, messages):
+    t0 = time.perf_counter()
+    payloads = [encode(m) for m in messages]
+    elapsed = time.perf_counter() - t0
+    return payloads, elapsed
+
+def check_roundtrip(messages, payloads):
+    decoder = CompactDecoder()
+    for message, payload in zip(messages, payloads):
+        got, want = decoder.decode(payload)['data'], message['data']
+        crowd = np.array([(p['x'], p['y']) for p in got.pop('crowd_data')]).reshape(-1, 2)
+        ref = np.array([(p['x'], p['y']) for p in want['crowd_data']]).reshape(-1, 2)
+        if crowd.shape != ref.shape or (crowd.size and np.abs(crowd - ref).max() > 0.2):
+            return False
+        if got != {k: v for k, v in want.items() if k not in ('crowd_data', 'series_seq')}:
+            return False
+    return True
+
+def check_duplicates():
+    """Identical consecutive entries ([a] -> [a, a] -> full window shifts) must survive the round trip"""
+    a = {"time": "12:00:00", "value": 5}
+    windows = [[a], [a, a], [a, a, a], [a, a, a], [a, a, a]] # Last two: window full, one append each
+    seqs = [1, 2, 3, 4, 4]
+    encoder, decoder = CompactEncoder(), CompactDecoder()
+    for window, seq in zip(windows, seqs):
+        data = {"flow_history": window, "series_seq": {"flow_history": seq}}
+        got = decoder.decode(encoder.encode({"type": "telemetry", "frame": seq, "data": data}))['data']
+        if got['flow_history'] != window:
+            return False
+    # Without counters a changed series is sent in full
+    encoder, decoder = CompactEncoder(), CompactDecoder()
+    for window in windows:
+        got = decoder.decode(encoder.encode({"type": "telemetry", "frame": 0, "data": {"flow_history": window}}))
+        if got['data']['flow_history'] != window:
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Telemetry wire format benchmark")
+    parser.add_argument('--frames', type=int, default=3000)
+    parser.add_argument('--pedestrians', type=int, default=40)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("PEGASUS TELEMETRY WIRE FORMAT BENCHMARK")
+    print("=" * 60)
+    messages = make_session(args.frames, args.pedestrians)
+    formats = [("json (baseline)", JsonEncoder().encode)]
+    if msgpack is None:
+        print("msgpack not installed: only the JSON baseline is available")
+    else:
+        formats.append(("msgpack (full)", lambda m: msgpack.packb(m, use_bin_type=True)))
+        formats.append(("msgpack (compact)", CompactEncoder().encode))
+
+    baseline = None
+    compact = None
+    for name, encode in formats:
+        payloads, elapsed = measure(encode, messages)
+        size = sum(len(p) for p in payloads) / len(payloads)
+        per_msg = elapsed / len(payloads) * 1e6
+        baseline = baseline or (size, per_msg)
+        print(f"{name:<18} {size:8.0f} B/msg ({size / baseline[0]:5.1%}) | "
+              f"{per_msg:7.1f} us/msg ({per_msg / baseline[1]:5.1%})")
+        if name.endswith("(compact)"):
+            compact = payloads
+    if compact is not None:
+        print(f"Compact stream decodes to the source telemetry: {'yes' if check_roundtrip(messages, compact) else 'NO'}")
+        print(f"Duplicate history entries survive the round trip: {'yes' if check_duplicates() else 'NO'}")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+PEGASUS Memory Soak Test
+Feeds a synthetic, never-ending stream of tracked detections (track IDs keep
+increasing, vehicles stop, cross the counting line, leave their lane and
+drive the wrong way) through the intelligence heads and per-track services,
+sampling RSS and every module's memory_stats(). With bounded state the RSS
+curve is flat after warm-up.
+
+Usage:
+    python benchmarks/soak_memory.py --frames 1000000
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.context import FrameContext
+from src.core.results import LiteResults
+from src.heads.traffic_flow_head import TrafficFlowHead
+from src.heads.collision_head import CollisionHead
+from src.heads.anomaly_head import AnomalyHead
+from src.heads.crowd_head import CrowdHead
+from src.utils.speed_utils import SpeedEstimator
+from src.utils.evidence_manager import EvidenceManager
+from src.services.safety_score import SafetyScore
+
+WIDTH, HEIGHT = 1280, 720
+VEHICLE_CLASSES = [2, 3, 5, 7]
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        # No procfs: peak RSS is the best we have (kB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+class SyntheticScene:
+    """Tracks spawn, move (some stop, some reverse), and despawn; IDs are never reused"""
+    def __init__(self, concurrent=24, seed=0):
+        self.rng = random.Random(seed)
+        self.concurrent = concurrent
+        self.next_id = 1
+        self.tracks = []
+
+    def _spawn(self):
+        cls = 0 if self.rng.random() < 0.2 else self.rng.choice(VEHICLE_CLASSES)
+        wrong_way = self.rng.random() < 0.1
+        track = {
+            'id': self.next_id,
+            'cls': cls,
+            'x': self.rng.uniform(0, WIDTH - 120),
+            'y': HEIGHT - 100 if wrong_way else self.rng.uniform(0, HEIGHT * 0.3),
+            'vy': -self.rng.uniform(3, 8) if wrong_way else self.rng.uniform(1, 8),
+            'w': self.rng.uniform(40, 160),
+            'h': self.rng.uniform(40, 120),
+            'stop_at': self.rng.randint(50, 400) if self.rng.random() < 0.15 else None,
+            'stop_for': self.rng.randint(100, 2500),
+            'age': 0,
+            'ttl': self.rng.randint(150, 900)
+        }
+        self.next_id += 1
+        self.tracks.append(track)
+
+    def step(self):
+        while len(self.tracks) < self.concurrent:
+            self._spawn()
+        alive = []
+        for t in self.tracks:
+            t['age'] += 1
+            stopped = t['stop_at'] is not None and t['stop_at'] <= t['age'] < t['stop_at'] + t['stop_for']
+            if not stopped:
+                t['y'] += t['vy']
+                t['x'] += self.rng.uniform(-1, 1)
+            if t['age'] < t['ttl'] and -200 < t['y'] < HEIGHT + 200:
+                alive.append(t)
+        self.tracks = alive
+
+        # Occasional detection dropouts, like a real tracker
+        visible = [t for t in self.tracks if self.rng.random() > 0.03]
+        xyxy = np.array([[t['x'], t['y'], t['x'] + t['w'], t['y'] + t['h']] for t in visible], dtype=np.float32)
+        return LiteResults(xyxy.reshape(-1, 4), [t['cls'] for t in visible], [t['id'] for t in visible],
+                           orig_shape=(HEIGHT, WIDTH))
+
+def total_entries(stats):
+    """Sum every entry count in a nested memory_stats() dict"""
+    if isinstance(stats, dict):
+        if 'entries' in stats:
+            return stats['entries']
+        return sum(total_entries(v) for k, v in stats.items() if k not in ('evicted', 'max_entries'))
+    return stats if isinstance(stats, int) else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Bounded-memory soak test")
+    parser.add_argument('--frames', type=int, default=1_000_000, help='Synthetic frames to process')
+    parser.add_argument('--sample-every', type=int, default=50_000, help='Frames between RSS samples')
+    parser.add_argument('--concurrent', type=int, default=24, help='Concurrent tracks in the scene')
+    parser.add_argument('--tolerance', type=float, default=0.05, help='Max relative RSS growth after warm-up')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("PEGASUS MEMORY SOAK TEST")
+    print("=" * 60)
+
+    speed_estimator = SpeedEstimator()
+    evidence_manager = EvidenceManager(cooldown_seconds=60)
+    safety_score = SafetyScore()
+    anomaly = AnomalyHead()
+    # Enable the lane and wrong-way paths so their state is exercised too
+    anomaly.lane.lanes = [[(0.0, 0.0), (0.6, 0.0), (0.6, 1.0), (0.0, 1.0)]]
+    anomaly.movement.expected_flow_direction = (0, 1)
+    heads = [TrafficFlowHead(), CollisionHead(), anomaly, CrowdHead()]
+
+    scene = SyntheticScene(concurrent=args.concurrent)
+    frame = np.zeros((1, 1, 3), dtype=np.uint8)
+    samples = []
+    events_seen = 0
+    t_start = time.time()
+
+    print(f"{'frame':>10} {'rss MB':>8} {'state entries':>14} {'tracks seen':>12} {'events':>9}")
+    for frame_id in range(1, args.frames + 1):
+        results = scene.step()
+        speed_estimator.estimate_speed(results)
+        context = FrameContext(frame_id=frame_id, timestamp=frame_id / 30.0, fps=30.0, results=results,
+                               frame=frame, services={'speed_estimator': speed_estimator})
+        events = []
+        for head in heads:
+            events.extend(head.process(context).get('events', []))
+        for event in events:
+            data = event['data']
+            evidence_manager.should_capture(data.get('id', 'unknown'), event['type'], data.get('status'))
+        safety_score.update(events, now=frame_id / 30.0)
+        events_seen += len(events)
+
+        if frame_id % args.sample_every == 0 or frame_id == args.frames:
+            stats = {
+                "speed_estimator": speed_estimator.memory_stats(),
+                "evidence_manager": evidence_manager.memory_stats(),
+                "heads": {h.__class__.__name__: h.memory_stats() for h in heads},
+                "safety_score_active": safety_score.active_count
+            }
+            rss = rss_mb()
+            samples.append((frame_id, rss))
+            print(f"{frame_id:>10} {rss:>8.1f} {total_entries(stats):>14} {scene.next_id - 1:>12} {events_seen:>9}")
+
+    elapsed = time.time() - t_start
+    print(f"\nProcessed {args.frames} frames in {elapsed:.1f}s ({args.frames / elapsed:.0f} fps)")
+
+    # Compare against the first sample after warm-up (first quarter of the run)
+    warm = [s for s in samples if s[0] >= args.frames // 4] or samples
+    growth = (samples[-1][1] - warm[0][1]) / warm[0][1]
+    flat = growth <= args.tolerance
+    print(f"RSS after warm-up: {warm[0][1]:.1f} MB -> {samples[-1][1]:.1f} MB ({growth * 100:+.1f}%)")
+    print("✓ RSS flat" if flat else "✗ RSS keeps growing")
+    print("=" * 60)
+    sys.exit(0 if flat else 1)
+
+if __name__ == "__main__":
+    main()
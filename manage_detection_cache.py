@@ -0,0 +1,50 @@
+"""
+DETECTION CACHE - Inspect and invalidate cached tracked detections
+Entries are keyed by (video hash, model weights hash, perception config), so a
+changed video, model or setting never reuses stale detections; this tool frees
+the space early or forces re-inference.
+
+Usage:
+    python manage_detection_cache.py stats
+    python manage_detection_cache.py invalidate --video videos/clip.mp4
+    python manage_detection_cache.py invalidate --stale [--weights src/models/yolov8n.pt]
+    python manage_detection_cache.py clear
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.services.detection_cache import DetectionCache, file_sha256
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the detection result cache")
+    parser.add_argument('command', choices=['stats', 'invalidate', 'clear'])
+    parser.add_argument('--root', default='data/detection_cache', help='Cache directory')
+    parser.add_argument('--video', help='Drop the entries of this video file')
+    parser.add_argument('--video-hash', help='Drop the entries of this video content hash (sha256)')
+    parser.add_argument('--stale', action='store_true', help='Drop entries recorded with other model weights')
+    parser.add_argument('--weights', default='src/models/yolov8n.pt', help='Current model weights (for --stale)')
+    args = parser.parse_args()
+
+    cache = DetectionCache(root=args.root)
+
+    if args.command == 'invalidate':
+        if args.stale:
+            removed = cache.invalidate_other_weights(file_sha256(args.weights))
+        elif args.video or args.video_hash:
+            removed = cache.invalidate(video_hash=args.video_hash or file_sha256(args.video))
+        else:
+            parser.error("invalidate needs --video, --video-hash or --stale")
+        print(f"✓ Removed {removed} cache entries")
+    elif args.command == 'clear':
+        print(f"✓ Removed {cache.clear()} cache entries")
+
+    stats = cache.stats()
+    print(f"Detection cache: {stats['entries']} entries, {stats['size_bytes'] / 1024 ** 2:.1f} MB "
+          f"(limit {stats['max_bytes'] / 1024 ** 2:.0f} MB / {stats['max_entries']} entries)")
+
+if __name__ == "__main__":
+    main()
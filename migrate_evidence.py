@@ -0,0 +1,89 @@
+"""
+EVIDENCE MIGRATION - Move evidence images into the content-addressed store
+1. Moves image_blob payloads of existing pegasus.db rows into data/evidence_store/
+   and keeps only the hash in the database.
+2. Optionally imports loose legacy JPEGs (data/evidence/evidence_{type}_{id}_{timestamp}.jpg)
+   that were never written to the database.
+3. Optionally VACUUMs the database to give the freed BLOB pages back to the OS.
+
+Usage:
+    python migrate_evidence.py [--db data/pegasus.db] [--import-dir data/evidence] [--vacuum]
+"""
+import argparse
+import os
+import re
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.utils.database import EvidenceDB
+from src.utils.evidence_store import EvidenceStore
+
+# Violation types seen in legacy filenames (types contain underscores themselves)
+KNOWN_TYPES = ['collision', 'accident', 'traffic_violation', 'potential_accident', 'wrong_way',
+               'illegal_boarding', 'stalled_vehicle', 'safety_observation']
+LEGACY_NAME = re.compile(r"^evidence_(?P<rest>.+)_(?P<date>\d{4}-\d{2}-\d{2}) (?P<time>\d{2}-\d{2}-\d{2})\.jpg$")
+
+def parse_legacy_filename(filename, known_types=KNOWN_TYPES):
+    """evidence_{type}_{vehicle_id}_{YYYY-mm-dd HH-MM-SS}.jpg -> (type, vehicle_id, timestamp)"""
+    match = LEGACY_NAME.match(filename)
+    if not match:
+        return None
+    rest = match.group('rest')
+    timestamp = f"{match.group('date')} {match.group('time').replace('-', ':')}"
+    # Types contain underscores too: prefer the longest known type prefix
+    for v_type in sorted(known_types, key=len, reverse=True):
+        if rest.startswith(v_type + "_"):
+            return v_type, rest[len(v_type) + 1:], timestamp
+    v_type, _, vehicle_id = rest.partition('_')
+    return v_type, vehicle_id or 'unknown', timestamp
+
+def import_legacy_files(db, import_dir):
+    # Legacy files were written alongside the DB row: skip those already recorded
+    existing = {(row['violation_type'], row['vehicle_id'], row['timestamp']) for row in db.get_all_evidence()}
+    items = []
+    for filename in sorted(os.listdir(import_dir)):
+        parsed = parse_legacy_filename(filename)
+        if parsed is None or parsed in existing:
+            continue
+        with open(os.path.join(import_dir, filename), 'rb') as f:
+            image_hash = db.store.put(f.read())
+        v_type, vehicle_id, timestamp = parsed
+        items.append({'type': v_type, 'vehicle_id': vehicle_id, 'timestamp': timestamp, 'image_hash': image_hash})
+    return db.insert_many(items)
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate evidence BLOBs to the content-addressed store")
+    parser.add_argument('--db', default='data/pegasus.db', help='Evidence database path')
+    parser.add_argument('--store', default='data/evidence_store', help='Evidence store root')
+    parser.add_argument('--import-dir', default=None, help='Also import loose legacy JPEGs from this directory')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM the database afterwards')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("PEGASUS EVIDENCE MIGRATION")
+    print("=" * 60)
+
+    size_before = os.path.getsize(args.db) if os.path.exists(args.db) else 0
+    db = EvidenceDB(db_path=args.db, store=EvidenceStore(root=args.store))
+
+    migrated = db.migrate_blobs()
+    print(f"✓ Migrated {migrated} BLOB rows into {args.store}/")
+
+    if args.import_dir and os.path.isdir(args.import_dir):
+        imported = import_legacy_files(db, args.import_dir)
+        print(f"✓ Imported {imported} legacy files from {args.import_dir}/")
+
+    if args.vacuum:
+        db.vacuum()
+    db.store.wait() # Finish thumbnails
+    db.close()
+
+    size_after = os.path.getsize(args.db)
+    print(f"  Database size: {size_before / 1024:.0f} KB -> {size_after / 1024:.0f} KB")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
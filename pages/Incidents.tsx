@@ -19,40 +19,26 @@ const Incidents: React.FC<IncidentsProps> = ({ resolvedIncidents }) => {
         const response = await fetch('http://localhost:8000/api/evidence');
         const data = await response.json();
 
-        // Parse filenames into incident objects
-        // Filename format: evidence_{type}_{id}_{timestamp}.jpg
-        const mapped = data.evidence.map((filename: string, index: number) => {
-          const parts = filename.replace('.jpg', '').split('_');
+        // Evidence records: { id, violation_type, vehicle_id, timestamp, image_url, thumbnail_url }
+        const mapped = data.evidence.map((record: any, index: number) => {
+          const rawType: string = record.violation_type || 'incident';
 
           let type = 'Observation';
-          let vehicleId = 'unknown';
-          let timestampStr = '';
-
-          // Find where the date starts (e.g. 2026-01...)
-          const dateIndex = parts.findIndex(p => p.startsWith('202'));
-
-          if (parts[1] === 'safety') {
+          if (rawType === 'safety_observation') {
             type = 'Safety Observation';
-          } else if (parts[1] === 'collision') {
+          } else if (rawType === 'collision') {
             type = 'Collision';
-          } else if (parts[1] === 'illegal') {
+          } else if (rawType === 'illegal_boarding') {
             type = 'Illegal Boarding';
           } else {
-            type = parts[1] ? parts[1].charAt(0).toUpperCase() + parts[1].slice(1) : 'Incident';
-          }
-
-          if (dateIndex !== -1) {
-            vehicleId = parts.slice(2, dateIndex).join('_') || 'unknown';
-            timestampStr = parts.slice(dateIndex).join('_');
-          } else {
-            vehicleId = parts.slice(2).join('_') || 'unknown';
+            type = rawType.split('_').map(p => p.charAt(0).toUpperCase() + p.slice(1)).join(' ');
           }
 
-          // Format timestamp for display
-          const displayTime = timestampStr ? timestampStr.replace(/-/g, ':').replace(':', '-').replace(':', '-') : 'Today';
+          const vehicleId = record.vehicle_id || 'unknown';
+          const displayTime = record.timestamp || 'Today';
 
           return {
-            id: `INC-${2000 + index}`,
+            id: `INC-${2000 + record.id}`,
             type: type,
             timestamp: displayTime || '2026-01-31 11:45:00',
             severity: type.toLowerCase().includes('collision') ? 'Danger' :
@@ -61,7 +47,8 @@ const Incidents: React.FC<IncidentsProps> = ({ resolvedIncidents }) => {
             officer: index % 4 === 0 ? 'Sgt. Baker' : index % 4 === 1 ? 'Cpl. Lee' : 'Officer Ray',
             duration: '0:35s',
             location: 'CAM-001 - Detection Zone',
-            image: `http://localhost:8000/evidence/${filename}`,
+            image: `http://localhost:8000${record.image_url}`,
+            thumbnail: `http://localhost:8000${record.thumbnail_url}`,
             details: {
               vehicleIds: [vehicleId],
               speed: type.includes('Collision') ? '42 km/h' : '15 km/h',
@@ -73,8 +60,8 @@ const Incidents: React.FC<IncidentsProps> = ({ resolvedIncidents }) => {
           };
         });
 
-        // Reverse to show newest first
-        setDynamicIncidents(mapped.reverse());
+        // Backend already returns newest first
+        setDynamicIncidents(mapped);
         setLoading(false);
       } catch (error) {
         console.error('Failed to fetch evidence:', error);
@@ -199,7 +186,7 @@ const Incidents: React.FC<IncidentsProps> = ({ resolvedIncidents }) => {
                     </td>
                     <td className="px-6 py-6">
                       <div className="relative group/img overflow-hidden rounded-lg border border-white/10 w-24 h-12">
-                        <img src={inc.image} className="w-full h-full object-cover transition-transform group-hover/img:scale-125" />
+                        <img src={inc.thumbnail || inc.image} className="w-full h-full object-cover transition-transform group-hover/img:scale-125" />
                         <div className="absolute inset-0 bg-black/40 flex items-center justify-center opacity-0 group-hover/img:opacity-100 transition-opacity"><Eye size={16} /></div>
                       </div>
                     </td>
@@ -105,6 +105,27 @@ const Upload: React.FC = () => {
   const canvasRef = useRef<HTMLCanvasElement>(null);
   const animationRef = useRef<number>();
 
+  // Poll a processing job until it completes; resolves with its result
+  const waitForJob = async (jobId: string) => {
+    while (true) {
+      const statusResponse = await fetch(`http://localhost:8000/api/jobs/${jobId}`);
+      if (!statusResponse.ok) {
+        throw new Error('Job status unavailable');
+      }
+      const job = await statusResponse.json();
+      setProcessingProgress(job.progress || 0);
+
+      if (job.status === 'completed') {
+        const resultResponse = await fetch(`http://localhost:8000/api/jobs/${jobId}/result`);
+        return resultResponse.json();
+      }
+      if (job.status === 'failed' || job.status === 'cancelled') {
+        throw new Error(job.error || `Job ${job.status}`);
+      }
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+  };
+
   // NEW: Handle file selection and automatic backend processing
   const handleFileSelect = async (event: React.ChangeEvent<HTMLInputElement>) => {
     const file = event.target.files?.[0];
@@ -130,7 +151,11 @@ const Upload: React.FC = () => {
         throw new Error('Backend processing failed');
       }
 
-      const result = await response.json();
+      // Processing runs as a background job: poll its progress until it finishes
+      // (an identical, already processed video comes back completed at once)
+      const submitted = await response.json();
+      console.log('🕒 Processing job:', submitted.job_id, submitted.cached ? '(cached)' : '');
+      const result = submitted.status === 'completed' ? submitted : await waitForJob(submitted.job_id);
       console.log('✓ Backend response:', result);
 
       // Set the processed video URL
@@ -0,0 +1,119 @@
+"""
+DETECTION REPLAY - Record tracked detections once, replay the heads many times
+1. record: runs YOLO + tracking over a video (or reuses the detection cache) and
+   writes a columnar, memory-mappable recording directory.
+2. run: replays the recording through all IntelligenceHeads (or a --heads
+   subset) without frames or YOLO, prints throughput, event counts and the event digest (identical on
+   every run of the same recording and code).
+
+Usage:
+    python replay_detections.py record --video videos/clip.mp4 --out data/recordings/clip
+    python replay_detections.py run data/recordings/clip [--repeat 3] [--events events.ndjson] [--heads collision,anomaly]
+"""
+import argparse
+import json
+import sys
+from functools import partial
+from pathlib import Path
+
+import cv2
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.core.recording import DetectionRecording, RecordingWriter
+from src.core.replay import HEADS, ReplayEngine, default_heads
+
+def record(video_path, out_path, max_frames=None):
+    from src.detector import TrafficViolationDetector
+    detector = TrafficViolationDetector()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"❌ Failed to open: {video_path}")
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    detector.begin_source(video_path, fps)
+    cache = detector.open_detection_cache(video_path, frames=max_frames)
+    writer = RecordingWriter(fps=fps, source=video_path)
+
+    frame_idx = 0
+    finished = False
+    try:
+        while max_frames is None or frame_idx < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                finished = True
+                break
+            cached = cache.results(frame_idx) if cache else None
+            detector.process_frame(frame, verbose=False, context_results=cached)
+            writer.append(detector.last_results, frame_idx / fps)
+            if cache:
+                cache.record(detector.last_results)
+            frame_idx += 1
+            if frame_idx % 100 == 0:
+                print(f"  Recorded {frame_idx} frames...", end='\r')
+    finally:
+        cap.release()
+        if cache:
+            cache.close(complete=finished)
+        detector.finalize(None)
+
+    if writer.failed:
+        print("❌ Inference failed on some frames; recording not written")
+        return None
+    writer.save(out_path)
+    recording = DetectionRecording(out_path)
+    print(f"\n✓ Recording: {out_path} ({len(recording)} frames, {recording.meta['detections']} detections, "
+          f"{recording.nbytes / 1024:.0f} KB)")
+    return recording
+
+def run(path, repeat=1, events_path=None, heads=None):
+    recording = DetectionRecording(path)
+    engine = ReplayEngine(recording, partial(default_heads, None, heads))
+    print("=" * 60)
+    print(f"REPLAY: {path} ({len(recording)} frames @ {recording.fps:.1f} fps), heads: {', '.join(heads or HEADS)}")
+    print("=" * 60)
+    digests = set()
+    for i in range(repeat):
+        result = engine.run()
+        digests.add(result['digest'])
+        print(f"  Run {i + 1}: {result['fps']:8.0f} frames/s | {len(result['events'])} events | "
+              f"digest {result['digest'][:16]}")
+    print("\n🚨 EVENTS:")
+    for name, count in result['event_counts'].items():
+        print(f"  {name:.<40} {count}")
+    if result['head_errors']:
+        print(f"⚠️  Head errors: {result['head_errors']}")
+    print(f"\nDeterministic: {'yes' if len(digests) == 1 else 'NO'}")
+    if events_path:
+        with open(events_path, 'w') as f:
+            for event in result['events']:
+                f.write(json.dumps(event, sort_keys=True) + "\n")
+        print(f"📝 Events saved: {events_path}")
+    print("=" * 60)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="PEGASUS detection recording & replay")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_record = sub.add_parser('record', help='Record tracked detections of a video')
+    p_record.add_argument('--video', required=True, help='Video file path')
+    p_record.add_argument('--out', required=True, help='Recording directory')
+    p_record.add_argument('--frames', type=int, default=None, help='Max frames to record')
+    p_run = sub.add_parser('run', help='Replay a recording through the heads')
+    p_run.add_argument('recording', help='Recording directory')
+    p_run.add_argument('--repeat', type=int, default=1, help='Number of replays (digests must match)')
+    p_run.add_argument('--events', default=None, help='Write the replayed events as NDJSON')
+    p_run.add_argument('--heads', default=None, help=f"Comma-separated subset of {','.join(HEADS)} (default all)")
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.video, args.out, args.frames)
+    else:
+        heads = args.heads.split(',') if args.heads else None
+        if heads and set(heads) - set(HEADS):
+            parser.error(f"--heads: unknown {sorted(set(heads) - set(HEADS))} (expected some of {','.join(HEADS)})")
+        run(args.recording, args.repeat, args.events, heads)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,15 @@
 from dataclasses import dataclass, field
-from typing import Any, List, Dict, Optional
-from ultralytics.engine.results import Results
+from typing import Any, List, Dict, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING: # Annotation only: heads also run on LiteResults (replay/soak) without ultralytics
+    from ultralytics.engine.results import Results
 
 @dataclass
 class FrameContext:
     frame_id: int
     timestamp: float
     fps: float
-    results: Results  # Raw YOLO results
+    results: 'Results'  # Raw YOLO results (or src.core.results.LiteResults)
     frame: Any = None # Raw image frame (numpy)
     services: Dict[str, Any] = field(default_factory=dict) # Service container (e.g. speed_estimator)
     detections: List[Dict[str, Any]] = field(default_factory=list) # Parsed detections (xyxy, cls, id, conf)
@@ -7,6 +7,7 @@ class IntelligenceHead(ABC):
     Abstract Base Class for all Intelligence Heads.
     Each head is responsible for a specific domain of perception (e.g., collision, flow, anomalies).
     """
+    SERVICES = ('speed_estimator', 'proximity') # context.services entries process() reads (replay updates only these)
 
     @abstractmethod
     def process(self, context: FrameContext) -> Dict[str, Any]:
@@ -15,3 +16,7 @@ class IntelligenceHead(ABC):
         The return value will be merged into the Telemetry Bus.
         """
         pass
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Sizes of the head's long-lived state (entry counts), for soak tests and /api/stats"""
+        return {}
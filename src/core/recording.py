@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from src.core.results import LiteResults
+
+FORMAT_VERSION = 1
+
+# Column files of a recording directory: one flat array per field, frames are
+# row ranges offsets[i]:offsets[i + 1] of the per-detection columns
+FRAME_COLUMNS = {
+    'offsets': np.int64,      # n_frames + 1
+    'timestamps': np.float64, # Seconds (video time unless recorded live)
+    'shapes': np.int32,       # (n_frames, 2) frame height, width
+    'has_ids': np.bool_       # False where the tracker returned no ids
+}
+DETECTION_COLUMNS = {
+    'xyxy': np.float32,       # (n_detections, 4)
+    'cls': np.int16,
+    'conf': np.float32,
+    'ids': np.int32           # -1 without a track id
+}
+
+class RecordingWriter:
+    """Accumulates per-frame tracked detections and writes a DetectionRecording directory"""
+    def __init__(self, fps=30.0, source=None):
+        self.fps = fps or 30.0
+        self.source = source
+        self.failed = False # A frame without results (inference error) makes the recording unusable
+        self._frames = {name: [] for name in ('counts', 'timestamps', 'shapes', 'has_ids')}
+        self._detections = {name: [] for name in DETECTION_COLUMNS}
+
+    def __len__(self):
+        return len(self._frames['counts'])
+
+    def append(self, results, timestamp=None):
+        """Add one frame (ultralytics Results or LiteResults); timestamp defaults to frame / fps"""
+        if results is None:
+            self.failed = True
+            return
+        index = len(self)
+        boxes = results.boxes
+        n = 0 if boxes is None else len(boxes)
+        if n:
+            cols = self._detections
+            cols['xyxy'].append(boxes.xyxy.cpu().numpy().astype(np.float32).reshape(-1, 4))
+            cols['cls'].append(boxes.cls.cpu().numpy().astype(np.int16).reshape(-1))
+            cols['conf'].append(boxes.conf.cpu().numpy().astype(np.float32).reshape(-1))
+            cols['ids'].append(boxes.id.int().cpu().numpy().astype(np.int32).reshape(-1) if boxes.id is not None
+                               else np.full(n, -1, dtype=np.int32))
+        self._frames['counts'].append(n)
+        self._frames['timestamps'].append(timestamp if timestamp is not None else index / self.fps)
+        self._frames['shapes'].append(tuple(results.orig_shape[:2]))
+        self._frames['has_ids'].append(n > 0 and boxes.id is not None)
+
+    def save(self, path):
+        """Write the recording to directory `path` (replaced atomically if it exists)"""
+        frames = self._frames
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(frames['counts'], out=offsets[1:])
+        columns = {
+            'offsets': offsets,
+            'timestamps': np.array(frames['timestamps'], dtype=np.float64),
+            'shapes': np.array(frames['shapes'], dtype=np.int32).reshape(-1, 2),
+            'has_ids': np.array(frames['has_ids'], dtype=bool)
+        }
+        for name, dtype in DETECTION_COLUMNS.items():
+            parts = self._detections[name]
+            empty = np.empty((0, 4) if name == 'xyxy' else 0, dtype=dtype)
+            columns[name] = np.concatenate(parts).astype(dtype, copy=False) if parts else empty
+
+        path = path.rstrip(os.sep)
+        tmp_path = tempfile.mkdtemp(dir=os.path.dirname(path) or ".", suffix=".part")
+        try:
+            for name, array in columns.items():
+                np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+            with open(os.path.join(tmp_path, "meta.json"), 'w') as f:
+                json.dump({"version": FORMAT_VERSION, "frames": len(self), "detections": int(offsets[-1]),
+                           "fps": self.fps, "source": self.source}, f)
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return path
+
+class DetectionRecording:
+    """
+    Columnar per-frame tracked detections (boxes, classes, confidences, track
+    ids, timestamps, frame shape), memory-mapped by default so many processes
+    can replay one recording without copies. recording[i] is a LiteResults.
+    """
+    def __init__(self, path, mmap=True):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported recording version: {self.meta.get('version')}")
+        mode = 'r' if mmap else None
+        for name in list(FRAME_COLUMNS) + list(DETECTION_COLUMNS):
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode))
+        if len(self.offsets) != self.meta['frames'] + 1:
+            raise ValueError(f"Truncated recording: {path}")
+
+    @property
+    def fps(self):
+        return self.meta['fps']
+
+    @property
+    def nbytes(self):
+        return sum(os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path))
+
+    def __len__(self):
+        return self.meta['frames']
+
+    def __getitem__(self, i):
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return LiteResults(self.xyxy[a:b], self.cls[a:b], self.ids[a:b] if self.has_ids[i] else None,
+                           self.conf[a:b], orig_shape=self.shapes[i].tolist())
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
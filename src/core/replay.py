@@ -0,0 +1,161 @@
+import hashlib
+import inspect
+import json
+import time
+from collections import Counter
+from typing import Any, Dict
+
+import numpy as np
+
+from src.core.context import FrameContext
+from src.utils.speed_utils import SpeedEstimator
+from src.services.proximity_service import ProximityService
+from src.heads.traffic_flow_head import TrafficFlowHead
+from src.heads.collision_head import CollisionHead
+from src.heads.anomaly_head import AnomalyHead
+from src.heads.crowd_head import CrowdHead
+from src.heads.conflict_head import ConflictHead
+from src.utils.accident_utils import CollisionDetector
+from src.utils.conflict_utils import ConflictAnalyzer
+from src.utils.stopped_vehicle_utils import StoppedVehicleDetector
+from src.utils.lane_violation_utils import LaneViolationDetector
+from src.utils.pedestrian_utils import PedestrianDetector
+from src.utils.movement_utils import MovementDetector
+from src.utils.interaction_utils import InteractionDetector
+
+ANOMALY_DETECTORS = ('stopped', 'lane', 'pedestrian', 'movement', 'interaction')
+# Parameter group -> class whose constructor receives the group's arguments
+HEAD_PARAMS = {
+    'flow': TrafficFlowHead, 'collision': CollisionDetector, 'conflict': ConflictAnalyzer,
+    'stopped': StoppedVehicleDetector, 'lane': LaneViolationDetector, 'pedestrian': PedestrianDetector,
+    'movement': MovementDetector, 'interaction': InteractionDetector
+}
+
+# Head stack in TrafficViolationDetector order, and the head each parameter group configures
+HEADS = ('flow', 'collision', 'anomaly', 'crowd', 'conflict')
+GROUP_HEAD = {'flow': 'flow', 'collision': 'collision', 'conflict': 'conflict',
+              **{name: 'anomaly' for name in ANOMALY_DETECTORS}}
+
+def heads_for(groups):
+    """Heads (HEADS order) configured by the given parameter groups"""
+    needed = {GROUP_HEAD[group] for group in groups if group in GROUP_HEAD}
+    return tuple(name for name in HEADS if name in needed)
+
+def check_head_params(params):
+    """ValueError for an unknown group or an argument its constructor does not take"""
+    unknown = set(params) - set(HEAD_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown head parameter groups: {sorted(unknown)} (expected one of {sorted(HEAD_PARAMS)})")
+    for group, args in params.items():
+        accepted = set(inspect.signature(HEAD_PARAMS[group].__init__).parameters) - {'self'}
+        bad = set(args or {}) - accepted
+        if bad:
+            raise ValueError(f"Unknown {group} parameters: {sorted(bad)} (accepted: {sorted(accepted)})")
+
+def default_heads(params=None, heads=None):
+    """
+    Fresh instances of the detector's head stack. params overrides constructor
+    arguments per component, e.g. {'collision': {'iou_threshold': 0.2},
+    'stopped': {'time_threshold': 45}} (keys: HEAD_PARAMS). heads: names from
+    HEADS to build (default all) - a sweep only needs the heads it tunes.
+    """
+    params = params or {}
+    check_head_params(params)
+    heads = HEADS if heads is None else tuple(heads)
+    unknown = set(heads) - set(HEADS)
+    if unknown:
+        raise ValueError(f"Unknown heads: {sorted(unknown)} (expected some of {list(HEADS)})")
+    unused = set(heads_for(params)) - set(heads)
+    if unused:
+        raise ValueError(f"Parameters given for heads that are not run: {sorted(unused)}")
+    factories = {
+        'flow': lambda: TrafficFlowHead(**params.get('flow', {})),
+        'collision': lambda: CollisionHead(**{'verbose': False, **params.get('collision', {})}), # No prints in replay
+        'anomaly': lambda: AnomalyHead(**{name: params.get(name) for name in ANOMALY_DETECTORS}),
+        'crowd': lambda: CrowdHead(),
+        'conflict': lambda: ConflictHead(**params.get('conflict', {}))
+    }
+    return [factories[name]() for name in HEADS if name in heads]
+
+def plain(value):
+    """JSON-safe copy of an event payload (numpy arrays/scalars -> lists/numbers, sets sorted)"""
+    if isinstance(value, dict):
+        return {str(k): plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(plain(v) for v in value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'tolist'): # ndarray, LiteTensor, torch tensors
+        return value.tolist()
+    return value
+
+class ReplayEngine:
+    """
+    Drives the IntelligenceHeads over a DetectionRecording without frames or
+    YOLO: same per-frame services (SpeedEstimator, ProximityService) and head
+    order as TrafficViolationDetector.process_frame, with the recorded
+    timestamps as frame time. Only the services the heads declare
+    (IntelligenceHead.SERVICES) are updated. Every run starts from fresh heads
+    (heads_factory()), so the event output of a recording is bit-for-bit
+    reproducible; run()['digest'] is a SHA-256 over the canonical events.
+    """
+    def __init__(self, recording, heads_factory=default_heads):
+        self.recording = recording
+        self.heads_factory = heads_factory
+
+    def run(self, start=0, stop=None) -> Dict[str, Any]:
+        recording = self.recording
+        stop = len(recording) if stop is None else min(stop, len(recording))
+        heads = self.heads_factory()
+        needed = {name for head in heads for name in head.SERVICES}
+        speed_estimator = SpeedEstimator(fps=recording.fps) if 'speed_estimator' in needed else None
+        proximity = ProximityService() if 'proximity' in needed else None
+        services = {'speed_estimator': speed_estimator, 'proximity': proximity}
+        timestamps = np.asarray(recording.timestamps[start:stop]).tolist()
+
+        events = []
+        head_errors = Counter()
+        t0 = time.perf_counter()
+        for n, frame_idx in enumerate(range(start, stop)):
+            results = recording[frame_idx]
+            if speed_estimator is not None:
+                speed_estimator.estimate_speed(results, timestamps[n])
+            if proximity is not None:
+                proximity.update(results)
+            context = FrameContext(frame_id=frame_idx + 1, timestamp=timestamps[n], fps=recording.fps,
+                                   results=results, services=services)
+            for head in heads:
+                try:
+                    output = head.process(context)
+                except Exception as e:
+                    head_errors[head.__class__.__name__] += 1
+                    if head_errors[head.__class__.__name__] == 1:
+                        print(f"Error in head {head.__class__.__name__} (frame {frame_idx}): {e}")
+                    continue
+                for event in output.get('events', []):
+                    events.append((frame_idx, event))
+        elapsed = time.perf_counter() - t0
+
+        digest = hashlib.sha256()
+        canonical = []
+        counts = Counter()
+        for frame_idx, event in events:
+            record = {"frame": frame_idx, "type": event['type'], "severity": event.get('severity'),
+                      "data": plain(event['data'])}
+            canonical.append(record)
+            counts[f"{record['type']}:{record['data'].get('status', 'VIOLATION_START')}"] += 1
+            digest.update(json.dumps(record, sort_keys=True).encode())
+            digest.update(b"\n")
+
+        frames = stop - start
+        return {
+            "frames": frames,
+            "seconds": elapsed,
+            "fps": frames / elapsed if elapsed > 0 else 0.0,
+            "events": canonical,
+            "event_counts": dict(sorted(counts.items())),
+            "head_errors": dict(head_errors),
+            "digest": digest.hexdigest()
+        }
@@ -0,0 +1,60 @@
+import numpy as np
+
+class LiteTensor:
+    """
+    Minimal numpy-backed stand-in for the torch tensors on ultralytics Boxes.
+    Supports the calls the heads make (.cpu(), .numpy(), .int(), .tolist(),
+    iteration, indexing, len) so recorded or synthetic detections can be fed
+    through the pipeline without torch.
+    """
+    def __init__(self, data):
+        self.data = np.asarray(data)
+        self._int = None # Every head asks for the int ids: convert once
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.data
+
+    def int(self):
+        if self._int is None:
+            self._int = LiteTensor(self.data.astype(np.int64))
+        return self._int
+
+    def tolist(self):
+        return self.data.tolist()
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __getitem__(self, idx):
+        return self.data[idx]
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+class LiteBoxes:
+    def __init__(self, xyxy, cls, ids=None, conf=None):
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.xyxy = LiteTensor(xyxy)
+        self.cls = LiteTensor(np.asarray(cls, dtype=np.float32).reshape(-1))
+        self.id = LiteTensor(np.asarray(ids, dtype=np.float32).reshape(-1)) if ids is not None else None
+        self.conf = LiteTensor(np.asarray(conf, dtype=np.float32).reshape(-1)) if conf is not None \
+            else LiteTensor(np.ones(len(xyxy), dtype=np.float32))
+
+    def __len__(self):
+        return len(self.xyxy)
+
+class LiteResults:
+    """
+    Results-like container (boxes + orig_shape) for one frame of tracked
+    detections, used by soak tests and replay instead of ultralytics Results.
+    """
+    def __init__(self, xyxy, cls, ids=None, conf=None, orig_shape=(720, 1280)):
+        self.boxes = LiteBoxes(xyxy, cls, ids, conf)
+        self.orig_shape = tuple(orig_shape)
@@ -1,11 +1,18 @@
+import copy
+import threading
 import uuid
 from ultralytics import YOLO
 import cv2
 import time
 from datetime import datetime
 from typing import List, Dict, Any
-import numpy as np
-import math
+from queue import Empty, Full
+from collections import deque, Counter
+
+try:
+    from ultralytics.trackers.basetrack import BaseTrack # Process-wide track id counter
+except ImportError:
+    BaseTrack = None
 
 # Core
 from src.core.context import FrameContext
@@ -14,19 +21,31 @@ from src.core.interfaces import IntelligenceHead
 
 # Services
 from src.utils.speed_utils import SpeedEstimator
-from src.utils.evidence_manager import EvidenceManager
+from src.utils.evidence_manager import EvidenceManager, NearDuplicateIndex
 from src.utils.heatmap_utils import TrafficHeatmap # Heatmap is special, simpler to keep as service/head hybrid
 from src.services.notification_service import NotificationService
-from src.visualization import capture_violation_evidence
+from src.services.clip_recorder import ClipRecorder
+from src.services.evidence_pipeline import EvidencePipeline
+from src.services.event_log import EventLog
+from src.services.safety_score import SafetyScore
+from src.services.proximity_service import ProximityService
+from src.services.detection_cache import DetectionCache, file_sha256
 
 # Heads
 from src.heads.traffic_flow_head import TrafficFlowHead
 from src.heads.collision_head import CollisionHead
 from src.heads.anomaly_head import AnomalyHead
 from src.heads.crowd_head import CrowdHead
+from src.heads.conflict_head import ConflictHead
 
 class TrafficViolationDetector:
     _model = None
+    _model_lock = threading.Lock() # The shared model/predictor runs one inference at a time
+    _weights_hash = None
+    MODEL_WEIGHTS = 'src/models/yolov8n.pt'
+    TRACK_IOU = 0.5  # NMS IoU of the tracker
+    CLAHE_CLIP_LIMIT = 2.0
+    CLAHE_TILE_GRID = (8, 8)
     
     # Configuration Constants - FIXED FOR CLEAN OUTPUT
     CLASS_CONFIDENCE = {
@@ -37,31 +56,73 @@ class TrafficViolationDetector:
         'person': 0.70,    # Increased from 0.50 - reduce false positives
         'bicycle': 0.58    # Increased from 0.38
     }
+    # SEVERE EVENTS: Only high-priority safety events trigger disk storage.
+    SEVERE_EVENT_TYPES = ['collision', 'accident', 'traffic_violation', 'potential_accident', 'wrong_way', 'illegal_boarding', 'stalled_vehicle']
     SAFETY_DECAY_RATE = 0.92  # Violations fade over time (per second)
+    SAVE_QUEUE_SIZE = 1024  # Bound on rows waiting for the DB writer
+    VIOLATION_LOG_SIZE = 1000  # In-memory tail only; full history lives in the incidents table
+    SAVE_BATCH_SIZE = 64  # Max evidence rows per DB transaction
+    SAVE_FLUSH_INTERVAL = 0.5  # Max seconds a queued row waits for its batch
     HISTORY_LENGTH = 50  # Consistent history tracking
     PANEL_WIDTH_RATIO = 0.22  # HUD panel width
 
-    def __init__(self):
+    def __init__(self, camera_id="cam_001", event_log_root="data/event_log", shared=None):
+        """
+        shared: detector whose model, database, save worker, evidence pipeline,
+        event log and detection cache this one uses (a DetectorPool session);
+        tracker, heads, bus and counters are always this instance's own.
+        """
+        self.camera_id = camera_id
+        
         # 1. Perception Engine (Local YOLOv8 with optimized/sharpened pipeline)
         if TrafficViolationDetector._model is None:
-            TrafficViolationDetector._model = YOLO('src/models/yolov8n.pt')
+            TrafficViolationDetector._model = YOLO(self.MODEL_WEIGHTS)
         self.model = TrafficViolationDetector._model
         self.inference_conf = 0.65  # INCREASED from 0.45 for cleaner detections
         
         # 2. Services
+        self.evidence_capture_enabled = True # Master toggle
+        self.clip_recorder = ClipRecorder(pre_roll_seconds=3.0, post_roll_seconds=3.0)
+        self.clip_capture_enabled = True # Event clips with pre/post-roll
+        self.detection_cache_enabled = True
+        
+        # 2.1 Database & Async Saving
+        self.owns_infrastructure = shared is None
+        if shared is not None:
+            self.notification_service = shared.notification_service
+            self.detection_cache = shared.detection_cache
+            self.db = shared.db
+            self.save_queue = shared.save_queue
+            self.event_log = shared.event_log
+            self.evidence_pipeline = shared.evidence_pipeline
+            self.save_worker = shared.save_worker
+        else:
+            from src.utils.database import EvidenceDB
+            from queue import Queue
+            from threading import Thread
+            self.notification_service = NotificationService()
+            self.detection_cache = DetectionCache() # Tracked detections of videos already seen
+            self.db = EvidenceDB()
+            self.save_queue = Queue(maxsize=self.SAVE_QUEUE_SIZE)
+            # Annotation/encoding/store writes run on a worker pool, never on the frame loop
+            # Near-duplicate captures (same incident under another track-ID pair) link to the first image
+            self.event_log = EventLog(root=event_log_root) # Append-only history for analytics (written by the save worker)
+            self.evidence_pipeline = EvidencePipeline(self.db.store, self.save_queue, max_queue=32, workers=2,
+                                                      dedupe=NearDuplicateIndex(window_seconds=120, max_distance=6))
+            self.save_worker = Thread(target=self._save_worker, daemon=True)
+            self.save_worker.start()
+        
+        # 3. Session state: tracker, services, Intelligence Heads, counters
+        self._init_session_state()
+
+    def _init_session_state(self):
+        """Fresh per-video state (no model reload): everything a new source must not inherit"""
         self.speed_estimator = SpeedEstimator()
+        self.proximity = ProximityService() # Per-frame spatial index shared with the heads
         self.evidence_manager = EvidenceManager(cooldown_seconds=60)
-        self.evidence_capture_enabled = True # Master toggle
         self.bus = TelemetryBus()
         self.heatmap = TrafficHeatmap() # Visualization service
-        self.notification_service = NotificationService()
-        
-        # 2.1 Database & Async Saving
-        from src.utils.database import EvidenceDB
-        from queue import Queue
-        from threading import Thread
-        self.db = EvidenceDB()
-        self.save_queue = Queue()
+        self.last_results = None # Perception output of the last frame (recorded into the cache)
         self.frame_count = 0
         
         # New Inference Metrics
@@ -75,42 +136,121 @@ class TrafficViolationDetector:
         self.cached_speeds = []  # Cache to avoid double calculation
         
         # Safety Index with Temporal Decay
-        self.violation_timestamps = {}  # Track when violations occurred for decay
-        
-        self.save_worker = Thread(target=self._save_worker, daemon=True)
-        self.save_worker.start()
+        self.safety_score = SafetyScore(decay_rate=self.SAFETY_DECAY_RATE) # Decaying violation penalties
         
-        # 3. Intelligence Heads
+        self.conflict_head = ConflictHead() # Near-miss (TTC/PET) analytics, uses the speed estimator
         self.heads: List[IntelligenceHead] = [
             TrafficFlowHead(),
             CollisionHead(),
             AnomalyHead(),
-            CrowdHead()
+            CrowdHead(),
+            self.conflict_head
         ]
         
         self.frame_number = 0
-        self.violation_log = []
+        self.violation_log = deque(maxlen=self.VIOLATION_LOG_SIZE)
+        self.violation_counts = Counter() # {event_type: START count} for the session
+        self.incident_drops = 0 # Incidents lost to a full save queue
+        self.series_seq = {"flow_history": 0, "anomaly_history": 0}
+        self._reset_tracker()
 
     def reset(self):
-        """Reset session-specific metrics without reloading model"""
-        self.frame_number = 0
-        self.frame_count = 0
-        self.violation_log = []
-        # Metrics Reset
-        self.last_classification_stats = {}
-        self.last_avg_speed = 0
-        self.last_peak_speed = 0
-        self.last_safety_index = 100
-        
-        # Performance tracking reset
-        self.fps_tracker = []
-        self.cached_speeds = []
-        self.violation_timestamps = {}
-        
-        self.speed_estimator = SpeedEstimator() # Reset tracking
-        self.bus = TelemetryBus() # Clear status
-        self.heatmap = TrafficHeatmap() # Clear heatmap
+        """Reset session-specific state (tracker, heads, services, metrics) without reloading model"""
+        self._init_session_state()
+        self.begin_source("stream")
         print("SYSTEM: Detector state has been reset for new video source.")
+
+    def begin_source(self, source_name, fps=30.0):
+        """Close clips of the previous source and start a new clip/event index"""
+        self.clip_recorder.flush()
+        self.clip_recorder.set_source(source_name, fps)
+        self.speed_estimator.fps = fps or 30.0 # Regression time base follows the source
+
+    @property
+    def weights_hash(self):
+        if TrafficViolationDetector._weights_hash is None:
+            TrafficViolationDetector._weights_hash = file_sha256(self.MODEL_WEIGHTS)
+        return TrafficViolationDetector._weights_hash
+
+    def perception_config(self) -> Dict[str, Any]:
+        """Everything besides the video and weights that changes the tracked detections"""
+        return {
+            "conf": self.inference_conf,
+            "iou": self.TRACK_IOU,
+            "tracker": "bytetrack",
+            "clahe": [self.CLAHE_CLIP_LIMIT, list(self.CLAHE_TILE_GRID)]
+        }
+
+    def open_detection_cache(self, video_path, video_hash=None, frames=None):
+        """
+        Detection cache session for one pass over video_path (None when disabled).
+        Feed session.results(i) to process_frame(context_results=...), record
+        detector.last_results after each frame and close() at the end.
+        """
+        if not self.detection_cache_enabled:
+            return None
+        try:
+            session = self.detection_cache.open(video_path, self.weights_hash, self.perception_config(),
+                                                video_hash=video_hash, frames=frames, fps=self.speed_estimator.fps)
+        except Exception as e:
+            print(f"WARNING: Detection cache unavailable: {e}")
+            return None
+        if session.hit:
+            print(f"✓ Detection cache hit: {len(session.cached)} frames of tracked detections")
+        else:
+            self._reset_tracker() # Recorded track ids start fresh, like any later replay
+        return session
+
+    def _reset_tracker(self):
+        """Next inference starts new tracks (ids from 1) for this detector only"""
+        self._trackers = None
+        self._track_count = 0
+
+    def _track(self, processed_input):
+        """
+        model.track() with this detector's tracker state. The model (and its
+        predictor) is shared by every detector in the process, so the ByteTrack
+        instances and the global track-id counter are swapped in and out around
+        each call under the model lock.
+        """
+        with TrafficViolationDetector._model_lock:
+            predictor = getattr(self.model, 'predictor', None)
+            shared = getattr(predictor, 'trackers', None)
+            if shared is not None:
+                if self._trackers is None:
+                    self._trackers = [copy.deepcopy(tracker) for tracker in shared]
+                    for tracker in self._trackers:
+                        tracker.reset()
+                predictor.trackers = self._trackers
+            if BaseTrack is not None:
+                BaseTrack._count = self._track_count
+            try:
+                return self.model.track(
+                    processed_input, 
+                    persist=True, 
+                    conf=self.inference_conf,
+                    iou=self.TRACK_IOU,  # Non-Maximum Suppression - removes overlapping boxes
+                    verbose=False
+                    # Removed: tracker="botsort.yaml" - caused tracking failures
+                )
+            finally:
+                # First call ever: the tracker callback created the trackers for us
+                self._trackers = getattr(self.model.predictor, 'trackers', None)
+                if BaseTrack is not None:
+                    self._track_count = BaseTrack._count
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Entry counts of every long-lived per-track/per-event structure (flat over a 24/7 stream)"""
+        return {
+            "speed_estimator": self.speed_estimator.memory_stats(),
+            "evidence_manager": self.evidence_manager.memory_stats(),
+            "evidence_dedupe": self.evidence_pipeline.dedupe.memory_stats() if self.evidence_pipeline.dedupe else {},
+            "heads": {head.__class__.__name__: head.memory_stats() for head in self.heads},
+            "clip_recorder": self.clip_recorder.stats(),
+            "safety_score_active": self.safety_score.active_count,
+            "violation_log": len(self.violation_log),
+            "save_queue": self.save_queue.qsize()
+        }
         
     @property
     def flow_history(self):
@@ -123,7 +263,8 @@ class TrafficViolationDetector:
         # For now, let's look at how we feed the bus.
         return self.bus.get_snapshot()['raw_stream'].get('stability_history', [])
 
-    def process_frame(self, frame, verbose=True, context_results=None):
+    def process_frame(self, frame, verbose=True, context_results=None, timestamp=None):
+        # timestamp: capture time in seconds (live sources); default is video time, frame_number / fps
         # Validation
         if frame is None or frame.size == 0:
             print("ERROR: Invalid frame input (null or empty)")
@@ -131,25 +272,19 @@ class TrafficViolationDetector:
         
         self.frame_number += 1
         t0 = time.time()
-        
-        # 0. AI Sharpening: CLAHE Pre-processing for low-res CCTV
-        processed_input = self._preprocess_frame(frame)
+        now = timestamp if timestamp is not None else self.frame_number / self.speed_estimator.fps
+        self.last_results = None
         
         # 1. Primary Perception (YOLO - Optimized tracking)
         if context_results is not None:
-            results = context_results
+            results = context_results # Recorded / cached detections: no preprocessing or inference
         else:
+            # 0. AI Sharpening: CLAHE Pre-processing for low-res CCTV
+            processed_input = self._preprocess_frame(frame)
             try:
                 # CRITICAL FIX: Use default ByteTrack with NMS to remove duplicate/overlapping boxes
                 # botsort.yaml may not exist, causing tracking to fail silently
-                yolo_results = self.model.track(
-                    processed_input, 
-                    persist=True, 
-                    conf=self.inference_conf,
-                    iou=0.5,  # Non-Maximum Suppression - removes overlapping boxes
-                    verbose=False
-                    # Removed: tracker="botsort.yaml" - caused tracking failures
-                )
+                yolo_results = self._track(processed_input)
                 results = yolo_results[0] if yolo_results else None
                 
                 # DIAGNOSTIC: Check if tracking is working
@@ -166,19 +301,21 @@ class TrafficViolationDetector:
             except Exception as e:
                 print(f"ERROR: YOLO tracking failed: {e}")
                 return frame, [], self._get_default_telemetry()
+        self.last_results = results
         
         # 2. Service Update (cache speeds to avoid recalculation)
-        self.cached_speeds = self.speed_estimator.estimate_speed(results)
+        self.cached_speeds = self.speed_estimator.estimate_speed(results, now)
         self.heatmap.update(results)
+        self.proximity.update(results) # Built once, queried by heads and telemetry
         
         # 3. Context Creation
         context = FrameContext(
             frame_id=self.frame_number,
-            timestamp=t0,
+            timestamp=now, # Elapsed-time logic in the heads runs on this clock
             fps=0.0, # Calculated later or smoothed
             results=results,
             frame=frame,
-            services={'speed_estimator': self.speed_estimator}
+            services={'speed_estimator': self.speed_estimator, 'proximity': self.proximity}
         )
         
         # 4. Intelligence Execution
@@ -197,8 +334,8 @@ class TrafficViolationDetector:
 
         # 5. Evidence Capture & Serialization
         canonical_events = []
-        # SEVERE EVENTS: Only high-priority safety events trigger disk storage.
-        severe_anomalies = ['collision', 'accident', 'traffic_violation', 'potential_accident', 'wrong_way', 'illegal_boarding', 'stalled_vehicle']
+        severe_anomalies = self.SEVERE_EVENT_TYPES
+        event_timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S") if all_events else None # Once per frame
         
         for event in all_events:
             # Event format from Heads: {'type': ..., 'severity': ..., 'data': ...}
@@ -220,22 +357,28 @@ class TrafficViolationDetector:
                 # Internal Notification Service
                 self.notification_service.dispatch(v_type, event['severity'], {"msg": v_data.get('details', 'No details')})
                 
-                # Visual Evidence
-                viz_frame, ts, image_bytes = capture_violation_evidence(frame.copy(), v_type, bbox, vehicle_id=v_id)
-                if image_bytes:
-                    self.save_queue.put({
-                        'type': v_type,
-                        'vehicle_id': v_id,
-                        'image_bytes': image_bytes
-                    })
+                # Visual Evidence (async: only a frame reference is queued)
+                self.evidence_pipeline.submit(frame, v_type, bbox, vehicle_id=v_id, camera_id=self.camera_id)
             
             # Serialize for API (Include trigger flag for UI popups)
-            c_event = self._serialize_event(v_data, v_id, v_type)
+            c_event = self._serialize_event(v_data, v_id, v_type, event_timestamp)
             if is_new_trigger:
                 c_event['snapshot_triggered'] = True
             
+            # D. Event Clip (pre-roll comes from the ring buffer)
+            if self.clip_capture_enabled and v_type in severe_anomalies:
+                self.clip_recorder.on_event(c_event)
+            
             canonical_events.append(c_event)
-            self.violation_log.append(c_event) # Keep log for API /incidents
+            self.violation_log.append(c_event) # Recent tail for live views
+            if c_event['metadata']['status'] == 'START':
+                self.violation_counts[v_type] += 1
+            
+            # Persist for the paginated /api/incidents (never blocks the frame loop)
+            try:
+                self.save_queue.put_nowait({'kind': 'incident', 'event': c_event})
+            except Full:
+                self.incident_drops += 1
 
         # 6. Telemetry & Bus Update
         
@@ -244,12 +387,14 @@ class TrafficViolationDetector:
         if self.frame_number % 30 == 0:
             flow_hist = self.bus.get_snapshot()['metrics']['traffic_flow']
             flow_hist.append({"time": current_time, "value": full_metrics.get('vehicle_count', 0)})
+            self.series_seq['flow_history'] += 1
             if len(flow_hist) > 20: flow_hist.pop(0)
             self.bus.update("metrics", {"traffic_flow": flow_hist})
+        # Per-line / per-gate counts by direction and class
+        self.bus.update("metrics", {"line_counts": full_metrics.get('line_counts', {})})
+        self.bus.update("metrics", {"conflicts": full_metrics.get('conflicts', {})})
 
         # B. Stability History
-        # Calculate scores
-        active_count = full_metrics.get('active_violations', len(all_events)) # Heads usually don't return 'active_count', we infer
         # Simplified stability:
         stability_score = max(0, 100 - (len(all_events) * 10))
         
@@ -257,14 +402,13 @@ class TrafficViolationDetector:
             raw_stream = self.bus.get_snapshot()['raw_stream']
             stab_hist = raw_stream.get('stability_history', [])
             stab_hist.append({"frame": self.frame_number, "stability": stability_score})
+            self.series_seq['anomaly_history'] += 1
             if len(stab_hist) > 20: stab_hist.pop(0)
             self.bus.update("raw_stream", {"stability_history": stab_hist})
 
         # C. Violation Stats
-        # Re-calc from self.violation_log
-        from collections import Counter
-        v_counts = Counter([e['event_type'] for e in self.violation_log if e['metadata']['status'] == 'START'])
-        violation_stats = [{"type": k.replace('_', ' ').title(), "count": v} for k, v in v_counts.items()]
+        # Session totals (violation_log is only a bounded tail)
+        violation_stats = [{"type": k.replace('_', ' ').title(), "count": v} for k, v in self.violation_counts.items()]
 
         # D. Enhanced Inferences (Speed & Composition) - USE CACHED SPEEDS
         speeds = [s['speed'] for s in self.cached_speeds] if self.cached_speeds else []
@@ -273,62 +417,14 @@ class TrafficViolationDetector:
         
         class_stats = full_metrics.get('classification_stats', {})
         
-        # E. Dynamic Safety Index Calculation with Temporal Decay
-        current_time = time.time()
-        safety_base = 100.0
-        
-        # Enhanced penalty map
-        penalty_map = {
-            'collision': 50,
-            'traffic_violation': 20,
-            'wrong_way': 30,
-            'illegal_boarding': 15,
-            'stalled_vehicle': 10,
-            'red_light': 25,
-            'no_helmet': 15,
-            'speeding': 18,
-            'wrong_lane': 12
-        }
-        
-        # Track new violations with timestamps
-        for event in all_events:
-            v_id = event.get('data', {}).get('id', str(uuid.uuid4()))
-            if v_id not in self.violation_timestamps:
-                self.violation_timestamps[v_id] = current_time
-        
-        # Calculate decayed penalties
-        total_penalty = 0
-        expired_violations = []
-        for v_id, timestamp in self.violation_timestamps.items():
-            time_elapsed = current_time - timestamp
-            # Exponential decay: penalty reduces by DECAY_RATE per second
-            decay_factor = (self.SAFETY_DECAY_RATE ** time_elapsed)
-            
-            # Find matching violation type (simplified)
-            base_penalty = 15  # Default
-            for event in all_events:
-                if event.get('data', {}).get('id') == v_id:
-                    base_penalty = penalty_map.get(event['type'], 15)
-                    break
-            
-            decayed_penalty = base_penalty * decay_factor
-            
-            # Remove violations that have decayed below 1% of original
-            if decayed_penalty < 0.01 * base_penalty:
-                expired_violations.append(v_id)
-            else:
-                total_penalty += decayed_penalty
-        
-        # Clean up expired violations
-        for v_id in expired_violations:
-            del self.violation_timestamps[v_id]
-        
-        current_safety = max(0, min(100, safety_base - total_penalty))
+        # E. Dynamic Safety Index with Temporal Decay (incremental, O(1) amortized per frame)
+        current_safety = self.safety_score.update(all_events, now) # Decays on the frame clock, like the heads
         
         # Update stability history (SINGLE UPDATE POINT)
         raw_stream = self.bus.get_snapshot()['raw_stream']
         stab_hist = raw_stream.get('stability_history', [])
         stab_hist.append({'frame': self.frame_number, 'stability': current_safety})
+        self.series_seq['anomaly_history'] += 1
         if len(stab_hist) > self.HISTORY_LENGTH:
             stab_hist.pop(0)
         self.bus.update("raw_stream", {"stability_history": stab_hist})
@@ -351,41 +447,41 @@ class TrafficViolationDetector:
         
         # Construct final Telemetry dict for API
         
-        # Calculate minimum proximity between any two vehicles for fallback capture
-        min_proximity = 9999.0
+        # Minimum center distance between any two tracked objects (fallback capture in process-now)
+        min_proximity = None
         if context.results is not None and context.results.boxes.id is not None:
-            boxes = context.results.boxes.xyxy.cpu().numpy()
-            if len(boxes) >= 2:
-                for i in range(len(boxes)):
-                    c1 = ((boxes[i][0] + boxes[i][2])/2, (boxes[i][1] + boxes[i][3])/2)
-                    for j in range(i + 1, len(boxes)):
-                        c2 = ((boxes[j][0] + boxes[j][2])/2, (boxes[j][1] + boxes[j][3])/2)
-                        d = math.sqrt((c1[0]-c2[0])**2 + (c1[1]-c2[1])**2)
-                        if d < min_proximity:
-                            min_proximity = d
+            min_proximity = self.proximity.min_distance
 
         telemetry = {
             "type": "telemetry",
             "fps": round(real_fps, 1),
             "total_vehicles": full_metrics.get('vehicle_count', 0),
             "active_violations": len(all_events),
-            "min_proximity": round(min_proximity, 1) if min_proximity < 9999 else None,
+            "min_proximity": round(min_proximity, 1) if min_proximity is not None else None,
             "violation_stats": violation_stats,
             "flow_rate": full_metrics.get('flow_rate', 0),
+            "line_counts": full_metrics.get('line_counts', {}),
+            "conflicts": full_metrics.get('conflicts', {}),
             "flow_history": self.flow_history[-50:],
             "crowd_data": full_metrics.get('crowd_density', []),
             "anomaly_history": self.stability_history[-50:],
+            "series_seq": dict(self.series_seq), # Entries ever appended per history (delta encoding)
             "system_status": "OPTIMAL" if current_safety > 80 else "WARNING" if current_safety > 60 else "CRITICAL",
             "classification_stats": class_stats,
             "avg_speed": avg_speed,
             "peak_speed": peak_speed,
-            "safety_index": current_safety
+            "safety_index": current_safety,
+            "evidence_pipeline": self.evidence_pipeline.stats()
         }
         
         # 7. Professional AI HUD (Digital Twin Overlays)
         frame = self.heatmap.get_overlay(frame)
         frame = self._draw_intelligence_hud(frame, telemetry)
         
+        # 8. Feed annotated frame to the clip ring buffer
+        if self.clip_capture_enabled:
+            self.clip_recorder.push_frame(frame, self.frame_number)
+        
         return frame, canonical_events, telemetry
 
     def _get_default_telemetry(self):
@@ -397,6 +493,8 @@ class TrafficViolationDetector:
             "active_violations": 0,
             "violation_stats": [],
             "flow_rate": 0,
+            "line_counts": {},
+            "conflicts": {},
             "flow_history": [],
             "crowd_data": [],
             "anomaly_history": [],
@@ -490,7 +588,7 @@ class TrafficViolationDetector:
             l, a, b = cv2.split(lab)
             
             # Apply CLAHE
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+            clahe = cv2.createCLAHE(clipLimit=self.CLAHE_CLIP_LIMIT, tileGridSize=self.CLAHE_TILE_GRID)
             cl = clahe.apply(l)
             
             # Merge back
@@ -499,8 +597,8 @@ class TrafficViolationDetector:
         except Exception:
             return frame # Fallback to raw
 
-    def _serialize_event(self, violation, vehicle_id, v_type):
-        """Helper to format event for API"""
+    def _serialize_event(self, violation, vehicle_id, v_type, timestamp=None):
+        """Helper to format event for API (timestamp: ISO seconds, defaults to now)"""
         bbox = violation.get('bbox')
         if bbox is not None:
             if hasattr(bbox, 'tolist'): bbox = bbox.tolist()
@@ -510,10 +608,11 @@ class TrafficViolationDetector:
             "event_type": v_type,
             "event_id": str(uuid.uuid4()),
             "vehicle_id": vehicle_id,
+            "camera_id": self.camera_id,
             "duration_seconds": 0,
             "confidence": 0.95,
             "frame_number": self.frame_number,
-            "timestamp": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+            "timestamp": timestamp or datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
             "metadata": {
                 "bbox": bbox,
                 "status": "START" if violation.get('status') == 'VIOLATION_START' else "END",
@@ -522,25 +621,57 @@ class TrafficViolationDetector:
         }
         
     def _save_worker(self):
-        """Background thread for database saving to avoid lagging the main loop"""
+        """
+        Background thread for database saving to avoid lagging the main loop.
+        Queued items are grouped into one transaction per SAVE_BATCH_SIZE items
+        or SAVE_FLUSH_INTERVAL seconds, whichever comes first.
+        """
         print("SYSTEM: Evidence Save Worker started.")
-        while True:
+        running = True
+        while running:
+            batch = []
             try:
                 item = self.save_queue.get()
-                if item is None: break
+                if item is None:
+                    self.save_queue.task_done()
+                    break
+                batch.append(item)
                 
-                self.db.insert_evidence(
-                    violation_type=item['type'],
-                    vehicle_id=item['vehicle_id'],
-                    image_bytes=item['image_bytes']
-                )
-                self.save_queue.task_done()
+                deadline = time.time() + self.SAVE_FLUSH_INTERVAL
+                while len(batch) < self.SAVE_BATCH_SIZE:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self.save_queue.get(timeout=remaining)
+                    except Empty:
+                        break
+                    if item is None:
+                        self.save_queue.task_done()
+                        running = False
+                        break
+                    batch.append(item)
+                
+                incidents = [item['event'] for item in batch if item.get('kind') == 'incident']
+                evidence = [item for item in batch if item.get('kind') != 'incident']
+                self.db.insert_many(evidence)
+                self.db.insert_incidents(incidents)
+                self.event_log.append_many(incidents)
             except Exception as e:
                 print(f"ERROR in Save Worker: {e}")
+            finally:
+                for _ in batch:
+                    self.save_queue.task_done()
 
     def finalize(self, last_frame):
-        # Stop worker
+        # Write pending clips + event index
+        self.clip_recorder.close()
+        if not self.owns_infrastructure:
+            return # Pool session: the owner closes the shared pipeline
+        
+        # Drain pending evidence captures, then stop the DB worker
+        self.evidence_pipeline.close()
         self.save_queue.put(None)
         if self.save_worker.is_alive():
             self.save_worker.join()
-        pass
+        self.event_log.close()
@@ -0,0 +1,95 @@
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict
+
+from src.detector import TrafficViolationDetector
+
+class DetectorPool:
+    """
+    Detector sessions for concurrent video sources. Every session is a
+    TrafficViolationDetector built on the pool's base detector: the loaded YOLO
+    weights, evidence database, save worker, evidence pipeline, event log and
+    detection cache are shared; tracker state, heads, services, telemetry bus
+    and counters are the session's own. Released sessions are reset and kept
+    idle (up to max_idle) so acquire() never loads a model or starts threads.
+    """
+    def __init__(self, base=None, max_sessions=8, max_idle=4):
+        self.base = base or TrafficViolationDetector()
+        self.max_sessions = max_sessions
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []
+        self._active: Dict[str, TrafficViolationDetector] = {}
+        self.created = 0
+        self.acquired = 0
+        self._acquire_seconds = 0.0
+        self._release_seconds = 0.0
+        self.max_acquire_seconds = 0.0
+
+    def acquire(self, source="stream", fps=30.0, camera_id=None) -> TrafficViolationDetector:
+        """Fresh session for one source (RuntimeError when max_sessions are in use)"""
+        t0 = time.perf_counter()
+        with self._lock:
+            if len(self._active) >= self.max_sessions:
+                raise RuntimeError(f"Detector pool exhausted ({self.max_sessions} sessions in use)")
+            session = self._idle.pop() if self._idle else None
+            session_id = uuid.uuid4().hex[:12]
+            self._active[session_id] = None # Reserve the slot
+        if session is None:
+            session = TrafficViolationDetector(camera_id=self.base.camera_id, shared=self.base)
+            self.created += 1
+        session.camera_id = camera_id or self.base.camera_id
+        session.session_id = session_id
+        session.begin_source(source, fps)
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self._active[session_id] = session
+            self.acquired += 1
+            self._acquire_seconds += elapsed
+            self.max_acquire_seconds = max(self.max_acquire_seconds, elapsed)
+        return session
+
+    def release(self, session):
+        """Close the session's clips and reset it for the next source"""
+        t0 = time.perf_counter()
+        with self._lock:
+            if self._active.pop(getattr(session, 'session_id', None), None) is None:
+                return # Not ours or already released
+        session.reset() # Flushes clips, fresh tracker/heads/bus
+        with self._lock:
+            keep = len(self._idle) < self.max_idle
+            if keep:
+                self._idle.append(session)
+            self._release_seconds += time.perf_counter() - t0
+        if not keep:
+            session.finalize(None) # Own clip encoder only
+
+    @contextmanager
+    def session(self, source="stream", fps=30.0, camera_id=None):
+        session = self.acquire(source, fps, camera_id)
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def close(self):
+        with self._lock:
+            sessions = self._idle + [s for s in self._active.values() if s is not None]
+            self._idle, self._active = [], {}
+        for session in sessions:
+            session.finalize(None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": len(self._active),
+                "idle": len(self._idle),
+                "max_sessions": self.max_sessions,
+                "created": self.created,
+                "acquired": self.acquired,
+                "avg_acquire_ms": round(self._acquire_seconds / self.acquired * 1000, 2) if self.acquired else 0.0,
+                "max_acquire_ms": round(self.max_acquire_seconds * 1000, 2),
+                "avg_release_ms": round(self._release_seconds / self.acquired * 1000, 2) if self.acquired else 0.0
+            }
@@ -9,97 +9,120 @@ except ImportError:
 # Ensure project root is in path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.detector import TrafficViolationDetector
+from src.services.clip_recorder import EventIndex, assemble_summary
+from src.services.detection_cache import file_sha256
 
-def generate_summary(input_video, output_video):
-    # Initialize detector
+def build_event_index(input_video, video_hash=None):
+    """
+    Single inference pass over the video. Violation clips and the event index
+    are written by the detector's ClipRecorder as events START/END.
+    """
+    from src.detector import TrafficViolationDetector
     detector = TrafficViolationDetector()
 
-    if not os.path.exists(input_video):
-        print(f"Error: {input_video} not found!")
-        return
-
     cap = cv2.VideoCapture(input_video)
-    
-    # Video Writer Setup
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    fps = cap.get(cv2.CAP_PROP_FPS)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_video, fourcc, fps, (width, height))
-    
+    detector.begin_source(input_video, fps)
+
     print(f"Processing {input_video} to extract violations...")
     print(f"Total Frames: {total_frames}")
-    
-    violation_frames_count = 0
-    
+
     # Progress bar
     try:
         pbar = tqdm(total=total_frames)
     except:
         pbar = None
         print("tqdm not found, progress bar disabled")
-    
-    active_violations = set()
-    
+
+    event_count = 0
     last_frame = None
-    
+    frame_idx = 0
+    finished = False
+    # A video summarized before (same content + perception settings) skips YOLO
+    cache = detector.open_detection_cache(input_video, video_hash=video_hash)
+    detector.clip_recorder.index.video_hash = video_hash # Lets a later run verify the index belongs to this video
+
     try:
         while cap.isOpened():
             ret, frame = cap.read()
             if not ret:
+                finished = True
                 break
-            
-            last_frame = frame.copy()
-            # Clear log before processing to get only new events for this frame
-            detector.violation_log = []
-            
-            result_frame, _, _ = detector.process_frame(frame, verbose=False)
-            
-            # Check for new events in the log
-            for event in detector.violation_log:
-                vid = event.get('vehicle_id')
-                status = event.get('status')
-                
-                if status == 'START':
-                    active_violations.add(vid)
-                elif status == 'END':
-                    if vid in active_violations:
-                        active_violations.remove(vid)
-            
-            # Only write frame if there are active violations
-            if len(active_violations) > 0:
-                out.write(result_frame)
-                violation_frames_count += 1
-                
+
+            last_frame = frame
+            cached = cache.results(frame_idx) if cache else None
+            _, events, _ = detector.process_frame(frame, verbose=False, context_results=cached)
+            if cache:
+                cache.record(detector.last_results)
+            frame_idx += 1
+            event_count += sum(1 for e in events if e['metadata']['status'] == 'START')
+
             if pbar:
                 pbar.update(1)
             elif cap.get(cv2.CAP_PROP_POS_FRAMES) % 100 == 0:
-                print(f"Processed {int(cap.get(cv2.CAP_PROP_POS_FRAMES))}/{total_frames} frames... Found {violation_frames_count} violation frames. Active violations: {len(active_violations)}")
+                print(f"Processed {int(cap.get(cv2.CAP_PROP_POS_FRAMES))}/{total_frames} frames... Violations started: {event_count}")
     except KeyboardInterrupt:
         print("\nProcess interrupted by user. Finalizing...")
     except Exception as e:
         print(f"\nError processing video: {e}")
     finally:
-        # One last check for active violations when video ends
-        if last_frame is not None:
-            detector.finalize(last_frame)
-            
+        if cache:
+            cache.close(complete=finished)
+        # Closes open clips, writes the event index and waits for the clip encoder
+        detector.finalize(last_frame)
         cap.release()
-        out.release()
         if pbar:
             pbar.close()
-    
+
+    return detector.clip_recorder.index, detector.clip_recorder.index_path
+
+def index_matches(index, index_path, input_video, video_hash):
+    """
+    The index dir is keyed by file name only: reuse it only for the same content
+    (indexes without a content hash: same path and written after the video)
+    """
+    if index.video_hash is not None:
+        return index.video_hash == video_hash
+    return (index.source is not None and os.path.abspath(index.source) == os.path.abspath(input_video)
+            and os.path.getmtime(index_path) >= os.path.getmtime(input_video))
+
+def generate_summary(input_video, output_video, index_path=None, reuse_index=True):
+    if not os.path.exists(input_video):
+        print(f"Error: {input_video} not found!")
+        return
+
+    # Reuse the event index of an earlier run (backend, batch, ...) when available
+    if index_path is None:
+        stem = os.path.splitext(os.path.basename(input_video))[0]
+        index_path = os.path.join("data/clips", stem, "events.json")
+
+    video_hash = file_sha256(input_video)
+    index = EventIndex.load(index_path) if reuse_index and os.path.exists(index_path) else None
+    if index is not None and not index_matches(index, index_path, input_video, video_hash):
+        print(f"Stored event index {index_path} belongs to another video, rebuilding")
+        index = None
+    if index is not None:
+        print(f"Using stored event index: {index_path}")
+    else:
+        index, index_path = build_event_index(input_video, video_hash)
+
+    if not index.events:
+        print("\nNo violations found. Summary video not written.")
+        return
+
+    # Cut the summary from the source by seeking - no second inference pass
+    written = assemble_summary(index, output_video, source_video=input_video)
+
     print(f"\nProcessing Complete!")
-    print(f"Captured {violation_frames_count} frames with active violations.")
+    print(f"Captured {written} frames across {len(index.events)} violation clips.")
     print(f"Summary video saved to: {output_video}")
+    print(f"Event clips + index saved in: {os.path.dirname(index_path)}/")
     print(f"Evidence images saved in: data/evidence/")
 
 if __name__ == "__main__":
     # Adjust paths relative to project root
     input_video_path = 'data/test_video.mp4'
     output_video_path = 'data/violation_summary.mp4'
-    
+
     generate_summary(input_video_path, output_video_path)
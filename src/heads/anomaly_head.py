@@ -9,17 +9,18 @@ from src.utils.movement_utils import MovementDetector
 from src.utils.interaction_utils import InteractionDetector
 
 class AnomalyHead(IntelligenceHead):
-    def __init__(self):
-        self.stopped = StoppedVehicleDetector()
-        self.lane = LaneViolationDetector()
-        self.pedestrian = PedestrianDetector()
-        self.movement = MovementDetector()
-        self.interaction = InteractionDetector()
+    SERVICES = ('proximity',)
+
+    def __init__(self, stopped=None, lane=None, pedestrian=None, movement=None, interaction=None):
+        # Each argument: keyword arguments of that detector (e.g. stopped={'time_threshold': 45})
+        self.stopped = StoppedVehicleDetector(**(stopped or {}))
+        self.lane = LaneViolationDetector(**(lane or {}))
+        self.pedestrian = PedestrianDetector(**(pedestrian or {}))
+        self.movement = MovementDetector(**(movement or {}))
+        self.interaction = InteractionDetector(**(interaction or {}))
 
     def process(self, context: FrameContext) -> Dict[str, Any]:
-        frame = getattr(context, 'frame', None) # Need frame for some logic? or just results?
-        # StoppedVehicleDetector needs FRAME for pixel checks sometimes, but mostly results.
-        # Detector currently passes frame.
+        frame = getattr(context, 'frame', None) # None on replay of recorded detections
         
         results = context.results
         if results is None:
@@ -30,15 +31,15 @@ class AnomalyHead(IntelligenceHead):
         # We need stationary IDs for interaction detector
         # But wait, StoppedDetector returns (anomalies, stationary_ids)
         
-        if frame is not None:
-             stopped_anomalies, stationary_ids = self.stopped.detect_stopped_vehicle(frame, results)
-        else:
-             stopped_anomalies, stationary_ids = [], [] # Fallback if no frame
+        # Works from the detections alone (frame is unused), so replay keeps stopped/boarding logic;
+        # durations are measured on the context clock (capture time live, video time otherwise)
+        stopped_anomalies, stationary_ids = self.stopped.detect_stopped_vehicle(frame, results, context.timestamp)
              
         lane_anomalies = self.lane.detect_lane_violation(results)
         jaywalking = self.pedestrian.detect_jaywalking(results)
         wrong_way = self.movement.detect_wrong_way(results)
-        boarding = self.interaction.detect_illegal_boarding(results, stationary_ids)
+        boarding = self.interaction.detect_illegal_boarding(results, stationary_ids, context.services.get('proximity'),
+                                                            context.timestamp)
         
         # Aggregate
         raw_list = stopped_anomalies + lane_anomalies + jaywalking + wrong_way + boarding
@@ -51,3 +52,12 @@ class AnomalyHead(IntelligenceHead):
             })
             
         return {"events": events}
+
+    def memory_stats(self) -> Dict[str, Any]:
+        return {
+            "stopped": self.stopped.memory_stats(),
+            "lane": self.lane.memory_stats(),
+            "pedestrian": self.pedestrian.memory_stats(),
+            "movement": self.movement.memory_stats(),
+            "interaction": self.interaction.memory_stats()
+        }
@@ -4,9 +4,10 @@ from typing import Dict, Any
 from src.utils.accident_utils import CollisionDetector
 
 class CollisionHead(IntelligenceHead):
-    def __init__(self):
+    def __init__(self, **kwargs):
         # We reuse the logic class for now, but configured cleanly
-        self.detector = CollisionDetector(iou_threshold=0.4) 
+        # kwargs: CollisionDetector thresholds (iou_threshold, proximity_factor, plane_factor)
+        self.detector = CollisionDetector(**kwargs)
 
     def process(self, context: FrameContext) -> Dict[str, Any]:
         """
@@ -24,7 +25,7 @@ class CollisionHead(IntelligenceHead):
         if context.results is None:
             return {"collisions": []}
             
-        anomalies = self.detector.detect_collisions(context.results, estimator)
+        anomalies = self.detector.detect_collisions(context.results, estimator, context.services.get('proximity'))
         
         # Convert internal anomaly format to Telemetry Event format immediately?
         # Or return raw and let Bus/Serializer handle it?
@@ -38,4 +39,7 @@ class CollisionHead(IntelligenceHead):
                 "data": anomaly
             })
             
-        return {"events": events} 
+        return {"events": events}
+
+    def memory_stats(self) -> Dict[str, Any]:
+        return self.detector.memory_stats()
@@ -0,0 +1,34 @@
+from src.core.interfaces import IntelligenceHead
+from src.core.context import FrameContext
+from typing import Dict, Any
+from src.utils.conflict_utils import ConflictAnalyzer
+
+class ConflictHead(IntelligenceHead):
+    """Near-miss analytics: TTC / PET conflicts between vehicles and with pedestrians"""
+    SEVERITY = {'critical': 'critical', 'serious': 'warning', 'moderate': 'info'}
+    SERVICES = ('speed_estimator',)
+
+    def __init__(self, **kwargs):
+        # kwargs: ConflictAnalyzer thresholds (horizon, ttc_thresholds, pet_thresholds, ...)
+        self.analyzer = ConflictAnalyzer(**kwargs)
+
+    def process(self, context: FrameContext) -> Dict[str, Any]:
+        if context.results is None or context.results.boxes is None:
+            return {"events": [], "metrics": {"conflicts": self.analyzer.metrics(context.timestamp)}}
+
+        # Velocities come from the shared SpeedEstimator (already updated for this frame)
+        estimator = context.services.get('speed_estimator')
+        conflicts, metrics = self.analyzer.update(context.results, estimator, context.timestamp)
+
+        events = []
+        for conflict in conflicts:
+            events.append({
+                "type": "traffic_conflict",
+                "severity": self.SEVERITY.get(conflict['grade'], 'info'),
+                "data": conflict
+            })
+
+        return {"events": events, "metrics": {"conflicts": metrics}}
+
+    def memory_stats(self) -> Dict[str, Any]:
+        return self.analyzer.memory_stats()
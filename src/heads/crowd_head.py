@@ -5,6 +5,8 @@ from typing import Dict, Any, List
 # but this head is responsible for the DATA (points)
 
 class CrowdHead(IntelligenceHead):
+    SERVICES = ()
+
     def process(self, context: FrameContext) -> Dict[str, Any]:
         results = context.results
         crowd_data: List[Dict[str, float]] = []
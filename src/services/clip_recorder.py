@@ -0,0 +1,320 @@
+import os
+import json
+import threading
+from collections import deque
+from queue import Full, Queue
+from typing import Dict, Any, List
+
+import cv2
+import numpy as np
+
+
+class FrameRingBuffer:
+    """
+    Fixed-size buffer of the most recent frames, stored JPEG-encoded.
+    A 720p frame is ~2.7MB raw but ~60-120KB as JPEG, so a few seconds of
+    pre-roll costs a few MB instead of a few hundred. The frame loop only
+    appends the raw frame; the clip encoder thread JPEG-encodes it in place
+    (encode()), so raw frames are held only while they wait in its bounded queue.
+    """
+    def __init__(self, capacity=90, jpeg_quality=80):
+        self.capacity = capacity
+        self.jpeg_quality = jpeg_quality
+        self._frames = deque()  # [[frame_number, raw frame | jpeg_bytes | None (dropped)]]
+
+    def push(self, frame, frame_number):
+        """Append a raw frame; returns its entry for encode()"""
+        if len(self._frames) >= self.capacity:
+            self._frames.popleft()[1] = None # Evicted before encoding: nothing left to encode
+        entry = [frame_number, frame]
+        self._frames.append(entry)
+        return entry
+
+    def encode(self, entry):
+        """Replace a still-raw entry by its JPEG (encoder thread)"""
+        frame = entry[1]
+        if isinstance(frame, np.ndarray):
+            ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+            entry[1] = buffer.tobytes() if ret else None
+
+    def snapshot(self):
+        """Return the buffered (frame_number, raw frame or jpeg_bytes), oldest first"""
+        return [(n, payload) for n, payload in list(self._frames) if payload is not None]
+
+    def clear(self):
+        self._frames.clear()
+
+    def __len__(self):
+        return len(self._frames)
+
+
+class EventIndex:
+    """
+    Per-source index of violation events and the frame ranges (pre/post-roll
+    included) they cover. Lets summaries be cut from the source by seeking
+    instead of re-running inference.
+    """
+    def __init__(self, source=None, fps=30.0, events=None, video_hash=None):
+        self.source = source
+        self.fps = fps
+        self.events: List[Dict[str, Any]] = events or []
+        self.video_hash = video_hash # Content hash of the source file, when known
+
+    def add(self, record: Dict[str, Any]):
+        self.events.append(record)
+
+    def merged_ranges(self):
+        """Frame ranges [start, end] with overlapping/adjacent clips merged"""
+        ranges = sorted((e['start_frame'], e['end_frame']) for e in self.events)
+        merged = []
+        for start, end in ranges:
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({"source": self.source, "video_hash": self.video_hash, "fps": self.fps, "events": self.events},
+                      f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(source=data.get('source'), fps=data.get('fps', 30.0), events=data.get('events', []),
+                   video_hash=data.get('video_hash'))
+
+
+class ClipRecorder:
+    """
+    Event-driven evidence clip extraction.
+    Every frame goes into a ring buffer of JPEG frames. A VIOLATION_START opens a
+    clip seeded with the buffered pre-roll; the clip keeps collecting frames
+    until post_roll_seconds after the matching VIOLATION_END (or
+    max_clip_seconds). One background encoder thread JPEG-encodes the ring
+    buffer and writes clip frames straight into the clip files, so the frame
+    loop never encodes. Its queue holds at most max_pending frames: when it is
+    full the frame is dropped (from the pre-roll and from open clips) and counted.
+    """
+    def __init__(self, output_dir="data/clips", fps=30.0, pre_roll_seconds=3.0,
+                 post_roll_seconds=3.0, max_clip_seconds=30.0, jpeg_quality=80, max_pending=32):
+        self.output_dir = output_dir
+        self.pre_roll_seconds = pre_roll_seconds
+        self.post_roll_seconds = post_roll_seconds
+        self.max_clip_seconds = max_clip_seconds
+        self.jpeg_quality = jpeg_quality
+
+        self.open_clips: Dict[tuple, Dict[str, Any]] = {}  # {(event_type, vehicle_id): clip_state}
+        self.set_source("stream", fps)
+
+        self.frames_dropped = 0
+        self._encode_queue = Queue(maxsize=max_pending)
+        self._encoder = None # Started on first use, again after close()
+
+    def set_source(self, source_name, fps=30.0):
+        """Start a new source: drop buffered frames and begin a fresh event index"""
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.pre_roll_frames = int(self.pre_roll_seconds * self.fps)
+        self.post_roll_frames = int(self.post_roll_seconds * self.fps)
+        self.max_clip_frames = int(self.max_clip_seconds * self.fps)
+
+        self.source_name = os.path.splitext(os.path.basename(source_name))[0]
+        self.clip_dir = os.path.join(self.output_dir, self.source_name)
+        self.index = EventIndex(source=source_name, fps=self.fps)
+        self.ring_buffer = FrameRingBuffer(capacity=max(1, self.pre_roll_frames), jpeg_quality=self.jpeg_quality)
+        self.open_clips = {}
+
+    @property
+    def index_path(self):
+        return os.path.join(self.clip_dir, "events.json")
+
+    def on_event(self, event: Dict[str, Any]):
+        """Consume a canonical event (see TrafficViolationDetector._serialize_event)"""
+        key = (event['event_type'], event['vehicle_id'])
+        status = event['metadata']['status']
+
+        if status == 'START':
+            if key in self.open_clips:
+                # Re-trigger of a clip still in post-roll: keep recording
+                self.open_clips[key]['end_frame'] = None
+                return
+            pre_roll = self.ring_buffer.snapshot()
+            start_frame = pre_roll[0][0] if pre_roll else event['frame_number']
+            filename = f"clip_{event['event_type']}_{event['vehicle_id']}_{event['frame_number']}.mp4"
+            clip = self.open_clips[key] = {
+                'event_type': event['event_type'],
+                'vehicle_id': event['vehicle_id'],
+                'event_frame': event['frame_number'],
+                'start_frame': start_frame,
+                'end_frame': None,
+                'path': os.path.join(self.clip_dir, filename),
+                'frames': 0
+            }
+            if not pre_roll:
+                return
+            if self._submit({'paths': [clip['path']], 'frames': [p for _, p in pre_roll], 'fps': self.fps}):
+                clip['frames'] += len(pre_roll)
+                clip['last_frame'] = pre_roll[-1][0]
+            else:
+                self.frames_dropped += len(pre_roll)
+        elif key in self.open_clips and self.open_clips[key]['end_frame'] is None:
+            self.open_clips[key]['end_frame'] = event['frame_number']
+
+    def push_frame(self, frame, frame_number):
+        """Buffer the frame and append it to every open clip (one encoder job either way)"""
+        if frame is None or frame.size == 0:
+            return
+        entry = self.ring_buffer.push(frame, frame_number)
+
+        # Events are consumed before the frame is pushed, so the pre-roll of a clip
+        # opened this frame never already contains it
+        clips = list(self.open_clips.items())
+        if self._submit({'paths': [clip['path'] for _, clip in clips], 'frames': [frame], 'entry': entry,
+                         'fps': self.fps}):
+            for _, clip in clips:
+                clip['frames'] += 1
+                clip['last_frame'] = frame_number
+        else:
+            entry[1] = None # Not encoded: a gap in the pre-roll rather than a raw frame held
+            self.frames_dropped += 1
+
+        for key, clip in clips:
+            ended = clip['end_frame'] is not None and frame_number - clip['end_frame'] >= self.post_roll_frames
+            if ended or frame_number - clip['start_frame'] + 1 >= self.max_clip_frames:
+                self._close_clip(key)
+
+    def _submit(self, job, block=False):
+        """Queue an encoder job; False if the queue is full (never for block=True)"""
+        if self._encoder is None or not self._encoder.is_alive():
+            self._encoder = threading.Thread(target=self._encode_worker, daemon=True, name="clip-encoder")
+            self._encoder.start()
+        try:
+            self._encode_queue.put(job, block=block)
+            return True
+        except Full:
+            return False
+
+    def flush(self):
+        """Close all open clips (end of source) and persist the event index"""
+        for key in list(self.open_clips.keys()):
+            self._close_clip(key)
+        if self.index.events:
+            self.index.save(self.index_path)
+
+    def close(self):
+        """Flush and stop the encoder thread (idempotent; a later frame or event restarts it)"""
+        self.flush()
+        if self._encoder is not None and self._encoder.is_alive():
+            self._encode_queue.put(None)
+            self._encoder.join()
+        self._encoder = None
+
+    def wait(self):
+        """Block until every queued clip has been written"""
+        self._encode_queue.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open_clips": len(self.open_clips),
+            "queue_depth": self._encode_queue.qsize(),
+            "queue_capacity": self._encode_queue.maxsize,
+            "frames_dropped": self.frames_dropped
+        }
+
+    def _close_clip(self, key):
+        clip = self.open_clips.pop(key)
+        if not clip['frames']:
+            return
+        self._submit({'close': clip['path']}, block=True) # Must not be lost: waits for a free slot
+
+        self.index.add({
+            "event_type": clip['event_type'],
+            "vehicle_id": clip['vehicle_id'],
+            "event_frame": clip['event_frame'],
+            "start_frame": clip['start_frame'],
+            "end_frame": clip.get('last_frame', clip['event_frame']),
+            "clip_path": clip['path']
+        })
+
+    def _encode_worker(self):
+        """Background thread: append frames to their clip files, JPEG-encode the ring buffer entry"""
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        writers = {} # clip path -> VideoWriter, opened on the clip's first frame
+        while True:
+            job = self._encode_queue.get()
+            try:
+                if job is None:
+                    break
+                if 'close' in job:
+                    writer = writers.pop(job['close'], None)
+                    if writer is not None:
+                        writer.release()
+                    continue
+                for path in job['paths']:
+                    for payload in job['frames']:
+                        frame = payload if isinstance(payload, np.ndarray) else \
+                            cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+                        writer = writers.get(path)
+                        if writer is None:
+                            os.makedirs(os.path.dirname(path), exist_ok=True)
+                            h, w = frame.shape[:2]
+                            writer = writers[path] = cv2.VideoWriter(path, fourcc, job['fps'], (w, h))
+                        writer.write(frame)
+                if job.get('entry') is not None:
+                    self.ring_buffer.encode(job['entry'])
+            except Exception as e:
+                print(f"ERROR in Clip Encoder: {e}")
+            finally:
+                self._encode_queue.task_done()
+        for writer in writers.values():
+            writer.release()
+
+
+def assemble_summary(index: EventIndex, output_video, source_video=None):
+    """
+    Build a summary video from an event index without re-running inference.
+    Seeks the source video when available, otherwise concatenates the stored clips.
+    Returns the number of frames written.
+    """
+    writer = None
+    written = 0
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+
+    def _write(frame):
+        nonlocal writer, written
+        if writer is None:
+            h, w = frame.shape[:2]
+            writer = cv2.VideoWriter(output_video, fourcc, index.fps, (w, h))
+        writer.write(frame)
+        written += 1
+
+    try:
+        if source_video is not None and os.path.exists(source_video):
+            cap = cv2.VideoCapture(source_video)
+            for start, end in index.merged_ranges():
+                # Detector frame numbers are 1-based, capture positions are 0-based
+                cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, start - 1))
+                for _ in range(end - start + 1):
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    _write(frame)
+            cap.release()
+        else:
+            for event in sorted(index.events, key=lambda e: e['start_frame']):
+                cap = cv2.VideoCapture(event['clip_path'])
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    _write(frame)
+                cap.release()
+    finally:
+        if writer is not None:
+            writer.release()
+    return written
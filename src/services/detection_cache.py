@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Dict, Optional
+
+from src.core.recording import DetectionRecording, RecordingWriter
+
+HASH_CHUNK = 1024 * 1024
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class DetectionCacheSession:
+    """
+    One pass over one video: serves cached frames on a hit, otherwise records
+    what the detector produced and stores it on close().
+    """
+    def __init__(self, cache, key, meta, cached=None, fps=30.0):
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+        self.cached = cached
+        self.recorder = RecordingWriter(fps=fps, source=meta['video_hash']) if cached is None else None
+
+    @property
+    def hit(self):
+        return self.cached is not None
+
+    def results(self, frame_idx):
+        """Cached results for frame_idx (0-based), or None to run inference"""
+        if self.cached is not None and frame_idx < len(self.cached):
+            return self.cached[frame_idx]
+        return None
+
+    def record(self, results):
+        if self.recorder is not None:
+            self.recorder.append(results)
+
+    def close(self, complete=True):
+        """Store the recording; complete=False if the video was not read to the end"""
+        if self.recorder is not None and len(self.recorder) and not self.recorder.failed:
+            self.cache.store(self.key, self.meta, self.recorder, complete)
+        self.recorder = None
+
+class DetectionCache:
+    """
+    Persistent cache of per-frame tracked detections, keyed by
+    (video content hash, model weights hash, perception config). A later pass
+    over the same video with the same perception settings feeds the cached
+    results to process_frame(context_results=...) and skips preprocessing and
+    YOLO. Entries are DetectionRecording directories (memory-mapped on read)
+    indexed in SQLite; the least recently used ones are evicted beyond
+    max_bytes / max_entries.
+    """
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000"
+    )
+
+    def __init__(self, root="data/detection_cache", max_bytes=2 * 1024 ** 3, max_entries=500):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    video_hash TEXT NOT NULL,
+                    weights_hash TEXT NOT NULL,
+                    config TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    frames INTEGER NOT NULL,
+                    complete INTEGER NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_video ON entries(video_hash)')
+
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.root, "index.db"), timeout=5.0)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @staticmethod
+    def make_key(video_hash, weights_hash, config):
+        blob = json.dumps({"video": video_hash, "weights": weights_hash, "config": config}, sort_keys=True)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def open(self, video_path, weights_hash, config, video_hash=None, frames=None, fps=30.0) -> DetectionCacheSession:
+        """
+        Session for one pass over video_path. frames: how many frames the caller
+        will read (None = the whole video); shorter recordings are not a hit.
+        fps gives the recorded frame timestamps.
+        """
+        video_hash = video_hash or file_sha256(video_path)
+        key = self.make_key(video_hash, weights_hash, config)
+        meta = {"video_hash": video_hash, "weights_hash": weights_hash, "config": config}
+        return DetectionCacheSession(self, key, meta, self.lookup(key, frames), fps=fps)
+
+    def lookup(self, key, frames=None) -> Optional[DetectionRecording]:
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute('SELECT path, frames, complete FROM entries WHERE key = ?', (key,)).fetchone()
+            usable = row is not None and (row[2] or (frames is not None and row[1] >= frames))
+            if usable:
+                conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+        if not usable:
+            self.misses += 1
+            return None
+        try:
+            cached = DetectionRecording(os.path.join(self.root, row[0]))
+        except (OSError, ValueError, KeyError):
+            self.invalidate(key=key) # Missing or truncated file
+            self.misses += 1
+            return None
+        self.hits += 1
+        return cached
+
+    def store(self, key, meta, recorder, complete=True):
+        filename = key
+        recording = DetectionRecording(recorder.save(os.path.join(self.root, filename)))
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute('INSERT OR REPLACE INTO entries (key, video_hash, weights_hash, config, path, frames, '
+                         'complete, size_bytes, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         (key, meta['video_hash'], meta['weights_hash'], json.dumps(meta['config'], sort_keys=True),
+                          filename, len(recorder), int(complete), recording.nbytes, now, now))
+        self.evict(keep=key)
+
+    def _delete(self, conn, rows):
+        for key, path in rows:
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            path = os.path.join(self.root, path)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+        return len(rows)
+
+    def evict(self, keep=None) -> int:
+        """Drop least recently used entries until both limits hold"""
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute('SELECT key, path, size_bytes FROM entries ORDER BY last_used DESC').fetchall()
+            total, doomed = 0, []
+            for rank, (key, path, size) in enumerate(rows):
+                total += size
+                if key != keep and (rank >= self.max_entries or total > self.max_bytes):
+                    doomed.append((key, path))
+                    total -= size
+            return self._delete(conn, doomed)
+
+    def invalidate(self, key=None, video_hash=None, weights_hash=None) -> int:
+        """Remove matching entries (all given filters must match); returns how many"""
+        filters = {'key': key, 'video_hash': video_hash, 'weights_hash': weights_hash}
+        clauses = [(f'{column} = ?', value) for column, value in filters.items() if value is not None]
+        if not clauses:
+            raise ValueError("invalidate() needs key, video_hash or weights_hash (use clear() to drop everything)")
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute('SELECT key, path FROM entries WHERE ' + ' AND '.join(c for c, _ in clauses),
+                                [v for _, v in clauses]).fetchall()
+            return self._delete(conn, rows)
+
+    def invalidate_other_weights(self, weights_hash) -> int:
+        """Remove entries recorded with any other model weights (they can never hit again)"""
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute('SELECT key, path FROM entries WHERE weights_hash != ?', (weights_hash,)).fetchall()
+            return self._delete(conn, rows)
+
+    def clear(self) -> int:
+        with closing(self._connect()) as conn, conn:
+            return self._delete(conn, conn.execute('SELECT key, path FROM entries').fetchall())
+
+    def stats(self) -> Dict[str, Any]:
+        with closing(self._connect()) as conn:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM entries').fetchone()
+        return {"entries": entries, "size_bytes": size, "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
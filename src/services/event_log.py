@@ -0,0 +1,304 @@
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Any, List
+
+import numpy as np
+
+from src.utils.database import normalize_timestamp
+
+STATUS_CODES = {'START': 1, 'END': 0}
+
+# One row per canonical event; strings that repeat a lot are dictionary-encoded
+SEGMENT_DTYPE = np.dtype([
+    ('ts', 'f8'),            # epoch seconds
+    ('frame', 'i8'),
+    ('type', 'u2'),          # index into manifest['types']
+    ('camera', 'u2'),        # index into manifest['cameras']
+    ('status', 'i1'),        # STATUS_CODES, -1 if unknown
+    ('vehicle_id', 'U32'),
+    ('event_id', 'U36')
+])
+
+def to_epoch(value):
+    """Epoch seconds from a float or a timestamp string (normalize_timestamp formats, ValueError otherwise)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.strptime(normalize_timestamp(value), "%Y-%m-%d %H:%M:%S").timestamp()
+
+class EventLog:
+    """
+    Append-only log of canonical events for historical analytics.
+    Events are appended to a small NDJSON write-ahead file; every
+    `segment_size` events the tail is rolled into an immutable, compressed
+    NumPy structured-array segment. The manifest keeps per-segment min/max
+    time and per-type counts, so aggregations skip segments outside the
+    requested range/types and answer whole-segment counts without loading them.
+    A log has a single writer; other processes open it with readonly=True
+    (a snapshot of the manifest, segments and WAL tail at open time).
+    """
+    def __init__(self, root="data/event_log", segment_size=50000, readonly=False):
+        self.root = root
+        self.readonly = readonly
+        self.segment_dir = os.path.join(root, "segments")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.segment_size = segment_size
+        self._lock = threading.Lock()
+        if not readonly:
+            os.makedirs(self.segment_dir, exist_ok=True)
+
+        self.manifest = self._load_manifest()
+        self._type_index = {t: i for i, t in enumerate(self.manifest['types'])}
+        self._camera_index = {c: i for i, c in enumerate(self.manifest['cameras'])}
+        self._tail: List[Dict[str, Any]] = []
+        self._recover()
+        self._wal = open(self._wal_path(), 'a', encoding='utf-8') if not readonly else None
+
+    # --- Persistence ---
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        return {"version": 1, "wal": "wal_000000.ndjson", "next_segment": 0,
+                "types": [], "cameras": [], "segments": []}
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _wal_path(self):
+        return os.path.join(self.root, self.manifest['wal'])
+
+    def _recover(self):
+        # Only the WAL named in the manifest is live; older ones were already rolled
+        if not self.readonly:
+            for name in os.listdir(self.root):
+                if name.startswith("wal_") and name != self.manifest['wal']:
+                    os.remove(os.path.join(self.root, name))
+        if not os.path.exists(self._wal_path()):
+            return
+        with open(self._wal_path(), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self._tail.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break # Torn last line from a crash
+
+    def append_many(self, events):
+        """Append canonical events (as built by the detector); rolls a segment when the tail is full"""
+        if not events:
+            return
+        if self.readonly:
+            raise ValueError(f"Event log {self.root} is open read-only")
+        with self._lock:
+            records = [self._record(e) for e in events]
+            self._wal.write(''.join(json.dumps(r) + '\n' for r in records))
+            self._wal.flush()
+            self._tail.extend(records)
+            if len(self._tail) >= self.segment_size:
+                self._roll()
+
+    def append(self, event):
+        self.append_many([event])
+
+    def flush(self):
+        """Roll whatever is in the tail into a segment (e.g. on shutdown)"""
+        with self._lock:
+            if self._tail and not self.readonly:
+                self._roll()
+
+    def close(self):
+        # The tail stays in the WAL and is recovered on the next start (no tiny segments)
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+
+    @staticmethod
+    def _record(event):
+        return {
+            'ts': to_epoch(event.get('timestamp')) if event.get('timestamp') else datetime.now().timestamp(),
+            'frame': int(event.get('frame_number') or 0),
+            'type': event.get('event_type', 'unknown'),
+            'camera': event.get('camera_id') or '',
+            'status': event.get('metadata', {}).get('status', ''),
+            'vehicle_id': str(event.get('vehicle_id', ''))[:32],
+            'event_id': str(event.get('event_id', ''))[:36]
+        }
+
+    def _code(self, index, key, value):
+        code = index.get(value)
+        if code is None:
+            code = len(self.manifest[key])
+            self.manifest[key].append(value)
+            index[value] = code
+        return code
+
+    def _to_array(self, records):
+        arr = np.empty(len(records), dtype=SEGMENT_DTYPE)
+        arr['ts'] = [r['ts'] for r in records]
+        arr['frame'] = [r['frame'] for r in records]
+        arr['type'] = [self._code(self._type_index, 'types', r['type']) for r in records]
+        arr['camera'] = [self._code(self._camera_index, 'cameras', r['camera']) for r in records]
+        arr['status'] = [STATUS_CODES.get(r['status'], -1) for r in records]
+        arr['vehicle_id'] = [r['vehicle_id'] for r in records]
+        arr['event_id'] = [r['event_id'] for r in records]
+        return arr
+
+    def _roll(self):
+        arr = self._to_array(self._tail)
+        seg_no = self.manifest['next_segment']
+        name = f"seg_{seg_no:06d}.npz"
+        tmp_path = os.path.join(self.segment_dir, name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, events=arr)
+        os.replace(tmp_path, os.path.join(self.segment_dir, name))
+
+        start = arr['status'] == STATUS_CODES['START']
+        type_codes, counts = np.unique(arr['type'], return_counts=True)
+        start_codes, start_counts = np.unique(arr['type'][start], return_counts=True)
+        self.manifest['segments'].append({
+            "file": name,
+            "count": int(len(arr)),
+            "t_min": float(arr['ts'].min()),
+            "t_max": float(arr['ts'].max()),
+            "type_counts": {self.manifest['types'][c]: int(n) for c, n in zip(type_codes, counts)},
+            "start_counts": {self.manifest['types'][c]: int(n) for c, n in zip(start_codes, start_counts)}
+        })
+        self.manifest['next_segment'] = seg_no + 1
+
+        # Switch to a fresh WAL only once the manifest references the segment
+        old_wal = self._wal_path()
+        self.manifest['wal'] = f"wal_{seg_no + 1:06d}.ndjson"
+        self._save_manifest()
+        self._wal.close()
+        os.remove(old_wal)
+        self._wal = open(self._wal_path(), 'a', encoding='utf-8')
+        self._tail = []
+
+    # --- Queries ---
+
+    def _segment_matches(self, seg, since, until, type_names):
+        if since is not None and seg['t_max'] < since:
+            return False
+        if until is not None and seg['t_min'] > until:
+            return False
+        if type_names is not None and not (set(seg['type_counts']) & type_names):
+            return False
+        return True
+
+    def _filter(self, arr, since, until, type_names, camera_id):
+        mask = np.ones(len(arr), dtype=bool)
+        if since is not None:
+            mask &= arr['ts'] >= since
+        if until is not None:
+            mask &= arr['ts'] <= until
+        if type_names is not None:
+            codes = [self._type_index[t] for t in type_names if t in self._type_index]
+            mask &= np.isin(arr['type'], codes)
+        if camera_id is not None:
+            mask &= arr['camera'] == self._camera_index.get(camera_id, -1)
+        return arr[mask]
+
+    def scan(self, since=None, until=None, types=None, camera_id=None):
+        """Yield filtered structured arrays, reading only segments overlapping the time range and types"""
+        since, until = to_epoch(since), to_epoch(until)
+        type_names = set(types) if types else None
+        with self._lock:
+            segments = list(self.manifest['segments'])
+            tail = self._to_array(self._tail) if self._tail else None
+        for seg in segments:
+            if not self._segment_matches(seg, since, until, type_names):
+                continue
+            with np.load(os.path.join(self.segment_dir, seg['file'])) as data:
+                arr = data['events']
+            yield self._filter(arr, since, until, type_names, camera_id)
+        if tail is not None:
+            yield self._filter(tail, since, until, type_names, camera_id)
+
+    def count_by_type(self, since=None, until=None, types=None, camera_id=None, starts_only=True):
+        """
+        {event_type: count} over a time range. Segments entirely inside the range
+        are answered from the manifest without being read.
+        """
+        since_ts, until_ts = to_epoch(since), to_epoch(until)
+        type_names = set(types) if types else None
+        key = 'start_counts' if starts_only else 'type_counts'
+        totals: Dict[str, int] = {}
+        partial = []
+        with self._lock:
+            segments = list(self.manifest['segments'])
+            tail = self._to_array(self._tail) if self._tail else None
+        for seg in segments:
+            if not self._segment_matches(seg, since_ts, until_ts, type_names):
+                continue
+            inside = (since_ts is None or seg['t_min'] >= since_ts) and (until_ts is None or seg['t_max'] <= until_ts)
+            if inside and camera_id is None:
+                for t, n in seg[key].items():
+                    if type_names is None or t in type_names:
+                        totals[t] = totals.get(t, 0) + n
+            else:
+                partial.append(seg)
+
+        def add(arr):
+            if starts_only:
+                arr = arr[arr['status'] == STATUS_CODES['START']]
+            codes, counts = np.unique(arr['type'], return_counts=True)
+            for c, n in zip(codes, counts):
+                t = self.manifest['types'][c]
+                totals[t] = totals.get(t, 0) + int(n)
+
+        for seg in partial:
+            with np.load(os.path.join(self.segment_dir, seg['file'])) as data:
+                add(self._filter(data['events'], since_ts, until_ts, type_names, camera_id))
+        if tail is not None:
+            add(self._filter(tail, since_ts, until_ts, type_names, camera_id))
+        return totals
+
+    def histogram(self, bucket_seconds=3600, since=None, until=None, types=None, camera_id=None, starts_only=True):
+        """Event counts per time bucket: [{"bucket_start": epoch, "counts": {type: n}}] sorted by time"""
+        buckets: Dict[float, Dict[str, int]] = {}
+        for arr in self.scan(since, until, types, camera_id):
+            if starts_only:
+                arr = arr[arr['status'] == STATUS_CODES['START']]
+            if not len(arr):
+                continue
+            starts = np.floor(arr['ts'] / bucket_seconds) * bucket_seconds
+            keys = np.stack([starts, arr['type'].astype('f8')], axis=1)
+            uniq, counts = np.unique(keys, axis=0, return_counts=True)
+            for (b, c), n in zip(uniq, counts):
+                slot = buckets.setdefault(float(b), {})
+                t = self.manifest['types'][int(c)]
+                slot[t] = slot.get(t, 0) + int(n)
+        return [{"bucket_start": b, "counts": buckets[b]} for b in sorted(buckets)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "segments": len(self.manifest['segments']),
+                "segment_events": sum(s['count'] for s in self.manifest['segments']),
+                "tail_events": len(self._tail)
+            }
+
+def merge_counts(counts_list):
+    """Sum several count_by_type() results (e.g. the API's log and the job workers' logs)"""
+    totals: Dict[str, int] = {}
+    for counts in counts_list:
+        for t, n in counts.items():
+            totals[t] = totals.get(t, 0) + n
+    return totals
+
+def merge_histograms(histograms):
+    """Merge several histogram() results with the same bucket size"""
+    buckets: Dict[float, Dict[str, int]] = {}
+    for histogram in histograms:
+        for row in histogram:
+            slot = buckets.setdefault(row['bucket_start'], {})
+            for t, n in row['counts'].items():
+                slot[t] = slot.get(t, 0) + n
+    return [{"bucket_start": b, "counts": buckets[b]} for b in sorted(buckets)]
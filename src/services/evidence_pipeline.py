@@ -0,0 +1,198 @@
+import heapq
+import itertools
+import threading
+from datetime import datetime
+from typing import Dict, Any
+
+from src.visualization import capture_violation_evidence
+from src.utils.evidence_manager import dhash
+
+class EvidencePipeline:
+    """
+    Asynchronous evidence capture.
+    The frame loop only enqueues a reference to the frame; annotation, JPEG
+    encoding, the evidence-store write and the DB hand-off all run on a small
+    worker pool. The queue is bounded: when it is full, the lowest-priority job
+    (queued or incoming) is dropped so collisions are never starved by a burst
+    of lower-severity captures.
+
+    With a NearDuplicateIndex (`dedupe`), captures that look like one already
+    taken on the same camera moments ago are not re-encoded: in 'link' mode the
+    row points at the original image, in 'skip' mode it is dropped entirely.
+    """
+    # Lower value = more important
+    PRIORITY = {
+        'collision': 0,
+        'accident': 0,
+        'potential_accident': 1,
+        'wrong_way': 1,
+        'traffic_violation': 2,
+        'stalled_vehicle': 2,
+        'illegal_boarding': 3
+    }
+    DEFAULT_PRIORITY = 4
+
+    def __init__(self, store, save_queue, max_queue=32, workers=2, dedupe=None, dedupe_mode='link'):
+        self.store = store
+        self.save_queue = save_queue
+        self.max_queue = max_queue
+        self.dedupe = dedupe
+        self.dedupe_mode = dedupe_mode # 'link' | 'skip'
+
+        self._heap = []  # [(priority, seq, job)]
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._in_flight = 0
+
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.dropped_by_type: Dict[str, int] = {}
+        self.linked = 0
+        self.skipped_duplicates = 0
+
+        self._workers = [
+            threading.Thread(target=self._worker, daemon=True, name=f"evidence-worker-{i}")
+            for i in range(workers)
+        ]
+        for w in self._workers:
+            w.start()
+
+    def submit(self, frame, violation_type, bbox, vehicle_id="unknown", timestamp=None, camera_id=None):
+        """
+        Queue an evidence capture. Holds a reference to `frame` (no copy), so the
+        caller must not modify the frame in place afterwards.
+        Returns False if the job was dropped (or skipped as a near-duplicate).
+        """
+        entry, dup_entry = None, None
+        if self.dedupe is not None:
+            try:
+                entry, is_dup = self.dedupe.match_or_add(dhash(frame, bbox), camera_id, violation_type)
+            except Exception as e:
+                print(f"ERROR: Perceptual hash failed: {e}")
+                entry, is_dup = None, False
+            if is_dup:
+                if self.dedupe_mode == 'skip':
+                    with self._cond:
+                        self.skipped_duplicates += 1
+                    return False
+                entry, dup_entry = None, entry
+
+        job = {
+            'frame': frame,
+            'type': violation_type,
+            'bbox': bbox,
+            'vehicle_id': vehicle_id,
+            'camera_id': camera_id,
+            'timestamp': timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'dedupe_entry': entry,       # New image: record its hash for later duplicates
+            'duplicate_of': dup_entry    # Near-duplicate: reuse the original's image
+        }
+        priority = self.PRIORITY.get(violation_type, self.DEFAULT_PRIORITY)
+
+        with self._cond:
+            if self._closed:
+                return False
+            self.submitted += 1
+            if len(self._heap) >= self.max_queue:
+                # Full: evict the least important queued job if the new one outranks it
+                worst_idx = max(range(len(self._heap)), key=lambda i: (self._heap[i][0], self._heap[i][1]))
+                if self._heap[worst_idx][0] <= priority:
+                    self._record_drop(violation_type)
+                    return False
+                evicted = self._heap[worst_idx][2]
+                self._heap[worst_idx] = self._heap[-1]
+                self._heap.pop()
+                heapq.heapify(self._heap)
+                self._record_drop(evicted['type'])
+            heapq.heappush(self._heap, (priority, next(self._seq), job))
+            self._cond.notify_all() # wait() shares the condition: wake a worker for sure
+        return True
+
+    def _record_drop(self, violation_type):
+        self.dropped += 1
+        self.dropped_by_type[violation_type] = self.dropped_by_type.get(violation_type, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and drop counters for telemetry"""
+        with self._cond:
+            return {
+                "queue_depth": len(self._heap),
+                "queue_capacity": self.max_queue,
+                "in_flight": self._in_flight,
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "dropped_by_type": dict(self.dropped_by_type),
+                "linked_duplicates": self.linked,
+                "skipped_duplicates": self.skipped_duplicates
+            }
+
+    def wait(self):
+        """Block until every queued capture has been handed to the save queue"""
+        with self._cond:
+            while self._heap or self._in_flight:
+                self._cond.wait()
+
+    def close(self):
+        """Drain the queue and stop the workers"""
+        self.wait()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for w in self._workers:
+            w.join()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+                self._in_flight += 1
+            try:
+                self._process(job)
+                ok = True
+            except Exception as e:
+                print(f"ERROR in Evidence Worker: {e}")
+                ok = False
+            with self._cond:
+                self._in_flight -= 1
+                if ok:
+                    self.processed += 1
+                else:
+                    self.failed += 1
+                self._cond.notify_all()
+
+    def _process(self, job):
+        original = job['duplicate_of']
+        image_hash = original['image_hash'] if original is not None else None
+        if image_hash is not None:
+            # Near-duplicate: no annotate/encode/write, the row links to the original image
+            ts = job['timestamp']
+            with self._cond:
+                self.linked += 1
+        else:
+            # Annotate a private copy: the frame loop still owns the original
+            # (also the fallback when the original is still in flight or was dropped)
+            _, ts, image_bytes = capture_violation_evidence(
+                job['frame'].copy(), job['type'], job['bbox'],
+                vehicle_id=job['vehicle_id'], timestamp=job['timestamp']
+            )
+            if image_bytes is None:
+                raise RuntimeError(f"encoding failed for {job['type']} {job['vehicle_id']}")
+            image_hash = self.store.put(image_bytes)
+            if job['dedupe_entry'] is not None:
+                job['dedupe_entry']['image_hash'] = image_hash
+        self.save_queue.put({
+            'type': job['type'],
+            'vehicle_id': job['vehicle_id'],
+            'camera_id': job['camera_id'],
+            'timestamp': ts,
+            'image_hash': image_hash
+        })
@@ -0,0 +1,275 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+import cv2
+import numpy as np
+
+from src.services.live_source import capture_time
+
+class MotionMeter:
+    """Mean absolute difference of consecutive 64x36 grayscale thumbnails (0 = static, 1 = full change)"""
+    SIZE = (64, 36)
+
+    def __init__(self):
+        self._prev = None
+
+    def update(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        thumb = cv2.resize(gray, self.SIZE, interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+        prev, self._prev = self._prev, thumb
+        return float(np.abs(thumb - prev).mean()) if prev is not None else 0.0
+
+class CameraState:
+    """Scheduling state of one camera"""
+    def __init__(self, camera_id, weight, min_fps, now):
+        self.camera_id = camera_id
+        self.weight = weight
+        self.min_fps = min_fps
+        self.finish_tag = 0.0 # Virtual finish time of its last served frame
+        self.last_served = now # Min-rate deadlines count from registration
+        self.added_at = now
+        self.served = 0
+        self.served_by_guarantee = 0
+        self.served_times = deque()
+        self.active_events: Dict[tuple, float] = {} # (event_type, vehicle_id) -> last seen
+        self.boosted_until = 0.0
+        self.motion = 0.0 # EWMA of MotionMeter values
+
+class InferenceScheduler:
+    """
+    Picks which camera's frame to infer next when one node's inference capacity
+    is shared by many streams. Start-time fair queuing over the cameras that
+    have a new frame: each served frame advances the camera's virtual finish
+    tag by 1 / effective weight, and the smallest start tag max(finish, V) goes
+    next, so served frame rates follow the weights and an idle camera earns no
+    credit. Effective weight = weight x boosts:
+    - event_boost while a collision/accident/stalled-vehicle event is active
+      (START seen, no END yet) and for boost_seconds after it,
+    - motion_boost when the frame-difference motion is above motion_high,
+    - quiet_factor when motion is below motion_low and no event is active.
+    Before fair queuing, a camera whose min_fps deadline falls within the next
+    inference slot is served (earliest deadline first): the guarantee holds
+    while the sum of min_fps stays below capacity. clock is injectable for simulation.
+    """
+    BOOST_EVENT_TYPES = ('collision', 'accident', 'potential_accident', 'stalled_vehicle')
+
+    def __init__(self, min_fps=1.0, event_boost=4.0, motion_boost=2.0, quiet_factor=0.5, boost_seconds=10.0,
+                 motion_high=0.04, motion_low=0.005, motion_alpha=0.3, event_ttl=30.0, fps_window=5.0,
+                 clock=time.monotonic):
+        self.min_fps = min_fps
+        self.event_boost = event_boost
+        self.motion_boost = motion_boost
+        self.quiet_factor = quiet_factor
+        self.boost_seconds = boost_seconds
+        self.motion_high = motion_high
+        self.motion_low = motion_low
+        self.motion_alpha = motion_alpha
+        self.event_ttl = event_ttl # An active event without END stops boosting after this long
+        self.fps_window = fps_window
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._cameras: Dict[str, CameraState] = {}
+        self._virtual_time = 0.0
+        self._last_pick = None
+        self.slot_seconds = 0.0 # EWMA of the interval between picks (one inference)
+
+    def add_camera(self, camera_id, weight=1.0, min_fps=None):
+        with self._lock:
+            state = CameraState(camera_id, weight, self.min_fps if min_fps is None else min_fps, self.clock())
+            state.finish_tag = self._virtual_time # Joins at the current virtual time, no back credit
+            self._cameras[camera_id] = state
+
+    def remove_camera(self, camera_id):
+        with self._lock:
+            self._cameras.pop(camera_id, None)
+
+    def _event_active(self, state, now):
+        if state.active_events:
+            expired = [key for key, seen in state.active_events.items() if now - seen > self.event_ttl]
+            for key in expired:
+                del state.active_events[key]
+        return bool(state.active_events) or now < state.boosted_until
+
+    def _effective_weight(self, state, now):
+        weight = state.weight
+        event_active = self._event_active(state, now)
+        if event_active:
+            weight *= self.event_boost
+        if state.motion > self.motion_high:
+            weight *= self.motion_boost
+        elif state.motion < self.motion_low and not event_active:
+            weight *= self.quiet_factor
+        return weight
+
+    def next(self, ready):
+        """Camera id to infer next among `ready` (cameras with a new frame), or None"""
+        with self._lock:
+            now = self.clock()
+            candidates = [self._cameras[c] for c in ready if c in self._cameras]
+            if not candidates:
+                return None
+            if self._last_pick is not None:
+                self.slot_seconds += 0.2 * (now - self._last_pick - self.slot_seconds)
+            self._last_pick = now
+            # Overdue one slot early: picked now, the frame is done by its deadline
+            overdue = [s for s in candidates
+                       if s.min_fps > 0 and now + self.slot_seconds - s.last_served >= 1.0 / s.min_fps]
+            if overdue:
+                state = min(overdue, key=lambda s: (s.last_served + 1.0 / s.min_fps, s.camera_id))
+                state.served_by_guarantee += 1
+            else:
+                state = min(candidates, key=lambda s: (max(s.finish_tag, self._virtual_time), s.camera_id))
+            start = max(state.finish_tag, self._virtual_time)
+            self._virtual_time = start
+            state.finish_tag = start + 1.0 / self._effective_weight(state, now)
+            state.last_served = now
+            state.served += 1
+            state.served_times.append(now)
+            return state.camera_id
+
+    def report(self, camera_id, events=(), motion=None):
+        """Result of an inferred frame: canonical events (event_type, vehicle_id, metadata.status) and motion"""
+        with self._lock:
+            state = self._cameras.get(camera_id)
+            if state is None:
+                return
+            now = self.clock()
+            for event in events:
+                if event.get('event_type') not in self.BOOST_EVENT_TYPES:
+                    continue
+                key = (event['event_type'], event.get('vehicle_id'))
+                if event.get('metadata', {}).get('status') == 'END':
+                    state.active_events.pop(key, None)
+                else:
+                    state.active_events[key] = now
+                state.boosted_until = now + self.boost_seconds
+            if motion is not None:
+                state.motion += self.motion_alpha * (motion - state.motion)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per camera achieved fps (last fps_window seconds), weights and boost state"""
+        with self._lock:
+            now = self.clock()
+            out = {}
+            for camera_id, state in self._cameras.items():
+                while state.served_times and now - state.served_times[0] > self.fps_window:
+                    state.served_times.popleft()
+                window = min(self.fps_window, now - state.added_at)
+                out[camera_id] = {
+                    "fps": round(len(state.served_times) / window, 2) if window > 0 else 0.0,
+                    "served": state.served,
+                    "served_by_guarantee": state.served_by_guarantee,
+                    "weight": state.weight,
+                    "effective_weight": round(self._effective_weight(state, now), 3),
+                    "min_fps": state.min_fps,
+                    "event_active": self._event_active(state, now),
+                    "motion": round(state.motion, 4)
+                }
+            return out
+
+class LiveCamera:
+    """A LiveSource being inferred by ScheduledInference, with its detector session and result callbacks"""
+    def __init__(self, source, session, on_result, on_end):
+        self.source = source
+        self.session = session
+        self.on_result = on_result
+        self.on_end = on_end
+        self.motion = MotionMeter()
+        self.seq = 0 # Last source frame taken
+        self.frames = 0
+        self.processing_seconds = 0.0
+
+class ScheduledInference:
+    """
+    One inference thread (one node's capacity) shared by live cameras: the
+    InferenceScheduler picks the camera whose newest frame is inferred next on
+    that camera's DetectorPool session. Results go to the camera's on_result
+    (frame_idx, telemetry, events) from the inference thread; on_end runs when
+    its source stops.
+    """
+    def __init__(self, pool, scheduler=None, idle_wait=0.005):
+        self.pool = pool
+        self.scheduler = scheduler or InferenceScheduler()
+        self.idle_wait = idle_wait
+        self._lock = threading.Lock()
+        self._cameras: Dict[str, LiveCamera] = {}
+        self._pending_release = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="scheduled-inference")
+        self._thread.start()
+
+    def add(self, source, on_result, on_end=None):
+        session = self.pool.acquire(source.source_id, source.fps or 30.0, camera_id=source.source_id)
+        with self._lock:
+            self._cameras[source.source_id] = LiveCamera(source, session, on_result, on_end)
+        self.scheduler.add_camera(source.source_id, source.weight, source.min_fps)
+
+    def remove(self, camera_id):
+        """Stop inferring a camera (its session is released by the inference thread)"""
+        self.scheduler.remove_camera(camera_id)
+        with self._lock:
+            camera = self._cameras.pop(camera_id, None)
+            if camera is not None:
+                self._pending_release.append(camera)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                cameras = dict(self._cameras)
+                released, self._pending_release = self._pending_release, []
+            for camera in released:
+                self.pool.release(camera.session)
+            ended = [c for c in cameras.values() if c.source.stopped]
+            for camera in ended:
+                self.remove(camera.source.source_id)
+                if camera.on_end:
+                    camera.on_end()
+            ready = [cid for cid, c in cameras.items() if not c.source.stopped and c.source.latest_seq > c.seq]
+            camera_id = self.scheduler.next(ready)
+            if camera_id is None:
+                self._stop.wait(self.idle_wait)
+                continue
+            camera = cameras[camera_id]
+            item = camera.source.read(timeout=0, after=camera.seq)
+            if item is None:
+                continue
+            camera.seq, frame, captured_at = item
+            t0 = time.perf_counter()
+            try:
+                motion = camera.motion.update(frame)
+                # Capture time, not frame count, drives duration logic: cameras are served at varying rates
+                _, events, telemetry = camera.session.process_frame(frame, verbose=False,
+                                                                    timestamp=capture_time(captured_at))
+            except Exception as e:
+                print(f"ERROR: Scheduled inference failed for {camera_id}: {e}")
+                continue
+            camera.processing_seconds += time.perf_counter() - t0
+            camera.source.record_latency(captured_at)
+            self.scheduler.report(camera_id, events, motion)
+            try:
+                camera.on_result(camera.frames, telemetry, events)
+            except Exception as e:
+                print(f"ERROR: Result callback failed for {camera_id}: {e}")
+            camera.frames += 1
+        with self._lock:
+            cameras = list(self._cameras.values()) + self._pending_release
+            self._cameras, self._pending_release = {}, []
+        for camera in cameras:
+            self.pool.release(camera.session)
+
+    def close(self, timeout=5.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cameras = dict(self._cameras)
+        stats = self.scheduler.stats()
+        for camera_id, camera in cameras.items():
+            if camera_id in stats:
+                stats[camera_id]["frames"] = camera.frames
+                stats[camera_id]["avg_process_ms"] = (round(camera.processing_seconds / camera.frames * 1000, 2)
+                                                      if camera.frames else 0.0)
+        return stats
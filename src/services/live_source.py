@@ -0,0 +1,269 @@
+import re
+import threading
+import time
+from typing import Any, Dict
+
+import cv2
+import numpy as np
+
+def capture_time(captured_at):
+    """Monotonic captured_at from LiveSource.read -> epoch seconds, the frame timestamp for process_frame"""
+    return time.time() - (time.monotonic() - captured_at)
+
+class LoopbackCapture:
+    """Synthetic camera (cv2.VideoCapture-like): moving boxes at a fixed size/fps, no file or device needed"""
+    def __init__(self, width=640, height=360, fps=30.0, objects=6, seed=0):
+        self.width, self.height, self.fps = width, height, fps
+        rng = np.random.default_rng(seed)
+        self._pos = rng.uniform([0, 0], [width, height], (objects, 2))
+        self._vel = rng.uniform(-4, 4, (objects, 2))
+        self._n = 0
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        return {cv2.CAP_PROP_FPS: self.fps, cv2.CAP_PROP_FRAME_WIDTH: self.width,
+                cv2.CAP_PROP_FRAME_HEIGHT: self.height}.get(prop, 0.0)
+
+    def set(self, prop, value):
+        return False
+
+    def read(self):
+        self._pos = (self._pos + self._vel) % [self.width, self.height]
+        frame = np.full((self.height, self.width, 3), 40, dtype=np.uint8)
+        for x, y in self._pos.astype(int):
+            cv2.rectangle(frame, (x - 20, y - 12), (x + 20, y + 12), (200, 200, 200), -1)
+        cv2.putText(frame, f"LOOPBACK {self._n}", (10, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 1)
+        self._n += 1
+        return True, frame
+
+    def release(self):
+        pass
+
+class LiveSource:
+    """
+    One live camera/stream. A reader thread keeps only the most recent frame
+    (a consumer never works through a backlog of stale frames); frames replaced
+    before anyone read them count as dropped. Lost connections are retried with
+    exponential backoff.
+
+    url: anything cv2.VideoCapture opens (rtsp://, http://, a device index), or
+      replay:<path>                 a video file emitted at its own frame rate, looping
+      loopback[:<w>x<h>@<fps>]      synthetic frames (LoopbackCapture)
+    The replay/loopback stand-ins are paced to real time like a camera.
+    """
+    LOOPBACK = re.compile(r"^loopback(?::(\d+)x(\d+)(?:@([\d.]+))?)?$")
+
+    def __init__(self, source_id, url, reconnect_min=0.5, reconnect_max=30.0, timeout=5.0, weight=1.0, min_fps=None):
+        self.source_id = source_id
+        self.url = url
+        self.weight = weight # Inference share under the multi-camera scheduler
+        self.min_fps = min_fps # Guaranteed inference rate (None: scheduler default)
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.timeout = timeout # Open/read timeout of network streams (seconds)
+        self.fps = 0.0
+        self.status = "connecting" # connecting | live | reconnecting | stopped
+        self.last_error = None
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0 # Frames captured since registration
+        self._captured_at = 0.0
+        self._consumed_seq = 0
+        self._stop = threading.Event()
+
+        self.frames_dropped = 0
+        self.frames_consumed = 0
+        self.reconnects = 0
+        self.connected_at = None
+        self._latency_sum = 0.0
+        self._latency_count = 0
+        self.max_latency = 0.0
+        self.last_latency = 0.0
+
+        self._thread = threading.Thread(target=self._reader, daemon=True, name=f"live-source-{source_id}")
+        self._thread.start()
+
+    @property
+    def paced(self):
+        return self.url.startswith("replay:") or self.LOOPBACK.match(self.url) is not None
+
+    def _open(self):
+        match = self.LOOPBACK.match(self.url)
+        if match:
+            width, height, fps = match.groups()
+            return LoopbackCapture(int(width or 640), int(height or 360), float(fps or 30.0))
+        if self.url.startswith("replay:"):
+            return cv2.VideoCapture(self.url[len("replay:"):])
+        if self.url.isdigit():
+            cap = cv2.VideoCapture(int(self.url))
+        elif hasattr(cv2, 'CAP_PROP_READ_TIMEOUT_MSEC'): # OpenCV >= 4.6: a dead stream fails instead of hanging
+            ms = int(self.timeout * 1000)
+            cap = cv2.VideoCapture(self.url, cv2.CAP_ANY,
+                                   [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, ms])
+        else:
+            cap = cv2.VideoCapture(self.url)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Driver-side queue: keep it minimal too
+        return cap
+
+    def _reader(self):
+        backoff = self.reconnect_min
+        while not self._stop.is_set():
+            cap = self._open()
+            if not cap.isOpened():
+                self.last_error = f"Could not open {self.url}"
+            else:
+                self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+                self.status, self.connected_at = "live", time.time()
+                if self._read_loop(cap):
+                    backoff = self.reconnect_min # Was live: retry quickly
+            cap.release()
+            if self._stop.is_set():
+                break
+            self.status = "reconnecting"
+            self.reconnects += 1
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.reconnect_max)
+        self.status = "stopped"
+        with self._cond:
+            self._cond.notify_all()
+
+    def _read_loop(self, cap):
+        """Read until the stream fails; True if it delivered frames"""
+        delivered = False
+        period = 1.0 / self.fps if self.paced else 0.0
+        next_due = time.monotonic()
+        while not self._stop.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                if self.url.startswith("replay:") and delivered:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0) # Loop the file like an endless camera
+                    ret, frame = cap.read()
+                if not ret:
+                    self.last_error = "Stream ended" if delivered else "No frames"
+                    return delivered
+            self._publish(frame)
+            delivered = True
+            if period:
+                next_due += period
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    self._stop.wait(delay)
+                else:
+                    next_due = time.monotonic() # Fell behind (slow decode): don't burst
+        return delivered
+
+    def _publish(self, frame):
+        with self._cond:
+            if self._frame is not None and self._consumed_seq < self._seq:
+                self.frames_dropped += 1 # Previous frame was never read
+            self._frame = frame
+            self._seq += 1
+            self._captured_at = time.monotonic()
+            self._cond.notify_all()
+
+    def read(self, timeout=1.0, after=None):
+        """
+        Newest frame as (seq, frame, captured_at monotonic), waiting up to
+        `timeout` for one newer than seq `after` (default: the last one read).
+        None on timeout or once stopped.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            after = self._consumed_seq if after is None else after
+            while self._seq <= after:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    return None
+                self._cond.wait(remaining)
+            self._consumed_seq = self._seq
+            self.frames_consumed += 1
+            return self._seq, self._frame, self._captured_at
+
+    def record_latency(self, captured_at):
+        """Capture -> result delivered, reported by the consumer"""
+        latency = time.monotonic() - captured_at
+        with self._cond:
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            self._latency_sum += latency
+            self._latency_count += 1
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    @property
+    def latest_seq(self):
+        return self._seq
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "source_id": self.source_id,
+                "url": self.url,
+                "status": self.status,
+                "weight": self.weight,
+                "min_fps": self.min_fps,
+                "fps": round(self.fps, 2),
+                "frames_captured": self._seq,
+                "frames_consumed": self.frames_consumed,
+                "frames_dropped": self.frames_dropped,
+                "reconnects": self.reconnects,
+                "last_error": self.last_error,
+                "latency_ms": {
+                    "last": round(self.last_latency * 1000, 1),
+                    "avg": round(self._latency_sum / self._latency_count * 1000, 1) if self._latency_count else 0.0,
+                    "max": round(self.max_latency * 1000, 1)
+                }
+            }
+
+class LiveSourceManager:
+    """Registered live sources by id (thread-safe)"""
+    def __init__(self, reconnect_min=0.5, reconnect_max=30.0):
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self._lock = threading.Lock()
+        self._sources: Dict[str, LiveSource] = {}
+
+    def register(self, source_id, url, weight=1.0, min_fps=None) -> LiveSource:
+        """Start reading `url` (ValueError if the id is taken)"""
+        with self._lock:
+            if source_id in self._sources:
+                raise ValueError(f"Source already registered: {source_id}")
+            source = self._sources[source_id] = LiveSource(source_id, url, self.reconnect_min, self.reconnect_max,
+                                                           weight=weight, min_fps=min_fps)
+        print(f"SYSTEM: Live source '{source_id}' registered ({url})")
+        return source
+
+    def unregister(self, source_id) -> bool:
+        with self._lock:
+            source = self._sources.pop(source_id, None)
+        if source is None:
+            return False
+        source.stop()
+        print(f"SYSTEM: Live source '{source_id}' unregistered")
+        return True
+
+    def get(self, source_id):
+        with self._lock:
+            return self._sources.get(source_id)
+
+    def close(self):
+        with self._lock:
+            sources, self._sources = list(self._sources.values()), {}
+        for source in sources:
+            source.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sources = list(self._sources.values())
+        return {source.source_id: source.stats() for source in sources}
@@ -0,0 +1,141 @@
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError: # Vectorized pairwise distances instead
+    cKDTree = None
+
+class ProximityService:
+    """
+    Per-frame spatial index of detection centers (pixels), built once per frame
+    and shared through context.services['proximity'] by the detector, the heads
+    and /api/process-now's fallback frame selection.
+    Uses scipy's cKDTree when available and the frame has at least KDTREE_MIN
+    detections; otherwise vectorized pairwise distances, which are cheaper than
+    building a tree for the tens of objects of a typical frame. Queries (and the
+    tree) are lazy and cached until the next update().
+    """
+    KDTREE_MIN = 64
+
+    def __init__(self, k=3, use_kdtree=True):
+        self.k = k
+        self.use_kdtree = use_kdtree and cKDTree is not None
+        self.update(None)
+
+    def update(self, results):
+        """Index this frame's detections (results may be None)"""
+        self.centers = np.empty((0, 2))
+        self.classes = np.empty(0, dtype=np.int64)
+        self.ids = None
+        self._tree = None
+        self._use_tree = False
+        self._dist = None # Pairwise matrix (fallback only)
+        self._nn = {} # {k: (dist, idx)}
+        if results is None or results.boxes is None or len(results.boxes) == 0:
+            return
+
+        boxes = results.boxes.xyxy.cpu().numpy().astype(np.float64).reshape(-1, 4)
+        self.centers = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+        self.classes = results.boxes.cls.cpu().numpy().astype(np.int64).reshape(-1)
+        if results.boxes.id is not None:
+            self.ids = results.boxes.id.int().cpu().numpy().astype(np.int64).reshape(-1)
+        self._use_tree = self.use_kdtree and len(self.centers) >= self.KDTREE_MIN
+
+    def __len__(self):
+        return len(self.centers)
+
+    def _get_tree(self):
+        if self._tree is None:
+            self._tree = cKDTree(self.centers)
+        return self._tree
+
+    def _pairwise(self):
+        if self._dist is None:
+            d = self.centers[:, None, :] - self.centers[None, :, :]
+            self._dist = np.hypot(d[..., 0], d[..., 1])
+            np.fill_diagonal(self._dist, np.inf)
+        return self._dist
+
+    def nearest(self, k=None):
+        """k nearest neighbours of every detection (self excluded): (dist, idx) arrays of shape (n, k)"""
+        k = min(k or self.k, len(self) - 1)
+        if k <= 0:
+            return np.empty((len(self), 0)), np.empty((len(self), 0), dtype=np.int64)
+        if k not in self._nn:
+            if self._use_tree:
+                dist, idx = self._get_tree().query(self.centers, k=k + 1)
+                self._nn[k] = (dist[:, 1:], idx[:, 1:])
+            else:
+                dist = self._pairwise()
+                idx = np.argpartition(dist, k - 1, axis=1)[:, :k] if k < len(self) - 1 else \
+                    np.argsort(dist, axis=1)[:, :k]
+                d = np.take_along_axis(dist, idx, axis=1)
+                order = np.argsort(d, axis=1)
+                self._nn[k] = (np.take_along_axis(d, order, axis=1), np.take_along_axis(idx, order, axis=1))
+        return self._nn[k]
+
+    @property
+    def closest_pair(self):
+        """(i, j, distance) of the two closest detections, or None"""
+        dist, idx = self.nearest(1)
+        if not len(dist) or not dist.shape[1]:
+            return None
+        i = int(np.argmin(dist[:, 0]))
+        return i, int(idx[i, 0]), float(dist[i, 0])
+
+    @property
+    def min_distance(self):
+        pair = self.closest_pair
+        return pair[2] if pair is not None else None
+
+    def pairs_within(self, radius, mask=None):
+        """(i, j) index arrays (i < j) of the detections closer than radius; optionally only among mask"""
+        subset = np.nonzero(mask)[0] if mask is not None else np.arange(len(self))
+        if len(subset) < 2:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        if self._use_tree:
+            tree = self._get_tree() if mask is None else cKDTree(self.centers[subset])
+            pairs = tree.query_pairs(radius, output_type='ndarray')
+            i, j = subset[pairs[:, 0]], subset[pairs[:, 1]]
+        else:
+            dist = self._pairwise()[np.ix_(subset, subset)]
+            a, b = np.nonzero(np.triu(dist <= radius, 1))
+            i, j = subset[a], subset[b]
+        lo, hi = np.minimum(i, j), np.maximum(i, j)
+        order = np.lexsort((hi, lo))
+        return lo[order], hi[order]
+
+    def closest_by_class(self, class_names=None):
+        """
+        Closest pair for every combination of classes present:
+        {"Car-Person": {"distance": px, "pair": [i, j], "ids": [id_i, id_j]}}
+        Keys use class_names ({cls: name}) when given, else class ids.
+        """
+        def name(c):
+            return class_names.get(c, 'Other') if class_names else c
+
+        out = {}
+        present = np.unique(self.classes).tolist()
+        for a_pos, ca in enumerate(present):
+            idx_a = np.nonzero(self.classes == ca)[0]
+            for cb in present[a_pos:]:
+                idx_b = np.nonzero(self.classes == cb)[0]
+                if ca == cb and len(idx_a) < 2:
+                    continue
+                if self._use_tree:
+                    # Same class: 2nd neighbour (the 1st is the point itself)
+                    k = 2 if ca == cb else 1
+                    dist, nn = cKDTree(self.centers[idx_b]).query(self.centers[idx_a], k=k)
+                    dist, nn = (dist[:, 1], nn[:, 1]) if k == 2 else (dist, nn)
+                else:
+                    block = self._pairwise()[np.ix_(idx_a, idx_b)]
+                    nn = np.argmin(block, axis=1)
+                    dist = block[np.arange(len(idx_a)), nn]
+                best = int(np.argmin(dist))
+                i, j = int(idx_a[best]), int(idx_b[nn[best]])
+                out[f"{name(ca)}-{name(cb)}"] = {
+                    "distance": round(float(dist[best]), 1),
+                    "pair": [i, j],
+                    "ids": [int(self.ids[i]), int(self.ids[j])] if self.ids is not None else None
+                }
+        return out
@@ -0,0 +1,200 @@
+import os
+import time
+import zipfile
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+class RetentionPolicy:
+    """
+    Evidence lifecycle rules.
+    - ttl_days: per-violation-type time-to-live (rows + images deleted after it)
+    - default_ttl_days: TTL for types not listed
+    - archive_after_days: images older than this move to the compressed archive tier
+    - max_store_bytes: quota for the hot image tier; oldest images are archived early to stay under it
+    - incident_ttl_days: TTL for the incidents (event) table
+    """
+    def __init__(self, ttl_days: Optional[Dict[str, float]] = None, default_ttl_days=90,
+                 archive_after_days=7, max_store_bytes=5 * 1024 ** 3, incident_ttl_days=180):
+        self.ttl_days = ttl_days if ttl_days is not None else {
+            'safety_observation': 14,
+            'illegal_boarding': 60,
+            'collision': 365,
+            'accident': 365,
+            'potential_accident': 365
+        }
+        self.default_ttl_days = default_ttl_days
+        self.archive_after_days = archive_after_days
+        self.max_store_bytes = max_store_bytes
+        self.incident_ttl_days = incident_ttl_days
+
+class RetentionJob:
+    """
+    Throttled background job enforcing a RetentionPolicy on the EvidenceDB.
+    Every step touches at most `batch_size` rows in its own short transaction and
+    sleeps `pause_seconds` between steps, so the save worker's inserts wait at
+    most one small batch and WAL readers are never blocked.
+    """
+    def __init__(self, db, policy=None, archive_root="data/archive", interval_seconds=3600,
+                 batch_size=200, pause_seconds=0.05, vacuum_pages=256, sweep_grace_seconds=300.0):
+        self.db = db
+        self.policy = policy or RetentionPolicy()
+        self.archive_root = archive_root
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.vacuum_pages = vacuum_pages
+        self.sweep_grace_seconds = sweep_grace_seconds # Tombstoned images older than this are deleted
+
+        self.last_run: Dict[str, Any] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="retention-job")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _loop(self):
+        print("SYSTEM: Evidence Retention Job started.")
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"ERROR in Retention Job: {e}")
+            self._stop.wait(self.interval_seconds)
+
+    def _throttle(self):
+        # Yield to the frame loop / writer between batches; also makes stop() responsive
+        return not self._stop.wait(self.pause_seconds)
+
+    def run_once(self, now=None):
+        """One full pass: sweep deleted images, expire, archive by age, archive by quota, vacuum"""
+        now = now or datetime.now()
+        t0 = time.time()
+        stats = {"swept": 0, "expired": 0, "incidents_expired": 0, "archived": 0, "archived_for_quota": 0,
+                 "freelist_pages": None}
+
+        stats["swept"] = self._sweep()
+        stats["expired"] = self._expire(now)
+        stats["incidents_expired"] = self._expire_incidents(now)
+        stats["archived"] = self._archive(cutoff=now - timedelta(days=self.policy.archive_after_days))
+        stats["archived_for_quota"] = self._enforce_quota()
+
+        freelist = None
+        while self._throttle():
+            remaining = self.db.incremental_vacuum(self.vacuum_pages)
+            shrinking = freelist is None or remaining < freelist
+            freelist = remaining
+            if not remaining or not shrinking:
+                break
+        stats["freelist_pages"] = freelist
+
+        stats["duration_seconds"] = round(time.time() - t0, 2)
+        stats["finished_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.last_run = stats
+        return stats
+
+    def _sweep(self):
+        swept = 0
+        while self._throttle():
+            n = self.db.sweep_images(self.sweep_grace_seconds, limit=self.batch_size)
+            swept += n
+            if n < self.batch_size:
+                break
+        return swept
+
+    def _expire(self, now):
+        deleted = 0
+        # Types with their own TTL first, then everything else with the default TTL
+        for v_type, days in self.policy.ttl_days.items():
+            cutoff = (now - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+            while self._throttle():
+                n = self.db.delete_evidence_before(cutoff, violation_type=v_type, limit=self.batch_size)
+                deleted += n
+                if n < self.batch_size:
+                    break
+        cutoff = (now - timedelta(days=self.policy.default_ttl_days)).strftime("%Y-%m-%d %H:%M:%S")
+        while self._throttle():
+            n = self.db.delete_evidence_before(cutoff, exclude_types=tuple(self.policy.ttl_days), limit=self.batch_size)
+            deleted += n
+            if n < self.batch_size:
+                break
+        return deleted
+
+    def _expire_incidents(self, now):
+        cutoff = (now - timedelta(days=self.policy.incident_ttl_days)).strftime("%Y-%m-%d %H:%M:%S")
+        deleted = 0
+        while self._throttle():
+            n = self.db.delete_incidents_before(cutoff, limit=self.batch_size * 5)
+            deleted += n
+            if n < self.batch_size * 5:
+                break
+        return deleted
+
+    def _archive(self, cutoff=None, byte_target=None):
+        """Archive oldest hot images (older than cutoff) until none are left or byte_target bytes were freed"""
+        archived = 0
+        freed = 0
+        while self._throttle():
+            hashes = self.db.archive_candidates(
+                cutoff=cutoff.strftime("%Y-%m-%d %H:%M:%S") if cutoff else None, limit=self.batch_size)
+            if not hashes:
+                break
+            n, n_bytes = self._archive_batch(hashes)
+            archived += n
+            freed += n_bytes
+            if byte_target is not None and freed >= byte_target:
+                break
+        return archived
+
+    def _archive_batch(self, hashes):
+        """Pack one batch of images into a new zip, then flip the rows and drop the hot copies"""
+        month_dir = os.path.join(self.archive_root, datetime.now().strftime("%Y-%m"))
+        os.makedirs(month_dir, exist_ok=True)
+        archive_path = os.path.join(month_dir, f"evidence_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.zip")
+        tmp_path = archive_path + ".tmp"
+
+        packed = []
+        freed = 0
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+            for image_hash in hashes:
+                image_bytes = self.db.store.get(image_hash)
+                if image_bytes is None:
+                    continue
+                zf.writestr(f"{image_hash}.jpg", image_bytes)
+                packed.append(image_hash)
+                freed += len(image_bytes)
+        # Readers only ever see complete archives
+        os.replace(tmp_path, archive_path)
+
+        packed_set = set(packed)
+        missing = [h for h in hashes if h not in packed_set]
+        if missing:
+            # Hot file already gone: nothing left to serve, mark it so it is not retried
+            self.db.mark_archived(missing, None)
+        if packed:
+            self.db.mark_archived(packed, archive_path)
+            # Hot copies go in a later sweep (a row of the same image may be in flight);
+            # thumbnails stay hot for list views
+            self.db.tombstone_images(packed)
+        else:
+            os.remove(archive_path)
+        return len(packed), freed
+
+    def _enforce_quota(self):
+        if self.policy.max_store_bytes is None:
+            return 0
+        # One directory walk per run; batches then track the bytes they free. Files
+        # waiting for the sweep are already accounted for.
+        pending = sum(self.db.store.file_size(h) for h in self.db.tombstoned_images())
+        excess = self.db.store.size_bytes() - pending - self.policy.max_store_bytes
+        if excess <= 0:
+            return 0
+        return self._archive(cutoff=None, byte_target=excess)
@@ -0,0 +1,93 @@
+import math
+import time
+from collections import deque
+from typing import Dict, Optional
+
+class SafetyScore:
+    """
+    Incremental safety index: 100 minus the sum of exponentially decaying penalties.
+    Every active violation decays by the same rate, so the total decays by the
+    same factor too: one multiply per update keeps it current, a penalty is
+    added once when a violation is first seen, and subtracted once when it has
+    decayed below `expiry_fraction` of its original value. All violations live
+    equally long, so arrival order is expiry order and a FIFO queue replaces
+    a heap. Cost is O(1) amortized however many violations are active.
+    """
+    PENALTY_MAP = {
+        'collision': 50,
+        'traffic_violation': 20,
+        'wrong_way': 30,
+        'illegal_boarding': 15,
+        'stalled_vehicle': 10,
+        'red_light': 25,
+        'no_helmet': 15,
+        'speeding': 18,
+        'wrong_lane': 12,
+        'traffic_conflict': 8
+    }
+    DEFAULT_PENALTY = 15
+
+    def __init__(self, decay_rate=0.92, expiry_fraction=0.01, penalty_map: Optional[Dict[str, float]] = None,
+                 base=100.0):
+        self.decay_rate = decay_rate
+        self.base = base
+        self.penalty_map = penalty_map if penalty_map is not None else self.PENALTY_MAP
+        # Seconds until any penalty has decayed to expiry_fraction of itself
+        self.lifetime = math.log(expiry_fraction) / math.log(decay_rate) if decay_rate < 1.0 else math.inf
+        self.reset()
+
+    def reset(self):
+        self._total = 0.0            # Sum of decayed penalties as of self._updated_at
+        self._updated_at = None
+        self._queue = deque()        # (expires_at, added_at, penalty, key) in expiry order
+        self._active = set()         # (vehicle_id, type) keys with a live penalty
+
+    def _advance(self, now):
+        if self._updated_at is None or now > self._updated_at:
+            if self._updated_at is not None:
+                self._total *= self.decay_rate ** (now - self._updated_at)
+            self._updated_at = now
+
+        while self._queue and self._queue[0][0] <= now:
+            _, added_at, penalty, key = self._queue.popleft()
+            self._total -= penalty * self.decay_rate ** (now - added_at)
+            if key is not None:
+                self._active.discard(key)
+        if not self._queue:
+            self._total = 0.0 # No drift once nothing is active
+        else:
+            self._total = max(0.0, self._total)
+
+    def add(self, violation_type, vehicle_id=None, now=None):
+        """
+        Register a violation. The same (vehicle_id, type) is only penalized once while
+        it is still active; events without an id are one-off penalties (never tracked).
+        Returns True if a penalty was added.
+        """
+        now = now if now is not None else time.time()
+        self._advance(now)
+        key = (vehicle_id, violation_type) if vehicle_id is not None else None
+        if key is not None and key in self._active:
+            return False
+        penalty = self.penalty_map.get(violation_type, self.DEFAULT_PENALTY)
+        expires_at = now + self.lifetime
+        self._queue.append((expires_at, now, penalty, key))
+        if key is not None:
+            self._active.add(key)
+        self._total += penalty
+        return True
+
+    def update(self, events, now=None):
+        """Register a frame's head events ({'type', 'data': {'id', ...}}) and return the current score"""
+        now = now if now is not None else time.time()
+        for event in events:
+            self.add(event['type'], event.get('data', {}).get('id'), now)
+        return self.score(now)
+
+    def score(self, now=None):
+        self._advance(now if now is not None else time.time())
+        return max(0.0, min(self.base, self.base - self._total))
+
+    @property
+    def active_count(self):
+        return len(self._queue)
@@ -1,25 +1,23 @@
 import numpy as np
 
 class CollisionDetector:
-    def __init__(self, iou_threshold=0.4): 
+    VEHICLE_CLASSES = (2, 3, 5, 7)
+    PAIR_MARGIN = 0.1 # Fraction of frame width added to the candidate pair radius
+
+    def __init__(self, iou_threshold=0.15, proximity_factor=0.04, plane_factor=0.25, verbose=True):
+        """
+        iou_threshold: overlap that counts as a clash once the IoU trend rises
+        proximity_factor: near-miss center distance as a fraction of frame width
+        plane_factor: max box-bottom difference (fraction of frame height) for the same road plane
+        verbose: print a diagnostic line for every new collision (replay turns it off)
+        """
         self.iou_threshold = iou_threshold
+        self.proximity_factor = proximity_factor
+        self.plane_factor = plane_factor
+        self.verbose = verbose
         self.active_collisions = set() # {(id1, id2)}
         self.iou_history = {} # {(id1, id2): [iou_history]}
 
-    def _calculate_iou(self, boxA, boxB):
-        # box: [x1, y1, x2, y2]
-        xA = max(boxA[0], boxB[0])
-        yA = max(boxA[1], boxB[1])
-        xB = min(boxA[2], boxB[2])
-        yB = min(boxA[3], boxB[3])
-
-        interArea = max(0, xB - xA + 1) * max(0, yB - yA + 1)
-        boxAArea = (boxA[2] - boxA[0] + 1) * (boxA[3] - boxA[1] + 1)
-        boxBArea = (boxB[2] - boxB[0] + 1) * (boxB[3] - boxB[1] + 1)
-
-        iou = interArea / float(boxAArea + boxBArea - interArea)
-        return iou
-
     def _is_velocity_drop(self, history, drop_threshold=10.0):
         # history: [v1, v2, ... vN]
         if len(history) < 2:
@@ -35,7 +33,21 @@ class CollisionDetector:
                 return True
         return False
 
-    def detect_collisions(self, results, speed_estimator=None):
+    def _candidate_pairs(self, boxes, classes, w, proximity=None):
+        """
+        Vehicle index pairs (i < j) to examine. With the frame's ProximityService only pairs
+        whose centers are close enough to overlap (plus a margin, so IoU history builds up
+        before contact) are returned; otherwise every vehicle pair.
+        """
+        vehicles = (classes[:, None] == self.VEHICLE_CLASSES).any(axis=1) # np.isin is slow on tiny sets
+        if proximity is not None and len(proximity) == len(boxes):
+            diag = np.hypot(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+            radius = diag[vehicles].max(initial=0) + w * self.PAIR_MARGIN
+            return zip(*(a.tolist() for a in proximity.pairs_within(radius, mask=vehicles)))
+        idx = np.nonzero(vehicles)[0].tolist()
+        return ((i, j) for a, i in enumerate(idx) for j in idx[a + 1:])
+
+    def detect_collisions(self, results, speed_estimator=None, proximity=None):
         anomalies = []
         track_ids = results.boxes.id.int().cpu().tolist() if results.boxes.id is not None else None
         
@@ -44,112 +56,105 @@ class CollisionDetector:
 
         boxes = results.boxes.xyxy.cpu().numpy()
         h, w = results.orig_shape
-        vehicle_classes = [2, 3, 5, 7]
         classes = results.boxes.cls.cpu().numpy()
 
-        n = len(track_ids)
         current_collisions = set()
         active_pairs = set()
 
-        for i in range(n):
-            if int(classes[i]) not in vehicle_classes:
-                continue
+        pairs = np.array(list(self._candidate_pairs(boxes, classes, w, proximity)), dtype=np.int64).reshape(-1, 2)
+        # Pair geometry for all candidates at once, in the boxes' dtype: IoU (+1 pixel-inclusive areas)
+        bi, bj = boxes[pairs[:, 0]], boxes[pairs[:, 1]]
+        inter = np.maximum(0, np.minimum(bi[:, 2], bj[:, 2]) - np.maximum(bi[:, 0], bj[:, 0]) + 1) \
+            * np.maximum(0, np.minimum(bi[:, 3], bj[:, 3]) - np.maximum(bi[:, 1], bj[:, 1]) + 1)
+        area_i = (bi[:, 2] - bi[:, 0] + 1) * (bi[:, 3] - bi[:, 1] + 1)
+        area_j = (bj[:, 2] - bj[:, 0] + 1) * (bj[:, 3] - bj[:, 1] + 1)
+        ious = inter / (area_i + area_j - inter)
+        # Proximity check: center distance
+        dists = np.sqrt(((bi[:, 0] + bi[:, 2]) / 2 - (bj[:, 0] + bj[:, 2]) / 2) ** 2
+                        + ((bi[:, 1] + bi[:, 3]) / 2 - (bj[:, 1] + bj[:, 3]) / 2) ** 2)
+        # 1. Perspective Check (Depth filtering): box bottoms on the same road plane
+        same_plane = (np.abs(bi[:, 3] - bj[:, 3]) < h * self.plane_factor).tolist() # Generous coverage on tilted cams
+        proximity_threshold_tight = w * self.proximity_factor  # Tight threshold
+
+        vids = [f"id_{tid}" for tid in track_ids]
+        drops = {} # Velocity drop per vehicle index, looked up only for near misses
+        def dropped(k):
+            if k not in drops:
+                drops[k] = speed_estimator is not None and self._is_velocity_drop(
+                    speed_estimator.get_speed_history(vids[k]))
+            return drops[k]
+
+        for i, j, iou, dist, is_same_plane in zip(pairs[:, 0].tolist(), pairs[:, 1].tolist(), ious, dists, same_plane):
+            vid1, vid2 = vids[i], vids[j]
+
+            # TRIGGER LOGIC REFINEMENT (Fix for Truck Stopping):
+            id_pair = (vid1, vid2) if vid1 <= vid2 else (vid2, vid1)
+            active_pairs.add(id_pair)
+            history = self.iou_history.get(id_pair)
+            if history is None:
+                history = self.iou_history[id_pair] = []
+            history.append(iou)
+            if len(history) > 20: # Increased history for sharper trend
+                history.pop(0)
+
+            # 2. IoU Spike (Rapid increase in overlap)
+            iou_trend = 0
+            if len(history) >= 3:
+                # Difference between current and 3 frames ago (Responsive baseline)
+                iou_trend = iou - history[-3]
             
-            vid1 = f"id_{track_ids[i]}"
+            # 3. Collision Detection (HIGH SENSITIVITY MODE)
+            is_clash = False
             
-            for j in range(i + 1, n):
-                if int(classes[j]) not in vehicle_classes:
-                    continue
-                
-                vid2 = f"id_{track_ids[j]}"
-                iou = self._calculate_iou(boxes[i], boxes[j])
-                
-                # Proximity check
-                c1 = ((boxes[i][0] + boxes[i][2])/2, (boxes[i][1] + boxes[i][3])/2)
-                c2 = ((boxes[j][0] + boxes[j][2])/2, (boxes[j][1] + boxes[j][3])/2)
-                dist = np.sqrt((c1[0]-c2[0])**2 + (c1[1]-c2[1])**2)
-                proximity_threshold = w * 0.08 # Adjusted for better recall on smaller objects
-                
-                # Check for velocity drops
-                drop1 = False
-                drop2 = False
-                if speed_estimator:
-                    drop1 = self._is_velocity_drop(speed_estimator.get_speed_history(vid1))
-                    drop2 = self._is_velocity_drop(speed_estimator.get_speed_history(vid2))
-
-                # TRIGGER LOGIC REFINEMENT (Fix for Truck Stopping):
-                id_pair = tuple(sorted([vid1, vid2]))
-                active_pairs.add(id_pair)
-                if id_pair not in self.iou_history:
-                    self.iou_history[id_pair] = []
-                self.iou_history[id_pair].append(iou)
-                if len(self.iou_history[id_pair]) > 20: # Increased history for sharper trend
-                    self.iou_history[id_pair].pop(0)
-
-                # 1. Perspective Check (Depth filtering)
-                base1 = boxes[i][3]
-                base2 = boxes[j][3]
-                base_diff = abs(base1 - base2)
-                y_threshold = h * 0.25 # Increased for generous coverage on tilted cams
-                is_same_plane = base_diff < y_threshold
-
-                # 2. IoU Spike (Rapid increase in overlap)
-                iou_trend = 0
-                if len(self.iou_history[id_pair]) >= 3:
-                    # Difference between current and 3 frames ago (Responsive baseline)
-                    iou_trend = iou - self.iou_history[id_pair][-3]
-                
-                # 3. Collision Detection (HIGH SENSITIVITY MODE)
-                is_clash = False
-                proximity_threshold_tight = w * 0.04  # Tight threshold
+            if is_same_plane:
+                # Option 1: Any significant overlap
+                if iou > self.iou_threshold and iou_trend > 0.01:
+                    is_clash = True
+                # Option 2: Moderate overlap with trend
+                elif iou > 0.05 and iou_trend > 0.03:
+                    is_clash = True
+                # Option 3: Close proximity (NEAR MISS)
+                elif dist < proximity_threshold_tight and (dropped(i) or dropped(j)):
+                    is_clash = True
+                # Option 4: Super close proximity
+                elif dist < proximity_threshold_tight * 1.5 and iou > 0:
+                    is_clash = True
+
+            if is_clash:
+                current_collisions.add(id_pair)
                 
-                if is_same_plane:
-                    # Option 1: Any significant overlap
-                    if iou > 0.15 and iou_trend > 0.01:
-                        is_clash = True
-                    # Option 2: Moderate overlap with trend
-                    elif iou > 0.05 and iou_trend > 0.03:
-                        is_clash = True
-                    # Option 3: Close proximity (NEAR MISS)
-                    elif dist < proximity_threshold_tight and (drop1 or drop2):
-                        is_clash = True
-                    # Option 4: Super close proximity
-                    elif dist < proximity_threshold_tight * 1.5 and iou > 0:
-                        is_clash = True
-
-                if is_clash:
-                    current_collisions.add(id_pair)
+                if id_pair not in self.active_collisions:
+                    self.active_collisions.add(id_pair)
+                    combined_bbox = [
+                        min(boxes[i][0], boxes[j][0]),
+                        min(boxes[i][1], boxes[j][1]),
+                        max(boxes[i][2], boxes[j][2]),
+                        max(boxes[i][3], boxes[j][3])
+                    ]
                     
-                    if id_pair not in self.active_collisions:
-                        self.active_collisions.add(id_pair)
-                        combined_bbox = [
-                            min(boxes[i][0], boxes[j][0]),
-                            min(boxes[i][1], boxes[j][1]),
-                            max(boxes[i][2], boxes[j][2]),
-                            max(boxes[i][3], boxes[j][3])
-                        ]
-                        
+                    if self.verbose:
                         # DIAGNOSTIC: Show collision detection
                         print(f"🚨 COLLISION DETECTED: {id_pair[0]} ↔ {id_pair[1]}")
                         print(f"   → IoU: {iou:.3f} | Distance: {dist:.1f}px | IoU Trend: {iou_trend:.3f}")
-                        
-                        anomalies.append({
-                            'type': 'collision',
-                            'status': 'VIOLATION_START',
-                            'id': f"{id_pair[0]}_{id_pair[1]}",
-                            'bbox': combined_bbox,
-                            'details': f"Proximity Breach: IoU={iou:.2f} Trend={iou_trend:.2f} Dist={dist:.0f}px"
-                        })
+                    
+                    anomalies.append({
+                        'type': 'collision',
+                        'status': 'VIOLATION_START',
+                        'id': f"{id_pair[0]}_{id_pair[1]}",
+                        'bbox': combined_bbox,
+                        'details': f"Proximity Breach: IoU={iou:.2f} Trend={iou_trend:.2f} Dist={dist:.0f}px"
+                    })
 
         # Check for ended violations
         ended = self.active_collisions - current_collisions
-        for col in ended:
+        for col in sorted(ended): # Deterministic event order
             anomalies.append({
                 'type': 'collision',
                 'status': 'VIOLATION_END',
                 'id': f"{col[0]}_{col[1]}",
                 'details': "Vehicles cleared or tracking lost"
             })
+        self.active_collisions -= ended # Ended pairs were never removed (END re-emitted every frame)
         # Cleanup history
         lost_history = set(self.iou_history.keys()) - active_pairs
         for pair in lost_history:
@@ -157,3 +162,6 @@ class CollisionDetector:
             del self.iou_history[pair]
 
         return anomalies
+
+    def memory_stats(self):
+        return {"active_collisions": len(self.active_collisions), "iou_history": len(self.iou_history)}
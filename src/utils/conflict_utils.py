@@ -0,0 +1,255 @@
+import time
+from collections import deque
+
+import numpy as np
+
+VEHICLE_CLASSES = (2, 3, 5, 7)
+VULNERABLE_CLASSES = (0, 1) # Person, bicycle
+GRADES = ('none', 'moderate', 'serious', 'critical')
+
+def _cross(a, b):
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+def time_to_collision(dp, dv, radius, min_speed=0.5):
+    """
+    Constant-velocity TTC for relative positions dp / velocities dv (n, 2) and contact
+    radius (n,): first t >= 0 with |dp + dv t| = radius. Only closing pairs (approaching,
+    relative speed above min_speed m/s) get a finite TTC - 0 if already in contact - so
+    stationary neighbours and pairs moving apart are inf.
+    """
+    a = (dv ** 2).sum(axis=1)
+    b = 2 * (dp * dv).sum(axis=1)
+    c = (dp ** 2).sum(axis=1) - radius ** 2
+    disc = b ** 2 - 4 * a * c
+    closing = (b < 0) & (a > min_speed ** 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (-b - np.sqrt(np.maximum(disc, 0))) / (2 * a)
+    return np.where(closing & (c <= 0), 0.0, np.where(closing & (disc >= 0), t, np.inf))
+
+def post_encroachment_time(p1, v1, p2, v2, eps=1e-6):
+    """
+    Predicted PET: time gap between the two road users reaching the crossing
+    point of their (straight) paths. inf for parallel/stationary paths or a
+    crossing point behind either of them.
+    """
+    denom = _cross(v1, v2)
+    dp = p2 - p1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t1 = _cross(dp, v2) / denom
+        t2 = _cross(dp, v1) / denom
+        gap = np.abs(t1 - t2)
+    valid = (np.abs(denom) > eps) & (t1 >= 0) & (t2 >= 0)
+    return np.where(valid, gap, np.inf), np.where(valid, np.maximum(t1, t2), np.inf)
+
+def grade(values, thresholds):
+    """Grade index per value: len(thresholds) at or below thresholds[0] (critical) ... 0 above thresholds[-1]"""
+    return len(thresholds) - np.searchsorted(thresholds, values, side='left')
+
+class ConflictAnalyzer:
+    """
+    Surrogate safety measures between all road users, before anything collides.
+    Every frame, vehicle-vehicle and vehicle-pedestrian pairs are built from
+    one broadcasted distance matrix, pruned by a reachability prefilter (pairs
+    that cannot meet within `horizon` seconds at their current speeds), and
+    TTC / predicted PET are computed for the survivors in one pass. Pairs in
+    conflict on consecutive frames for `min_seconds` emit a START; an END follows
+    once the pair has been conflict-free for `grace_seconds` (elapsed time on the
+    `now` clock passed to update, so frame rate does not change the semantics).
+
+    Positions/velocities come from SpeedEstimator (ground plane, meters).
+    Grades use ascending (critical, serious, moderate) thresholds in seconds;
+    pairs closing slower than min_speed (m/s) have no TTC.
+    """
+    def __init__(self, horizon=3.0, max_range=30.0, ttc_thresholds=(0.5, 1.0, 1.5), pet_thresholds=(0.5, 1.0, 1.5),
+                 min_seconds=0.06, grace_seconds=0.5, rate_window=3600.0, min_speed=0.5):
+        self.horizon = horizon
+        self.max_range = max_range
+        self.ttc_thresholds = ttc_thresholds
+        self.pet_thresholds = pet_thresholds
+        self.min_seconds = min_seconds # ~3 frames at 30 fps
+        self.grace_seconds = grace_seconds
+        self.rate_window = rate_window
+        self.min_speed = min_speed
+        self.frame_count = 0
+        self._pairs = None
+        self.reset()
+
+    def reset(self):
+        self.started_at = None
+        self.totals = np.zeros(len(GRADES), dtype=np.int64) # Concluded conflicts by worst grade
+        self._recent = deque() # START times within rate_window
+        self.last_pairs_checked = 0
+        self.last_min_ttc = None
+
+        # Pair state, sorted by key (low track id << 32 | high track id)
+        self._keys = np.empty(0, dtype=np.int64)
+        self._first = np.empty(0) # Time the pair entered conflict
+        self._last = np.empty(0) # Last time in conflict
+        self._worst = np.empty(0, dtype=np.int64)
+        self._min_ttc = np.empty(0)
+        self._min_pet = np.empty(0)
+        self._reported = np.empty(0, dtype=bool)
+
+    def _pair_indices(self, n):
+        # Upper-triangle pair indices, cached for the last object count
+        if self._pairs is None or self._pairs[0] != n:
+            self._pairs = (n, np.triu_indices(n, 1))
+        return self._pairs[1]
+
+    def measure(self, positions, velocities, radii, classes):
+        """
+        All candidate pairs of one frame -> (i, j, ttc, pet, grade) arrays.
+        positions/velocities (n, 2) in m and m/s, radii (n,) in m, classes (n,).
+        """
+        vehicle = (classes[:, None] == VEHICLE_CLASSES).any(axis=1) # np.isin is slow on tiny sets
+        n = len(positions)
+        if n < 2:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0), np.empty(0), empty
+
+        # Spatial prefilter over the upper-triangle pairs: at least one vehicle, other one a
+        # vehicle or vulnerable road user, within range and reachable within the horizon
+        i, j = self._pair_indices(n)
+        relevant = vehicle | (classes[:, None] == VULNERABLE_CLASSES).any(axis=1)
+        dp = positions[j] - positions[i]
+        dist2 = dp[:, 0] ** 2 + dp[:, 1] ** 2
+        speed = np.hypot(velocities[:, 0], velocities[:, 1])
+        reach = np.minimum((speed[i] + speed[j]) * self.horizon + radii[i] + radii[j], self.max_range)
+        candidate = (dist2 <= reach ** 2) & (vehicle[i] | vehicle[j]) & relevant[i] & relevant[j]
+        i, j, dp = i[candidate], j[candidate], dp[candidate]
+        self.last_pairs_checked = len(i)
+
+        ttc = time_to_collision(dp, velocities[j] - velocities[i], radii[i] + radii[j], self.min_speed)
+        pet, arrival = post_encroachment_time(positions[i], velocities[i], positions[j], velocities[j])
+        pet = np.where(arrival <= self.horizon, pet, np.inf) # Only crossings that are near in time
+        ttc = np.where(ttc <= self.horizon, ttc, np.inf)
+        g = np.maximum(grade(ttc, self.ttc_thresholds), grade(pet, self.pet_thresholds))
+        return i, j, ttc, pet, g
+
+    def update(self, results, estimator, now=None):
+        """One frame: returns (conflict records [{'status', 'id', 'grade', ...}], metrics dict)"""
+        now = now if now is not None else time.time()
+        if self.started_at is None:
+            self.started_at = now
+        self.frame_count += 1
+        records = []
+
+        if results.boxes.id is not None and estimator is not None:
+            h, w = results.orig_shape
+            ids = results.boxes.id.int().cpu().numpy().astype(np.int64).reshape(-1)
+            boxes = results.boxes.xyxy.cpu().numpy().astype(np.float64).reshape(-1, 4)
+            classes = results.boxes.cls.cpu().numpy().astype(np.int64).reshape(-1)
+            positions, velocities, measured = estimator.get_kinematics([f"id_{tid}" for tid in ids.tolist()])
+            # Footprint radius: half the ground width of the box's bottom edge
+            left = estimator.to_ground(boxes[:, [0, 3]], h, w)
+            right = estimator.to_ground(boxes[:, [2, 3]], h, w)
+            radii = np.hypot(*(right - left).T) / 2
+
+            keep = measured
+            i, j, ttc, pet, g = self.measure(positions[keep], velocities[keep], radii[keep], classes[keep])
+            ids, boxes, classes = ids[keep], boxes[keep], classes[keep]
+            self.last_min_ttc = float(ttc.min()) if len(ttc) and np.isfinite(ttc.min()) else None
+
+            hit = g > 0
+            i, j, ttc, pet, g = i[hit], j[hit], ttc[hit], pet[hit], g[hit]
+            lo, hi = np.minimum(ids[i], ids[j]), np.maximum(ids[i], ids[j])
+            records = self._track_pairs(now, (lo << 32) | hi, ttc, pet, g, i, j, boxes, classes)
+        else:
+            self.last_pairs_checked = 0
+            self.last_min_ttc = None
+            records = self._track_pairs(now, np.empty(0, dtype=np.int64), np.empty(0), np.empty(0),
+                                        np.empty(0, dtype=np.int64), None, None, None, None)
+
+        for record in records:
+            if record['status'] == 'VIOLATION_START':
+                self._recent.append(now)
+        while self._recent and self._recent[0] < now - self.rate_window:
+            self._recent.popleft()
+        return records, self.metrics(now)
+
+    def _track_pairs(self, now, keys, ttc, pet, g, i, j, boxes, classes):
+        # Merge this frame's conflicting pairs into the sorted state
+        order = np.argsort(keys, kind='stable')
+        keys, ttc, pet, g = keys[order], ttc[order], pet[order], g[order]
+        idx = np.searchsorted(self._keys, keys)
+        known = (idx < len(self._keys)) & (self._keys[np.minimum(idx, max(len(self._keys) - 1, 0))] == keys) \
+            if len(self._keys) else np.zeros(len(keys), dtype=bool)
+        new = ~known
+        if new.any():
+            all_keys = np.concatenate([self._keys, keys[new]])
+            merge = np.argsort(all_keys, kind='stable')
+            n_new = int(new.sum())
+            self._keys = all_keys[merge]
+            self._first = np.concatenate([self._first, np.full(n_new, float(now))])[merge]
+            self._last = np.concatenate([self._last, np.zeros(n_new)])[merge]
+            self._worst = np.concatenate([self._worst, np.zeros(n_new, dtype=np.int64)])[merge]
+            self._min_ttc = np.concatenate([self._min_ttc, np.full(n_new, np.inf)])[merge]
+            self._min_pet = np.concatenate([self._min_pet, np.full(n_new, np.inf)])[merge]
+            self._reported = np.concatenate([self._reported, np.zeros(n_new, dtype=bool)])[merge]
+
+        at = np.searchsorted(self._keys, keys)
+        present = np.zeros(len(self._keys), dtype=bool)
+        present[at] = True
+        self._last[at] = now
+        self._worst[at] = np.maximum(self._worst[at], g)
+        self._min_ttc[at] = np.minimum(self._min_ttc[at], ttc)
+        self._min_pet[at] = np.minimum(self._min_pet[at], pet)
+
+        records = []
+        start = present & ~self._reported & (now - self._first >= self.min_seconds)
+        if start.any():
+            row_of = dict(zip(keys.tolist(), order.tolist())) # Key -> row of the unsorted pair arrays
+            for s in np.nonzero(start)[0].tolist():
+                row = row_of[int(self._keys[s])]
+                a, b = i[row], j[row]
+                vru = classes[a] in VULNERABLE_CLASSES or classes[b] in VULNERABLE_CLASSES
+                records.append(self._record(s, 'VIOLATION_START', {
+                    'bbox': np.concatenate([np.minimum(boxes[a, :2], boxes[b, :2]), np.maximum(boxes[a, 2:], boxes[b, 2:])]),
+                    'pair_type': 'vehicle-pedestrian' if vru else 'vehicle-vehicle'
+                }))
+            self._reported |= start
+
+        # Unreported pairs must persist in consecutive frames; reported ones end after the grace period
+        ended = self._reported & (now - self._last > self.grace_seconds)
+        for e in np.nonzero(ended)[0].tolist():
+            records.append(self._record(e, 'VIOLATION_END', {}))
+        np.add.at(self.totals, self._worst[ended], 1)
+        keep = (present | self._reported) & ~ended
+        if not keep.all():
+            for name in ('_keys', '_first', '_last', '_worst', '_min_ttc', '_min_pet', '_reported'):
+                setattr(self, name, getattr(self, name)[keep])
+        return records
+
+    def _record(self, s, status, extra):
+        key = int(self._keys[s])
+        ttc, pet = float(self._min_ttc[s]), float(self._min_pet[s])
+        record = {
+            'status': status,
+            'id': f"id_{key >> 32}_id_{key & 0xFFFFFFFF}",
+            'grade': GRADES[int(self._worst[s])],
+            'ttc': round(ttc, 2) if np.isfinite(ttc) else None,
+            'pet': round(pet, 2) if np.isfinite(pet) else None,
+            'details': f"{GRADES[int(self._worst[s])].title()} conflict: min TTC "
+                       f"{f'{ttc:.2f}s' if np.isfinite(ttc) else '-'}, PET {f'{pet:.2f}s' if np.isfinite(pet) else '-'}"
+        }
+        record.update(extra)
+        return record
+
+    def metrics(self, now=None):
+        """
+        Per-camera conflict counters: active, total (concluded + active), concluded
+        by worst grade, and rate (conflicts started per hour over rate_window)
+        """
+        now = now if now is not None else time.time()
+        elapsed = min(max(now - (self.started_at or now), 60.0), self.rate_window) # >= 1 min to avoid early spikes
+        return {
+            "active": int(self._reported.sum()),
+            "total": int(self.totals.sum() + self._reported.sum()),
+            "by_grade": {name: int(n) for name, n in zip(GRADES[1:], self.totals[1:])},
+            "rate_per_hour": round(len(self._recent) * 3600.0 / elapsed, 2),
+            "min_ttc": round(self.last_min_ttc, 2) if self.last_min_ttc is not None else None,
+            "pairs_checked": self.last_pairs_checked
+        }
+
+    def memory_stats(self):
+        return {"pairs": {"entries": int(len(self._keys))}, "recent_conflicts": {"entries": len(self._recent)}}
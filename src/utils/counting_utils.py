@@ -1,32 +1,184 @@
+import numpy as np
+
+DIRECTIONS = ('forward', 'backward')
+GATE_DIRECTIONS = ('enter', 'exit')
+
+def _cross(o, a, b):
+    """z of (a - o) x (b - o), broadcasting over leading dims"""
+    return (a[..., 0] - o[..., 0]) * (b[..., 1] - o[..., 1]) - (a[..., 1] - o[..., 1]) * (b[..., 0] - o[..., 0])
+
+def polygon_edges(polygons):
+    """Concatenated edges of several polygons for points_in_polygons: (x1, y1, y2, dx/dy, starts)"""
+    x1, y1, y2, slope, starts = [], [], [], [], []
+    for poly in polygons:
+        starts.append(len(x1))
+        nxt = np.roll(poly, -1, axis=0)
+        x1.extend(poly[:, 0]); y1.extend(poly[:, 1]); y2.extend(nxt[:, 1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope.extend((nxt[:, 0] - poly[:, 0]) / (nxt[:, 1] - poly[:, 1]))
+    return np.array(x1), np.array(y1), np.array(y2), np.array(slope), np.array(starts, dtype=np.int64)
+
+def points_in_polygons(points, edges):
+    """Vectorized even-odd ray casting of (n, 2) points against all polygons at once -> (n, polygons) bool"""
+    x1, y1, y2, slope, starts = edges
+    x, y = points[:, 0:1], points[:, 1:2]
+    straddles = (y1 > y) != (y2 > y) # Horizontal edges never straddle, so their inf slope is never used
+    with np.errstate(invalid='ignore'):
+        hits = straddles & (x < x1 + (y - y1) * slope)
+    return np.add.reduceat(hits, starts, axis=1) % 2 == 1
+
 class VehicleCounter:
-    def __init__(self, line_y_fraction=0.6):
+    """
+    Vectorized counting over any number of count lines and polygonal gates.
+    Each frame, every track's previous -> current centroid segment is tested
+    against every line at once (orientation tests on (tracks x lines)
+    arrays). The side of a point is sign(cross(B - A, P - A)) with 0 counted on
+    the positive side, so a crossing is 'forward' from negative to positive
+    (for the default left-to-right horizontal line: downwards) and a centroid
+    landing exactly on the line is never counted twice. Gates count 'enter' /
+    'exit' transitions of the centroid. Counts are kept per direction and class.
+
+    lines: [{'name', 'points': [(x1, y1), (x2, y2)], 'directions': ('forward',)}]
+    gates: [{'name', 'polygon': [(x, y), ...]}]
+    Coordinates may be normalized (0-1) or pixels. Without lines, a single
+    horizontal line at line_y_fraction counting downward crossings is used.
+    """
+    def __init__(self, line_y_fraction=0.6, lines=None, gates=None, classes=None, lost_ttl_frames=30):
         self.line_y_fraction = line_y_fraction
+        self.lines = lines if lines is not None else [
+            {'name': 'main', 'points': [(0.0, line_y_fraction), (1.0, line_y_fraction)], 'directions': ('forward',)}
+        ]
+        self.gates = gates or []
+        self.classes = None if classes is None else np.asarray(classes) # None = count every class
+        self.lost_ttl_frames = lost_ttl_frames
+
         self.count = 0
-        self.tracked_vehicles = {} # {id: last_y}
+        self.frame_count = 0
+        self._num_classes = 128
+        self._line_counts = np.zeros((len(self.lines), 2, self._num_classes), dtype=np.int64)
+        self._gate_counts = np.zeros((len(self.gates), 2, self._num_classes), dtype=np.int64)
+        self._counted = np.array([[d in line.get('directions', DIRECTIONS) for d in DIRECTIONS] for line in self.lines],
+                                 dtype=bool).reshape(len(self.lines), 2)
+        self._geometry = None # (shape, line endpoints A/B, gate edges) in pixels
+
+        # Last known centroid per track, sorted by id (vectorized lookup/merge)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._pos = np.empty((0, 2))
+        self._seen = np.empty(0, dtype=np.int64)
+        self._inside = np.zeros((0, len(self.gates)), dtype=bool) # Gate membership at the last position
+
+    def _scaled(self, points, w, h):
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return pts * [w, h] if pts.max() <= 1.0 else pts
+
+    def _pixel_geometry(self, h, w):
+        if self._geometry is None or self._geometry[0] != (h, w):
+            ends = np.array([self._scaled(line['points'], w, h)[:2] for line in self.lines]).reshape(-1, 2, 2)
+            edges = polygon_edges([self._scaled(gate['polygon'], w, h) for gate in self.gates]) if self.gates else None
+            self._geometry = ((h, w), ends[:, 0], ends[:, 1], edges)
+        return self._geometry[1:]
+
+    def _grow_classes(self, max_cls):
+        if max_cls >= self._num_classes:
+            extra = max_cls + 1 - self._num_classes
+            self._line_counts = np.pad(self._line_counts, ((0, 0), (0, 0), (0, extra)))
+            self._gate_counts = np.pad(self._gate_counts, ((0, 0), (0, 0), (0, extra)))
+            self._num_classes = max_cls + 1
 
     def update_count(self, results):
-        h, w = results.orig_shape
-        actual_line_y = h * self.line_y_fraction
-        
-        track_ids = results.boxes.id.int().cpu().tolist() if results.boxes.id is not None else None
-        
-        if track_ids is None:
+        self.frame_count += 1
+        if results.boxes.id is None:
             return self.count
 
-        for i, (box, cls) in enumerate(zip(results.boxes.xyxy, results.boxes.cls)):
-            vehicle_id = f"id_{track_ids[i]}"
-            center_y = (box[1] + box[3]) / 2
-            
-            if vehicle_id in self.tracked_vehicles:
-                prev_y = self.tracked_vehicles[vehicle_id]
-                
-                # If vehicle crosses the line (simple downward crossing)
-                if prev_y < actual_line_y <= center_y:
-                    self.count += 1
-                
-            self.tracked_vehicles[vehicle_id] = center_y
-            
+        h, w = results.orig_shape
+        ids = results.boxes.id.int().cpu().numpy().astype(np.int64).reshape(-1)
+        boxes = results.boxes.xyxy.cpu().numpy().astype(np.float64).reshape(-1, 4)
+        cls = results.boxes.cls.cpu().numpy().astype(np.int64).reshape(-1)
+        if self.classes is not None:
+            keep = np.isin(cls, self.classes)
+            ids, boxes, cls = ids[keep], boxes[keep], cls[keep]
+        centers = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+
+        # Previous centroid of every current track (if seen within the TTL)
+        idx = np.searchsorted(self._ids, ids)
+        idx_c = np.minimum(idx, max(len(self._ids) - 1, 0))
+        known = (idx < len(self._ids)) & (self._ids[idx_c] == ids) if len(self._ids) else np.zeros(len(ids), dtype=bool)
+        prev, cur, moved_cls = self._pos[idx_c[known]], centers[known], cls[known]
+
+        A, B, edges = self._pixel_geometry(h, w)
+        inside = points_in_polygons(centers, edges) if edges is not None else np.zeros((len(ids), 0), dtype=bool)
+        if len(cur):
+            self._grow_classes(int(moved_cls.max()))
+            if len(A):
+                self._count_lines(prev, cur, moved_cls, A, B)
+            if edges is not None:
+                was_in, now_in = self._inside[idx_c[known]], inside[known]
+                for direction, changed in enumerate((~was_in & now_in, was_in & ~now_in)):
+                    track_idx, gate_idx = np.nonzero(changed)
+                    np.add.at(self._gate_counts, (gate_idx, direction, moved_cls[track_idx]), 1)
+
+        self._remember(ids, centers, inside, known, idx_c)
+        self.count = int((self._line_counts.sum(axis=2) * self._counted).sum())
         return self.count
 
+    def _count_lines(self, prev, cur, cls, A, B):
+        # (tracks, lines) orientation tests
+        P, C = prev[:, None, :], cur[:, None, :]
+        a, b = A[None, :, :], B[None, :, :]
+        side_prev = _cross(a, b, P) >= 0
+        side_cur = _cross(a, b, C) >= 0
+        # The movement segment must also straddle the (finite) count line
+        d3 = _cross(P, C, a)
+        d4 = _cross(P, C, b)
+        crossed = (side_prev != side_cur) & (d3 * d4 <= 0)
+        track_idx, line_idx = np.nonzero(crossed)
+        direction = np.where(side_cur[track_idx, line_idx], 0, 1) # 0 = forward (- -> +)
+        np.add.at(self._line_counts, (line_idx, direction, cls[track_idx]), 1)
+
+    def _remember(self, ids, centers, inside, known, idx_c):
+        # Merge this frame's centroids into the sorted store; drop tracks lost for > TTL
+        matched = np.zeros(len(self._ids), dtype=bool)
+        matched[idx_c[known]] = True
+        stale = self.frame_count - self._seen > self.lost_ttl_frames
+        keep = ~matched & ~stale
+        all_ids = np.concatenate([ids, self._ids[keep]])
+        order = np.argsort(all_ids, kind='stable')
+        self._ids = all_ids[order]
+        self._pos = np.concatenate([centers, self._pos[keep]])[order]
+        self._seen = np.concatenate([np.full(len(ids), self.frame_count), self._seen[keep]])[order]
+        self._inside = np.concatenate([inside, self._inside[keep]])[order]
+
     def get_count(self):
         return self.count
+
+    def get_breakdown(self, class_names=None):
+        """
+        {'lines': {name: {'forward': {cls: n}, 'backward': {...}, 'total': n}},
+         'gates': {name: {'enter': {...}, 'exit': {...}, 'net': enter - exit}}}
+        Classes are ids, or names via the optional class_names mapping.
+        """
+        def per_class(row):
+            out = {}
+            for c in np.nonzero(row)[0].tolist():
+                key = class_names.get(c, 'Other') if class_names else c
+                out[key] = out.get(key, 0) + int(row[c])
+            return out
+
+        lines = {}
+        for i, line in enumerate(self.lines):
+            lines[line['name']] = {
+                'forward': per_class(self._line_counts[i, 0]),
+                'backward': per_class(self._line_counts[i, 1]),
+                'total': int((self._line_counts[i].sum(axis=1) * self._counted[i]).sum())
+            }
+        gates = {}
+        for g, gate in enumerate(self.gates):
+            gates[gate['name']] = {
+                'enter': per_class(self._gate_counts[g, 0]),
+                'exit': per_class(self._gate_counts[g, 1]),
+                'net': int(self._gate_counts[g, 0].sum() - self._gate_counts[g, 1].sum())
+            }
+        return {'lines': lines, 'gates': gates}
+
+    def memory_stats(self):
+        return {"tracked_vehicles": {"entries": int(len(self._ids))}}
@@ -1,57 +1,443 @@
 import sqlite3
 import os
+import json
+import threading
+import time
+import zipfile
 from datetime import datetime
 
+from src.utils.evidence_store import EvidenceStore
+
+def normalize_timestamp(value):
+    """
+    'YYYY-mm-dd[ HH:MM[:SS]]' or ISO 'YYYY-mm-ddTHH:MM:SS[.ffffff][+HH:MM]' -> the
+    stored format 'YYYY-mm-dd HH:MM:SS' (local time). ValueError for anything else,
+    so a bad filter never turns into a string comparison.
+    """
+    try:
+        parsed = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError(f"Invalid timestamp {value!r}: expected YYYY-mm-dd[THH:MM:SS]") from None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
 class EvidenceDB:
-    def __init__(self, db_path="data/pegasus.db"):
+    # Tuned for a single writer + concurrent API readers
+    PRAGMAS = [
+        # Incremental auto-vacuum lets the retention job hand pages back in small
+        # steps. It only takes effect before the file header is written (hence
+        # first), existing databases need one full VACUUM (see vacuum()).
+        "PRAGMA auto_vacuum=INCREMENTAL",
+        "PRAGMA journal_mode=WAL",       # Readers never block the writer
+        "PRAGMA synchronous=NORMAL",     # fsync on checkpoint only (safe with WAL)
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-16000",      # ~16MB page cache
+        "PRAGMA mmap_size=268435456",    # 256MB memory-mapped reads
+        "PRAGMA busy_timeout=5000"
+    ]
+
+    def __init__(self, db_path="data/pegasus.db", store=None):
         self.db_path = db_path
+        self.store = store if store is not None else EvidenceStore() # Images live on disk, rows hold the hash
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._write_lock = threading.Lock()
+        self._local = threading.local() # Per-thread read connections
+        self._conn = self._connect()    # Long-lived writer connection
         self._init_db()
 
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
     def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
+        with self._write_lock, self._conn:
+            self._conn.execute("""
                 CREATE TABLE IF NOT EXISTS evidence (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     violation_type TEXT,
                     vehicle_id TEXT,
                     timestamp TEXT,
-                    image_blob BLOB
+                    image_blob BLOB,
+                    image_hash TEXT,
+                    camera_id TEXT,
+                    tier TEXT,
+                    archive_path TEXT
+                )
+            """)
+            # Databases created by older versions lack the newer columns
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(evidence)")}
+            for column in ('image_hash', 'camera_id', 'tier', 'archive_path'):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE evidence ADD COLUMN {column} TEXT")
+
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS incidents (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event_id TEXT,
+                    event_type TEXT,
+                    vehicle_id TEXT,
+                    camera_id TEXT,
+                    status TEXT,
+                    frame_number INTEGER,
+                    timestamp TEXT,
+                    details TEXT,
+                    bbox TEXT
+                )
+            """)
+
+            # Query patterns: newest-first keyset pages, optionally filtered by
+            # type / vehicle / camera, and time-range scans
+            for table, type_column in (('evidence', 'violation_type'), ('incidents', 'event_type')):
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_type_id ON {table} ({type_column}, id)")
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_vehicle_id ON {table} (vehicle_id, id)")
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_camera_id ON {table} (camera_id, id)")
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_timestamp ON {table} (timestamp)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_evidence_hash ON evidence (image_hash)")
+
+            # Images whose last row went away: deleted later by sweep_images()
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS image_tombstones (
+                    image_hash TEXT PRIMARY KEY,
+                    deleted_at REAL
                 )
             """)
-            conn.commit()
 
-    def insert_evidence(self, violation_type, vehicle_id, image_bytes):
+    def insert_evidence(self, violation_type, vehicle_id, image_bytes=None, image_hash=None, camera_id=None):
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO evidence (violation_type, vehicle_id, timestamp, image_blob)
-                VALUES (?, ?, ?, ?)
-            """, (violation_type, vehicle_id, timestamp, image_bytes))
-            conn.commit()
+        if image_hash is None and image_bytes is not None:
+            image_hash = self.store.put(image_bytes)
+        with self._write_lock, self._conn:
+            cursor = self._conn.execute("""
+                INSERT INTO evidence (violation_type, vehicle_id, timestamp, image_hash, camera_id)
+                VALUES (?, ?, ?, ?, ?)
+            """, (violation_type, vehicle_id, timestamp, image_hash, camera_id))
             return cursor.lastrowid
 
-    def get_all_evidence(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, violation_type, vehicle_id, timestamp FROM evidence ORDER BY id DESC")
-            return [dict(row) for row in cursor.fetchall()]
+    def insert_many(self, items):
+        """
+        Insert a batch of evidence items in ONE transaction.
+        items: [{'type', 'vehicle_id', 'image_bytes' or 'image_hash', 'timestamp', 'camera_id' (optional)}]
+        Image bytes are written to the evidence store before the write lock is taken.
+        """
+        if not items:
+            return 0
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = []
+        for item in items:
+            image_hash = item.get('image_hash')
+            if image_hash is None and item.get('image_bytes') is not None:
+                image_hash = self.store.put(item['image_bytes'])
+            rows.append((item['type'], item['vehicle_id'], item.get('timestamp', now), image_hash, item.get('camera_id')))
+        with self._write_lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO evidence (violation_type, vehicle_id, timestamp, image_hash, camera_id)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+        return len(rows)
+
+    def insert_incidents(self, events):
+        """Insert a batch of canonical events (see TrafficViolationDetector._serialize_event)"""
+        if not events:
+            return 0
+        rows = [(
+            e['event_id'],
+            e['event_type'],
+            str(e['vehicle_id']),
+            e.get('camera_id'),
+            e['metadata']['status'],
+            e['frame_number'],
+            e['timestamp'].replace('T', ' '),
+            e['metadata'].get('details', ''),
+            json.dumps(e['metadata'].get('bbox'))
+        ) for e in events]
+        with self._write_lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO incidents (event_id, event_type, vehicle_id, camera_id, status, frame_number, timestamp, details, bbox)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+        return len(rows)
+
+    def _keyset_page(self, table, columns, type_column, limit, cursor=None, event_type=None,
+                     vehicle_id=None, camera_id=None, since=None, until=None):
+        """
+        One newest-first page using keyset pagination (WHERE id < cursor), so the
+        cost of page N does not grow with N. Returns (rows, next_cursor).
+        """
+        clauses, params = [], []
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(int(cursor))
+        for column, value in ((type_column, event_type), ('vehicle_id', vehicle_id), ('camera_id', camera_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(normalize_timestamp(since))
+        if until is not None:
+            clauses.append("timestamp <= ?")
+            params.append(normalize_timestamp(until))
+
+        query = f"SELECT {columns} FROM {table}"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit + 1) # One extra row tells us whether another page exists
+
+        rows = [dict(row) for row in self._reader().execute(query, params).fetchall()]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]['id']
+        return rows, next_cursor
+
+    def query_evidence(self, limit=50, cursor=None, violation_type=None, vehicle_id=None,
+                       camera_id=None, since=None, until=None):
+        return self._keyset_page(
+            "evidence", "id, violation_type, vehicle_id, camera_id, timestamp, image_hash", "violation_type",
+            limit, cursor, violation_type, vehicle_id, camera_id, since, until
+        )
+
+    def query_incidents(self, limit=50, cursor=None, event_type=None, vehicle_id=None,
+                        camera_id=None, since=None, until=None):
+        rows, next_cursor = self._keyset_page(
+            "incidents", "id, event_id, event_type, vehicle_id, camera_id, status, frame_number, timestamp, details, bbox",
+            "event_type", limit, cursor, event_type, vehicle_id, camera_id, since, until
+        )
+        for row in rows:
+            row['bbox'] = json.loads(row['bbox']) if row['bbox'] else None
+        return rows, next_cursor
+
+    def iter_evidence(self, chunk_size=1000, **filters):
+        """Walk all matching evidence page by page (for streaming exports)"""
+        return self._iter_pages(self.query_evidence, chunk_size, filters)
+
+    def iter_incidents(self, chunk_size=1000, **filters):
+        return self._iter_pages(self.query_incidents, chunk_size, filters)
+
+    @staticmethod
+    def _iter_pages(query_fn, chunk_size, filters):
+        # Each page is a complete query, so the generator may be resumed from any thread
+        cursor = None
+        while True:
+            rows, cursor = query_fn(limit=chunk_size, cursor=cursor, **filters)
+            yield from rows
+            if cursor is None:
+                break
+
+    def get_all_evidence(self, limit=None):
+        query = "SELECT id, violation_type, vehicle_id, camera_id, timestamp, image_hash FROM evidence ORDER BY id DESC"
+        params = ()
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (limit,)
+        cursor = self._reader().execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_evidence_by_type(self, violation_type, limit=100):
+        cursor = self._reader().execute(
+            "SELECT id, violation_type, vehicle_id, camera_id, timestamp, image_hash FROM evidence WHERE violation_type = ? ORDER BY id DESC LIMIT ?",
+            (violation_type, limit)
+        )
+        return [dict(row) for row in cursor.fetchall()]
 
     def get_evidence_image(self, evidence_id):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT image_blob FROM evidence WHERE id = ?", (evidence_id,))
-            row = cursor.fetchone()
-            return row[0] if row else None
+        cursor = self._reader().execute("SELECT image_hash, image_blob, tier, archive_path FROM evidence WHERE id = ?", (evidence_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        if row['tier'] == 'archive':
+            return self._read_archived(row['archive_path'], row['image_hash'])
+        if row['image_hash']:
+            image_bytes = self.store.get(row['image_hash'])
+            if image_bytes is None:
+                # Same content was archived while this row was being written
+                archived = self._reader().execute(
+                    "SELECT archive_path FROM evidence WHERE image_hash = ? AND tier = 'archive' LIMIT 1",
+                    (row['image_hash'],)).fetchone()
+                if archived:
+                    return self._read_archived(archived['archive_path'], row['image_hash'])
+            return image_bytes
+        return row['image_blob'] # Legacy row not migrated yet
+
+    @staticmethod
+    def _read_archived(archive_path, image_hash):
+        if not archive_path:
+            return None
+        try:
+            with zipfile.ZipFile(archive_path) as zf:
+                return zf.read(f"{image_hash}.jpg")
+        except (FileNotFoundError, KeyError):
+            return None
+
+    def get_evidence_thumbnail(self, evidence_id):
+        cursor = self._reader().execute("SELECT image_hash FROM evidence WHERE id = ?", (evidence_id,))
+        row = cursor.fetchone()
+        if row is None or not row['image_hash']:
+            return None
+        return self.store.get_thumbnail(row['image_hash'])
+
+    def migrate_blobs(self, batch_size=200):
+        """
+        Move legacy image_blob payloads into the evidence store.
+        Runs in small transactions so it can be interrupted and resumed.
+        Returns the number of rows migrated.
+        """
+        migrated = 0
+        while True:
+            rows = self._reader().execute(
+                "SELECT id, image_blob FROM evidence WHERE image_blob IS NOT NULL LIMIT ?", (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+            updates = [(self.store.put(row['image_blob']), row['id']) for row in rows]
+            with self._write_lock, self._conn:
+                self._conn.executemany("UPDATE evidence SET image_hash = ?, image_blob = NULL WHERE id = ?", updates)
+            migrated += len(updates)
+        return migrated
+
+    def vacuum(self):
+        """Reclaim the space freed by migrated BLOBs (also enables incremental auto-vacuum)"""
+        with self._write_lock:
+            self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._conn.execute("VACUUM")
+
+    def incremental_vacuum(self, pages=256):
+        """
+        Return up to `pages` free pages to the OS; short enough to never stall the writer.
+        Returns the remaining free page count (0 if auto_vacuum is not INCREMENTAL).
+        """
+        if self._reader().execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        with self._write_lock:
+            self._conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        return self._reader().execute("PRAGMA freelist_count").fetchone()[0]
 
     def delete_evidence(self, ids=None):
         """Delete specific IDs or ALL if ids is None or contains 'ALL'"""
-        with sqlite3.connect(self.db_path) as conn:
-            if not ids or "ALL" in ids:
-                conn.execute("DELETE FROM evidence")
-            else:
-                placeholders = ','.join(['?'] * len(ids))
-                conn.execute(f"DELETE FROM evidence WHERE id IN ({placeholders})", ids)
-            conn.commit()
+        if not ids or "ALL" in ids:
+            return self._delete_evidence_where("1 = 1", ())
+        placeholders = ','.join(['?'] * len(ids))
+        return self._delete_evidence_where(f"id IN ({placeholders})", tuple(ids))
+
+    def delete_evidence_before(self, cutoff, violation_type=None, exclude_types=(), limit=500):
+        """
+        Delete up to `limit` of the oldest rows with timestamp < cutoff, optionally
+        for one violation type or for every type except `exclude_types`.
+        Returns the number of rows deleted (callers loop in small batches).
+        """
+        clauses, params = ["timestamp < ?"], [normalize_timestamp(cutoff)]
+        if violation_type is not None:
+            clauses.append("violation_type = ?")
+            params.append(violation_type)
+        if exclude_types:
+            clauses.append(f"violation_type NOT IN ({','.join(['?'] * len(exclude_types))})")
+            params.extend(exclude_types)
+        where = f"id IN (SELECT id FROM evidence WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?)"
+        params.append(limit)
+        return self._delete_evidence_where(where, tuple(params))
+
+    def _delete_evidence_where(self, where, params):
+        with self._write_lock, self._conn:
+            targets = self._conn.execute(
+                f"SELECT id, image_hash, archive_path FROM evidence WHERE {where}", params).fetchall()
+            if not targets:
+                return 0
+            ids = [row[0] for row in targets]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                self._conn.execute(f"DELETE FROM evidence WHERE id IN ({','.join(['?'] * len(chunk))})", chunk)
+            # Identical captures share one file: only what nothing references anymore is
+            # tombstoned; its file goes in sweep_images(), after in-flight inserts landed
+            hashes = {row[1] for row in targets if row[1]}
+            archives = {row[2] for row in targets if row[2]}
+            orphaned = [h for h in hashes
+                        if self._conn.execute("SELECT 1 FROM evidence WHERE image_hash = ? LIMIT 1", (h,)).fetchone() is None]
+            dead_archives = [a for a in archives
+                             if self._conn.execute("SELECT 1 FROM evidence WHERE archive_path = ? LIMIT 1", (a,)).fetchone() is None]
+            self._tombstone(orphaned)
+        for archive_path in dead_archives:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+        return len(ids)
+
+    def _tombstone(self, image_hashes):
+        self._conn.executemany("INSERT OR REPLACE INTO image_tombstones (image_hash, deleted_at) VALUES (?, ?)",
+                               [(h, time.time()) for h in image_hashes])
+
+    def tombstone_images(self, image_hashes):
+        """Schedule hot image files for deletion by sweep_images() (e.g. once archived)"""
+        with self._write_lock, self._conn:
+            self._tombstone(image_hashes)
+
+    def tombstoned_images(self):
+        """Hashes waiting for sweep_images()"""
+        return [row[0] for row in self._reader().execute("SELECT image_hash FROM image_tombstones").fetchall()]
+
+    def _hot_referenced(self, image_hash):
+        return self._reader().execute(
+            "SELECT 1 FROM evidence WHERE image_hash = ? AND (tier IS NULL OR tier = 'hot') LIMIT 1",
+            (image_hash,)).fetchone() is not None
+
+    def sweep_images(self, grace_seconds=300.0, limit=500):
+        """
+        Delete the files of hashes tombstoned more than grace_seconds ago (rows
+        already queued for insert have landed by then) unless a hot row references
+        them again or they were stored again since; thumbnails stay while any row
+        (e.g. an archived one) references the hash. Returns the number of files deleted.
+        """
+        due = self._reader().execute(
+            "SELECT image_hash, deleted_at FROM image_tombstones WHERE deleted_at < ? ORDER BY deleted_at LIMIT ?",
+            (time.time() - grace_seconds, limit)).fetchall()
+        deleted = 0
+        for image_hash, deleted_at in due:
+            referenced = self._reader().execute(
+                "SELECT 1 FROM evidence WHERE image_hash = ? LIMIT 1", (image_hash,)).fetchone() is not None
+            if self.store.delete_unless_used(image_hash, deleted_at, self._hot_referenced, keep_thumbnail=referenced):
+                deleted += 1
+            with self._write_lock, self._conn:
+                # A newer tombstone of the same hash stays for the next sweep
+                self._conn.execute("DELETE FROM image_tombstones WHERE image_hash = ? AND deleted_at = ?",
+                                   (image_hash, deleted_at))
+        return deleted
+
+    def delete_incidents_before(self, cutoff, limit=1000):
+        with self._write_lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM incidents WHERE id IN (SELECT id FROM incidents WHERE timestamp < ? ORDER BY id LIMIT ?)",
+                (normalize_timestamp(cutoff), limit))
+            return cursor.rowcount
+
+    def archive_candidates(self, cutoff=None, limit=200):
+        """Oldest hot-tier image hashes (optionally only those captured before cutoff)"""
+        query = "SELECT image_hash FROM evidence WHERE image_hash IS NOT NULL AND (tier IS NULL OR tier = 'hot')"
+        params = []
+        if cutoff is not None:
+            query += " AND timestamp < ?"
+            params.append(normalize_timestamp(cutoff))
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        hashes = [row[0] for row in self._reader().execute(query, params).fetchall()]
+        return list(dict.fromkeys(hashes)) # Unique, oldest first
+
+    def mark_archived(self, image_hashes, archive_path):
+        """Point every row of these hashes at the archive; hot copies can then be dropped"""
+        with self._write_lock, self._conn:
+            self._conn.executemany(
+                "UPDATE evidence SET tier = 'archive', archive_path = ? WHERE image_hash = ?",
+                [(archive_path, h) for h in image_hashes])
+
+    def close(self):
+        with self._write_lock:
+            self._conn.close()
@@ -1,11 +1,19 @@
-from datetime import datetime, timedelta
+import time
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+from src.utils.track_state import TrackStateCache
 
 class EvidenceManager:
     def __init__(self, cooldown_seconds=60):
         self.cooldown_seconds = cooldown_seconds
-        self.last_capture = {} # {(vehicle_id, violation_type): timestamp}
-        self.global_last_capture = {} # {violation_type: timestamp}
         self.global_cooldown = 10 # Global throttle for the same type (seconds)
+        # Entries older than their cooldown can no longer block a capture: evict them
+        self.last_capture = TrackStateCache(cooldown_seconds) # {(vehicle_id, violation_type): timestamp}
+        self.global_last_capture = TrackStateCache(self.global_cooldown) # {violation_type: timestamp}
 
     def should_capture(self, vehicle_id, violation_type, status):
         """
@@ -13,25 +21,97 @@ class EvidenceManager:
         Includes a per-vehicle cooldown AND a global per-type cooldown 
         to prevent flooding during messy intersections/flicker.
         """
-        now = datetime.now()
+        now = time.time()
+        self.last_capture.evict(now)
+        self.global_last_capture.evict(now)
         
         # 1. Global Cooldown (Throttle specific types like illegal_boarding)
-        if violation_type in self.global_last_capture:
-            if now - self.global_last_capture[violation_type] < timedelta(seconds=self.global_cooldown):
-                return False
+        last_time = self.global_last_capture.last_seen(violation_type)
+        if last_time is not None and now - last_time < self.global_cooldown:
+            return False
 
         # 2. Per-Vehicle Cooldown
         key = (vehicle_id, violation_type)
-        if key in self.last_capture:
-            last_time = self.last_capture[key]
-            if now - last_time < timedelta(seconds=self.cooldown_seconds):
-                return False
+        last_time = self.last_capture.last_seen(key)
+        if last_time is not None and now - last_time < self.cooldown_seconds:
+            return False
 
         # If it's a 'START', we capture. END captures are disabled in detector.py.
         if status != 'VIOLATION_START':
             return False
 
         # If we decide to capture, update both timers
-        self.last_capture[key] = now
-        self.global_last_capture[violation_type] = now
+        self.last_capture.set(key, now, now)
+        self.global_last_capture.set(violation_type, now, now)
         return True
+
+    def memory_stats(self):
+        return {"last_capture": self.last_capture.memory_stats(),
+                "global_last_capture": self.global_last_capture.memory_stats()}
+
+
+def dhash(image, bbox=None, hash_size=8, pad=0.25):
+    """
+    Difference hash of the (padded) bbox region as an int (64 bits by default).
+    The ROI is decimated by striding before the resize, so the cost does not
+    grow with the crop size: cheap enough to run on the frame loop.
+    """
+    h, w = image.shape[:2]
+    x1, y1, x2, y2 = 0, 0, w, h
+    if bbox is not None and hasattr(bbox, '__iter__') and len(bbox) >= 4:
+        bx1, by1, bx2, by2 = map(float, list(bbox)[:4])
+        px, py = (bx2 - bx1) * pad, (by2 - by1) * pad
+        x1, y1 = max(0, int(bx1 - px)), max(0, int(by1 - py))
+        x2, y2 = min(w, int(bx2 + px)), min(h, int(by2 + py))
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            x1, y1, x2, y2 = 0, 0, w, h
+    roi = image[y1:y2, x1:x2]
+    step = max(1, min(roi.shape[0], roi.shape[1]) // (hash_size * 4))
+    roi = roi[::step, ::step]
+    if roi.ndim == 3:
+        roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(roi, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class NearDuplicateIndex:
+    """
+    Perceptual-hash index over recent evidence, per camera and violation type.
+    A capture whose dHash is within `max_distance` bits of one stored in the
+    last `window_seconds` is a near-duplicate: typically the same incident seen
+    under a different track-ID pair, or the same static scene captured again.
+    """
+    def __init__(self, window_seconds=120, max_distance=6, max_entries=256):
+        self.window_seconds = window_seconds
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._recent = {} # {(camera_id, violation_type): deque of entries}
+        self._lock = threading.Lock()
+
+    def match_or_add(self, phash, camera_id, violation_type, now=None):
+        """
+        Return (entry, is_duplicate). For a new image the returned entry was just
+        registered; for a duplicate it is the original's entry. Entries are dicts
+        whose 'image_hash' is filled in once the original has been stored.
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            recent = self._recent.setdefault((camera_id, violation_type), deque(maxlen=self.max_entries))
+            while recent and now - recent[0]['time'] > self.window_seconds:
+                recent.popleft()
+            for entry in recent:
+                if bin(entry['phash'] ^ phash).count('1') <= self.max_distance:
+                    entry['duplicates'] += 1
+                    return entry, True
+            entry = {'phash': phash, 'time': now, 'image_hash': None, 'duplicates': 0}
+            recent.append(entry)
+            return entry, False
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+
+    def memory_stats(self):
+        with self._lock:
+            return {"keys": len(self._recent), "entries": sum(len(d) for d in self._recent.values())}
@@ -0,0 +1,163 @@
+import os
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+class EvidenceStore:
+    """
+    Content-addressed evidence image store.
+    Images are written once under root/<aa>/<bb>/<sha256>.jpg (sharded by the
+    first two hash bytes so no directory grows unbounded); identical captures
+    share one file. A small thumbnail is generated in the background at ingest
+    so list/vault views never have to load the full-resolution image.
+    Files that may be shared are removed with delete_unless_used(), which
+    cannot race a concurrent put() of the same image.
+    """
+    def __init__(self, root="data/evidence_store", thumb_width=320, thumb_quality=70, thumb_workers=1):
+        self.root = root
+        self.thumb_root = os.path.join(root, "thumbs")
+        self.thumb_width = thumb_width
+        self.thumb_quality = thumb_quality
+        self._thumb_pool = ThreadPoolExecutor(max_workers=thumb_workers, thread_name_prefix="thumbnailer")
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def hash_bytes(image_bytes):
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def _shard(self, base, image_hash):
+        return os.path.join(base, image_hash[:2], image_hash[2:4], f"{image_hash}.jpg")
+
+    def path_for(self, image_hash):
+        return self._shard(self.root, image_hash)
+
+    def thumb_path_for(self, image_hash):
+        return self._shard(self.thumb_root, image_hash)
+
+    def exists(self, image_hash):
+        return os.path.exists(self.path_for(image_hash))
+
+    def put(self, image_bytes, thumbnail=True):
+        """Store image bytes (only touched if already present) and return the content hash"""
+        image_hash = self.hash_bytes(image_bytes)
+        path = self.path_for(image_hash)
+        try:
+            os.utime(path) # Already stored: the newer mtime keeps a pending sweep from deleting it
+        except FileNotFoundError:
+            self._atomic_write(path, image_bytes)
+        if thumbnail and not os.path.exists(self.thumb_path_for(image_hash)):
+            self._thumb_pool.submit(self._make_thumbnail, image_hash, image_bytes)
+        return image_hash
+
+    def get(self, image_hash):
+        try:
+            with open(self.path_for(image_hash), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def get_thumbnail(self, image_hash):
+        """Thumbnail bytes; built on demand if the background job has not run yet"""
+        try:
+            with open(self.thumb_path_for(image_hash), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            image_bytes = self.get(image_hash)
+            if image_bytes is None:
+                return None
+            return self._make_thumbnail(image_hash, image_bytes)
+
+    def delete(self, image_hash, keep_thumbnail=False):
+        paths = [self.path_for(image_hash)]
+        if not keep_thumbnail:
+            paths.append(self.thumb_path_for(image_hash))
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def delete_unless_used(self, image_hash, since, in_use, keep_thumbnail=False):
+        """
+        Deferred delete of an image whose rows were removed at `since` (epoch).
+        The file is moved aside first, so a concurrent put() either finds it
+        gone and rewrites it, or has already refreshed its mtime. It is put back
+        if put() ran after `since` or in_use(image_hash) holds again, otherwise
+        deleted. Returns True if the image is gone.
+        """
+        path = self.path_for(image_hash)
+        aside = f"{path}.{os.getpid()}.sweep"
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            aside = None
+        if in_use(image_hash) or (aside is not None and os.stat(aside).st_mtime >= since):
+            if aside is not None:
+                os.replace(aside, path) # Same bytes if put() rewrote it meanwhile
+            return False
+        if aside is not None:
+            os.remove(aside)
+        if not keep_thumbnail:
+            try:
+                os.remove(self.thumb_path_for(image_hash))
+            except FileNotFoundError:
+                pass
+        return True
+
+    def file_size(self, image_hash):
+        try:
+            return os.path.getsize(self.path_for(image_hash))
+        except FileNotFoundError:
+            return 0
+
+    def size_bytes(self):
+        """Total size of the full-resolution tier (thumbnails excluded)"""
+        total = 0
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.path == self.thumb_root:
+                continue
+            for sub in os.scandir(shard.path):
+                if sub.is_dir():
+                    total += sum(entry.stat().st_size for entry in os.scandir(sub.path) if entry.is_file())
+        return total
+
+    def wait(self):
+        """Block until queued thumbnails are written"""
+        self._thumb_pool.shutdown(wait=True)
+        self._thumb_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnailer")
+
+    def _make_thumbnail(self, image_hash, image_bytes):
+        try:
+            img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                return None
+            h, w = img.shape[:2]
+            if w > self.thumb_width:
+                img = cv2.resize(img, (self.thumb_width, int(h * self.thumb_width / w)), interpolation=cv2.INTER_AREA)
+            ret, buffer = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), self.thumb_quality])
+            if not ret:
+                return None
+            thumb_bytes = buffer.tobytes()
+            self._atomic_write(self.thumb_path_for(image_hash), thumb_bytes)
+            return thumb_bytes
+        except Exception as e:
+            print(f"ERROR: Thumbnail generation failed for {image_hash}: {e}")
+            return None
+
+    @staticmethod
+    def _atomic_write(path, data):
+        # Write-then-rename so readers never see a partial image
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
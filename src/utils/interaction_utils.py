@@ -1,117 +1,152 @@
 import numpy as np
 
+from src.utils.counting_utils import polygon_edges, points_in_polygons
+
+VEHICLE_CLASSES = (2, 3, 5, 7)
+
+def box_gaps(a, b):
+    """Euclidean gap between xyxy boxes, broadcasting over leading dims (0 when they overlap)"""
+    dx = np.maximum(0, np.maximum(a[..., 0], b[..., 0]) - np.minimum(a[..., 2], b[..., 2]))
+    dy = np.maximum(0, np.maximum(a[..., 1], b[..., 1]) - np.minimum(a[..., 3], b[..., 3]))
+    return np.hypot(dx, dy)
+
 class InteractionDetector:
-    def __init__(self, restricted_lane_roi=None, fps=30):
+    """
+    Person <-> stationary vehicle interactions (illegal curbside boarding).
+    All person x vehicle box gaps are one broadcasted matrix (or, with the frame's
+    ProximityService, only the pairs whose centers are near enough) and the ROI
+    test runs vectorized on the close pairs only. Pair state lives in arrays sorted
+    by an int64 key (vehicle track id << 32 | person track id). Persistence and
+    the grace period are elapsed seconds on the caller's clock.
+    """
+    def __init__(self, restricted_lane_roi=None, fps=30, max_gap=60, persistence_seconds=1.5, grace_seconds=0.35):
         self.restricted_lane_roi = restricted_lane_roi
-        self.fps = fps
-        self.persistence_threshold = int(1.5 * fps) # 1.5 seconds to confirm
-        self.grace_period = 10 # frames
-        
-        self.active_violations = set() # {(vehicle_id, person_id)}
-        self.potential_violations = {} # {(v_id, p_id): start_frame}
-        self.lost_track_counters = {} # {(v_id, p_id): frames_since_lost}
+        self.fps = fps # Default clock: frame_count / fps
+        self.max_gap = max_gap # Slightly increased from 50 px for robustness
+        self.persistence_seconds = persistence_seconds # 1.5 seconds to confirm
+        self.grace_seconds = grace_seconds # ~10 frames at 30 fps
         self.frame_count = 0
+        self._roi = None # (shape, polygon edges) in pixels
+
+        # Pair state, sorted by key
+        self._keys = np.empty(0, dtype=np.int64)
+        self._start = np.empty(0) # Time the pair was first seen close
+        self._active = np.empty(0, dtype=bool) # Confirmed (VIOLATION_START sent)
+        self._lost_since = np.empty(0) # Time an active pair went missing, NaN if present
+
+    def _roi_edges(self, h, w):
+        if self._roi is None or self._roi[0] != (h, w):
+            poly = np.array(self.restricted_lane_roi, dtype=np.float64).reshape(-1, 2)
+            if poly.max() <= 1.0: poly = poly * [w, h]
+            self._roi = ((h, w), polygon_edges([poly]))
+        return self._roi[1]
+
+    @staticmethod
+    def _pair_id(key):
+        return f"id_{key >> 32}_id_{key & 0xFFFFFFFF}"
+
+    def _close_pairs(self, results, stationary_vehicle_ids, proximity=None):
+        """Sorted unique keys of the person / stationary vehicle pairs close enough this frame"""
+        h, w = results.orig_shape
+        boxes = results.boxes.xyxy.cpu().numpy().astype(np.float64).reshape(-1, 4)
+        classes = results.boxes.cls.cpu().numpy().astype(np.int64).reshape(-1)
+        ids = results.boxes.id.int().cpu().numpy().astype(np.int64).reshape(-1)
+
+        persons = classes == 0
+        vehicles = (classes[:, None] == VEHICLE_CLASSES).any(axis=1)
+        vehicles[vehicles] = [f"id_{tid}" in stationary_vehicle_ids for tid in ids[vehicles].tolist()]
+        if not persons.any() or not vehicles.any():
+            return np.empty(0, dtype=np.int64)
+
+        if proximity is not None and len(proximity) == len(boxes):
+            # A gap < max_gap needs the centers within max_gap + both half-diagonals
+            involved = persons | vehicles
+            diag = np.hypot(boxes[involved, 2] - boxes[involved, 0], boxes[involved, 3] - boxes[involved, 1])
+            radius = self.max_gap + diag.max()
+            a, b = proximity.pairs_within(radius, mask=involved)
+            p_rows, v_rows = np.where(persons[a], a, b), np.where(persons[a], b, a)
+            mixed = persons[p_rows] & vehicles[v_rows]
+            p_rows, v_rows = p_rows[mixed], v_rows[mixed]
+            close = box_gaps(boxes[p_rows], boxes[v_rows]) < self.max_gap
+            p_rows, v_rows = p_rows[close], v_rows[close]
+        else:
+            p_all, v_all = np.nonzero(persons)[0], np.nonzero(vehicles)[0]
+            p_idx, v_idx = np.nonzero(box_gaps(boxes[p_all][:, None], boxes[v_all][None, :]) < self.max_gap)
+            p_rows, v_rows = p_all[p_idx], v_all[v_idx]
+
+        # Optional: Lane ROI check on the person center of close pairs
+        if self.restricted_lane_roi is not None and len(p_rows):
+            centers = (boxes[p_rows, :2] + boxes[p_rows, 2:]) / 2
+            in_roi = points_in_polygons(centers, self._roi_edges(h, w))[:, 0]
+            p_rows, v_rows = p_rows[in_roi], v_rows[in_roi]
 
-    def detect_illegal_boarding(self, results, stationary_vehicle_ids):
+        return np.unique((ids[v_rows] << 32) | ids[p_rows])
+
+    def detect_illegal_boarding(self, results, stationary_vehicle_ids, proximity=None, now=None):
         """
         stationary_vehicle_ids: Set of vehicle IDs that are currently stopped.
+        proximity: optional ProximityService indexed on this frame.
+        now: frame time in seconds (default frame_count / fps).
         """
-        anomalies = []
-        h, w = results.orig_shape
-        
-        boxes = results.boxes.xyxy.cpu().numpy()
-        classes = results.boxes.cls.cpu().numpy()
-        track_ids = results.boxes.id.int().cpu().tolist() if results.boxes.id is not None else None
-
-        if track_ids is None:
+        if results.boxes.id is None:
             return []
 
-        persons = []
-        vehicles = []
+        self.frame_count += 1
+        now = now if now is not None else self.frame_count / self.fps
+        current = self._close_pairs(results, stationary_vehicle_ids, proximity)
 
-        for i in range(len(boxes)):
-            cls = int(classes[i])
-            if track_ids[i] is None: continue
-            vid = f"id_{track_ids[i]}"
-            
-            if cls == 0: # Person
-                persons.append({'id': vid, 'bbox': boxes[i]})
-            elif cls in [2, 3, 5, 7] and vid in stationary_vehicle_ids: # Stationary vehicle
-                vehicles.append({'id': vid, 'bbox': boxes[i]})
+        # 1. Start tracking new pairs
+        idx = np.searchsorted(self._keys, current)
+        known = (idx < len(self._keys)) & (self._keys[np.minimum(idx, max(len(self._keys) - 1, 0))] == current) \
+            if len(self._keys) else np.zeros(len(current), dtype=bool)
+        new = current[~known]
+        if len(new):
+            keys = np.concatenate([self._keys, new])
+            order = np.argsort(keys, kind='stable')
+            self._keys = keys[order]
+            self._start = np.concatenate([self._start, np.full(len(new), float(now))])[order]
+            self._active = np.concatenate([self._active, np.zeros(len(new), dtype=bool)])[order]
+            self._lost_since = np.concatenate([self._lost_since, np.full(len(new), np.nan)])[order]
 
-        self.frame_count += 1
-        current_interactions = set()
-
-        for p in persons:
-            px1, py1, px2, py2 = p['bbox']
-            p_center = ((px1 + px2)/2, (py1 + py2)/2)
-            
-            for v in vehicles:
-                vx1, vy1, vx2, vy2 = v['bbox']
-                
-                # Check distance between bboxes (proximity < 50 pixels)
-                dx = max(0, max(px1, vx1) - min(px2, vx2))
-                dy = max(0, max(py1, vy1) - min(py2, vy2))
-                dist = np.sqrt(dx**2 + dy**2)
-                
-                if dist < 60: # Slightly increased for robustness
-                    # Optional: Lane ROI check
-                    in_roi = True
-                    if self.restricted_lane_roi is not None:
-                        import cv2 
-                        poly = np.array(self.restricted_lane_roi, np.float32)
-                        if poly.max() <= 1.0: poly = poly * [w, h]
-                        if cv2.pointPolygonTest(poly.astype(np.int32), p_center, False) < 0:
-                            in_roi = False
-                    
-                    if in_roi:
-                        interaction_id = (v['id'], p['id'])
-                        current_interactions.add(interaction_id)
-                        
-                        # 1. Start tracking if new
-                        if interaction_id not in self.potential_violations and interaction_id not in self.active_violations:
-                            self.potential_violations[interaction_id] = self.frame_count
-                        
-                        # 2. Reset lost counter if it was dying
-                        if interaction_id in self.lost_track_counters:
-                            del self.lost_track_counters[interaction_id]
-
-        # 3. Handle Promotions (Potential -> Active)
-        for interaction_id, start_frame in list(self.potential_violations.items()):
-            if interaction_id in current_interactions:
-                if self.frame_count - start_frame >= self.persistence_threshold:
-                    self.active_violations.add(interaction_id)
-                    del self.potential_violations[interaction_id]
-                    anomalies.append({
-                        'type': 'illegal_boarding',
-                        'status': 'VIOLATION_START',
-                        'id': f"{interaction_id[0]}_{interaction_id[1]}",
-                        'bbox': None, # Could find box again but None is handled by fallback
-                        'details': f"Verified curbside interaction (>{self.persistence_threshold} frames)"
-                    })
-            else:
-                # Dropped from detection before it became active
-                del self.potential_violations[interaction_id]
-
-        # 4. Handle Tracking Loss with Grace Period
-        for interaction_id in list(self.active_violations):
-            if interaction_id not in current_interactions:
-                if interaction_id not in self.lost_track_counters:
-                    self.lost_track_counters[interaction_id] = self.frame_count
-                
-                # Check if grace period expired
-                if self.frame_count - self.lost_track_counters[interaction_id] > self.grace_period:
-                    anomalies.append({
-                        'type': 'illegal_boarding',
-                        'status': 'VIOLATION_END',
-                        'id': f"{interaction_id[0]}_{interaction_id[1]}",
-                        'details': "Interaction concluded (grace period expired)"
-                    })
-                    self.active_violations.remove(interaction_id)
-                    del self.lost_track_counters[interaction_id]
-            else:
-                # It's back! Reset counter
-                if interaction_id in self.lost_track_counters:
-                    del self.lost_track_counters[interaction_id]
+        present = np.isin(self._keys, current, assume_unique=True)
+        anomalies = []
+
+        # 2. Potential -> Active once the pair persisted long enough
+        promote = present & ~self._active & (now - self._start >= self.persistence_seconds)
+        for key in self._keys[promote].tolist():
+            anomalies.append({
+                'type': 'illegal_boarding',
+                'status': 'VIOLATION_START',
+                'id': self._pair_id(key),
+                'bbox': None, # Could find box again but None is handled by fallback
+                'details': f"Verified curbside interaction (>{self.persistence_seconds:g}s)"
+            })
+        self._active |= promote
+
+        # 3. Tracking loss with grace period (active pairs); back in view resets the counter
+        self._lost_since[present] = np.nan
+        missing = self._active & ~present
+        self._lost_since[missing & np.isnan(self._lost_since)] = now
+        expired = missing & (now - self._lost_since > self.grace_seconds)
+        for key in self._keys[expired].tolist():
+            anomalies.append({
+                'type': 'illegal_boarding',
+                'status': 'VIOLATION_END',
+                'id': self._pair_id(key),
+                'details': "Interaction concluded (grace period expired)"
+            })
+
+        # Drop expired pairs and potentials that were not seen this frame
+        keep = (present | self._active) & ~expired
+        if not keep.all():
+            self._keys, self._start = self._keys[keep], self._start[keep]
+            self._active, self._lost_since = self._active[keep], self._lost_since[keep]
 
         return anomalies
+
+    def memory_stats(self):
+        return {
+            "active_violations": int(self._active.sum()),
+            "potential_violations": int((~self._active).sum()),
+            "lost_track_counters": int((~np.isnan(self._lost_since)).sum())
+        }
@@ -1,13 +1,17 @@
 import cv2
 import numpy as np
 
+from src.utils.track_state import TrackStateCache
+
 class LaneViolationDetector:
-    def __init__(self, lanes=None):
+    def __init__(self, lanes=None, lost_ttl_frames=30):
         """
         lanes: List of polygons [(x1,y1), (x2,y2), ...] representing allowed lanes
+        lost_ttl_frames: an active violation whose track is lost this long is ended
         """
         self.lanes = lanes if lanes else []
-        self.violation_active = {}
+        self.frame_count = 0
+        self.violation_active = TrackStateCache(lost_ttl_frames) # {vehicle_id: True} while in violation
 
     def detect_lane_violation(self, results):
         violations = []
@@ -15,6 +19,7 @@ class LaneViolationDetector:
         vehicle_classes = [2, 3, 5, 7]
         
         track_ids = results.boxes.id.int().cpu().tolist() if results.boxes.id is not None else None
+        self.frame_count += 1
         
         for i, (box, cls) in enumerate(zip(results.boxes.xyxy, results.boxes.cls)):
             if int(cls) in vehicle_classes:
@@ -43,8 +48,10 @@ class LaneViolationDetector:
                             break
                 
                 if not is_in_lane:
-                    if not self.violation_active.get(vehicle_id, False):
-                        self.violation_active[vehicle_id] = True
+                    if vehicle_id in self.violation_active:
+                        self.violation_active.touch(vehicle_id, self.frame_count)
+                    else:
+                        self.violation_active.set(vehicle_id, True, self.frame_count)
                         violations.append({
                             'type': 'lane_violation',
                             'status': 'VIOLATION_START',
@@ -53,8 +60,7 @@ class LaneViolationDetector:
                             'details': "Vehicle outside designated lanes"
                         })
                 else:
-                    if self.violation_active.get(vehicle_id, False):
-                        self.violation_active[vehicle_id] = False
+                    if self.violation_active.pop(vehicle_id, False):
                         violations.append({
                             'type': 'lane_violation',
                             'status': 'VIOLATION_END',
@@ -62,6 +68,15 @@ class LaneViolationDetector:
                             'bbox': box,
                             'details': "Vehicle returned to lane"
                         })
+
+        # Lost tracks: close their violation instead of keeping the id forever
+        for vehicle_id, _ in self.violation_active.evict(self.frame_count):
+            violations.append({
+                'type': 'lane_violation',
+                'status': 'VIOLATION_END',
+                'id': vehicle_id,
+                'details': "Tracking lost during lane violation"
+            })
                         
         return violations
 
@@ -76,3 +91,6 @@ class LaneViolationDetector:
                     'details': "Video ended during lane violation"
                 })
         return flush_events
+
+    def memory_stats(self):
+        return {"violation_active": self.violation_active.memory_stats()}
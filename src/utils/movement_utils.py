@@ -1,11 +1,16 @@
 import numpy as np
 
 class MovementDetector:
-    def __init__(self, expected_flow_direction=None):
+    def __init__(self, expected_flow_direction=None, min_history=15, wrong_way_dot=-0.75, consistency_dot=0.8):
         """
         expected_flow_direction: normalized vector (dx, dy) e.g., (0, 1) for downward flow
+        wrong_way_dot: alignment with the flow below which a track moves against it
+        consistency_dot: min alignment of the recent half of the path with the whole path
         """
         self.expected_flow_direction = expected_flow_direction
+        self.min_history = min_history
+        self.wrong_way_dot = wrong_way_dot
+        self.consistency_dot = consistency_dot
         self.history = {} # {id: [centroids]}
         self.active_violations = set() # {vehicle_id}
 
@@ -39,8 +44,8 @@ class MovementDetector:
             if len(self.history[vid]) > 30:
                 self.history[vid].pop(0)
 
-            # Need at least 15 frames for robust direction (ABD-02)
-            if len(self.history[vid]) >= 15:
+            # Need at least min_history (15) frames for robust direction (ABD-02)
+            if len(self.history[vid]) >= self.min_history:
                 # Calculate movement across windows
                 start = self.history[vid][0]
                 mid = self.history[vid][len(self.history[vid])//2]
@@ -65,7 +70,7 @@ class MovementDetector:
                     # Consistent direction check (move vs recent move)
                     consistency = unit_move[0]*unit_recent[0] + unit_move[1]*unit_recent[1]
                           
-                    if dot < -0.75 and consistency > 0.8: # Stricter flow check + path consistency
+                    if dot < self.wrong_way_dot and consistency > self.consistency_dot: # Flow check + path consistency
                         current_possible_violations.add(vid)
                         
                         if vid not in self.active_violations:
@@ -82,7 +87,7 @@ class MovementDetector:
         # A violation ends if the vehicle is no longer in current_possible_violations 
         # but was in active_violations.
         ended = self.active_violations - current_possible_violations
-        for vid in list(ended):
+        for vid in sorted(ended): # Deterministic event order
             # Only remove if they are also gone from tracking or changed direction
             # If still tracked but dot > -0.7, violation ended.
             anomalies.append({
@@ -99,3 +104,6 @@ class MovementDetector:
             del self.history[vid]
 
         return anomalies
+
+    def memory_stats(self):
+        return {"history": len(self.history), "active_violations": len(self.active_violations)}
@@ -52,7 +52,7 @@ class PedestrianDetector:
         
         # Check for ended violations
         ended = self.active_violations - current_violations
-        for vid in list(ended):
+        for vid in sorted(ended): # Deterministic event order
             anomalies.append({
                 'type': 'jaywalking',
                 'status': 'VIOLATION_END',
@@ -62,3 +62,6 @@ class PedestrianDetector:
             self.active_violations.remove(vid)
         
         return anomalies
+
+    def memory_stats(self):
+        return {"active_violations": len(self.active_violations)}
@@ -1,79 +1,214 @@
-import math
+import cv2
+import numpy as np
 
 class SpeedEstimator:
-    def __init__(self, fps=30, ppm=25, reference_width=1280): # FIXED: ppm increased from 10 to 25
+    """
+    Vectorized per-track speed estimation.
+    Every track owns a slot in fixed-size NumPy ring buffers of ground-plane
+    positions (meters) and times; each frame all tracks are updated and their
+    speeds fitted in one pass. Speed is the slope of a least-squares line over
+    the last `window` positions, which is far less jittery than a single-frame
+    displacement and keeps CollisionDetector._is_velocity_drop meaningful.
+
+    Pixel -> ground mapping: with a per-camera homography (pixel -> meters) a
+    lookup table is precomputed once per resolution and sampled bilinearly;
+    without one, the legacy global `ppm` (scaled by frame width) is used.
+    """
+    def __init__(self, fps=30, ppm=25, reference_width=1280, lost_ttl_frames=30, window=8,
+                 history_length=10, homography=None, lut_step=4, min_speed_kmh=3.0, max_speed_kmh=150.0):
         self.fps = fps
-        self.ppm = ppm
+        self.ppm = ppm # FIXED: ppm increased from 10 to 25
         self.reference_width = reference_width
-        self.previous_positions = {} # {id: last_pos}
-        self.speeds = {} # {id: current_speed}
-        self.speed_history = {} # {id: [speed_history]}
+        self.lost_ttl_frames = lost_ttl_frames
+        self.window = window
+        self.history_length = history_length
+        self.lut_step = lut_step
+        self.min_speed_kmh = min_speed_kmh # Below this: tracking jitter on a stationary object
+        self.max_speed_kmh = max_speed_kmh # CRITICAL FIX: Cap ridiculous speeds (prevent 300+ km/h readings)
+        self.frame_count = 0
 
-    def estimate_speed(self, results):
-        h, w = results.orig_shape
-        # Scale ppm based on resolution relative to reference_width
-        scale_factor = w / self.reference_width
-        actual_ppm = self.ppm * scale_factor
-        
+        self.homography = None
+        self._lut = None # (lut_x, lut_y, shape) ground meters on a lut_step pixel grid
+        if homography is not None:
+            self.set_homography(homography)
+
+        self._slots = {} # {vehicle_id: slot}
+        self._free = []
+        self._allocate(64)
+
+    # --- Calibration ---
+
+    def set_homography(self, homography):
+        """3x3 pixel -> ground-plane (meters) homography for this camera"""
+        self.homography = np.asarray(homography, dtype=np.float64).reshape(3, 3)
+        self._lut = None # Rebuilt for the next frame's resolution
+
+    def calibrate(self, pixel_points, ground_points_m):
+        """Fit the homography from >= 4 pixel <-> ground (meters) point correspondences"""
+        homography, _ = cv2.findHomography(np.asarray(pixel_points, dtype=np.float64),
+                                           np.asarray(ground_points_m, dtype=np.float64))
+        self.set_homography(homography)
+
+    def _build_lut(self, h, w):
+        step = self.lut_step
+        xs = np.arange(0, w + step, step, dtype=np.float64)
+        ys = np.arange(0, h + step, step, dtype=np.float64)
+        gx, gy = np.meshgrid(xs, ys)
+        pts = np.stack([gx, gy, np.ones_like(gx)], axis=-1) @ self.homography.T
+        self._lut = (pts[..., 0] / pts[..., 2], pts[..., 1] / pts[..., 2], (h, w))
+
+    def to_ground(self, px, h, w):
+        """(n, 2) pixel coordinates -> (n, 2) ground coordinates in meters"""
+        if self.homography is None:
+            # Scale ppm based on resolution relative to reference_width
+            return px / (self.ppm * (w / self.reference_width))
+        if self._lut is None or self._lut[2] != (h, w):
+            self._build_lut(h, w)
+        lut_x, lut_y, _ = self._lut
+        g = px / self.lut_step
+        gx = np.clip(g[:, 0], 0, lut_x.shape[1] - 1.001)
+        gy = np.clip(g[:, 1], 0, lut_x.shape[0] - 1.001)
+        x0, y0 = gx.astype(np.int64), gy.astype(np.int64)
+        fx, fy = gx - x0, gy - y0
+
+        def sample(lut):
+            return ((lut[y0, x0] * (1 - fx) + lut[y0, x0 + 1] * fx) * (1 - fy) +
+                    (lut[y0 + 1, x0] * (1 - fx) + lut[y0 + 1, x0 + 1] * fx) * fy)
+        return np.stack([sample(lut_x), sample(lut_y)], axis=1)
+
+    # --- Slot storage ---
+
+    def _allocate(self, capacity):
+        old = getattr(self, '_pos', None)
+        old_capacity = 0 if old is None else len(old)
+        new = {
+            '_pos': np.zeros((capacity, self.window, 2)),
+            '_time': np.zeros((capacity, self.window)),
+            '_count': np.zeros(capacity, dtype=np.int64),
+            '_head': np.zeros(capacity, dtype=np.int64),
+            '_last_seen': np.zeros(capacity, dtype=np.int64),
+            '_speed': np.zeros(capacity),
+            '_velocity': np.zeros((capacity, 2)), # m/s on the ground plane, 0 below min_speed_kmh
+            '_hist': np.zeros((capacity, self.history_length)),
+            '_hist_count': np.zeros(capacity, dtype=np.int64),
+            '_used': np.zeros(capacity, dtype=bool),
+            '_slot_ids': np.empty(capacity, dtype=object)
+        }
+        for name, arr in new.items():
+            if old is not None:
+                arr[:old_capacity] = getattr(self, name)
+            setattr(self, name, arr)
+        self._free.extend(range(capacity - 1, old_capacity - 1, -1))
+
+    def _slot_for(self, vehicle_id):
+        slot = self._slots.get(vehicle_id)
+        if slot is None:
+            if not self._free:
+                self._allocate(len(self._pos) * 2)
+            slot = self._free.pop()
+            self._slots[vehicle_id] = slot
+            self._slot_ids[slot] = vehicle_id
+            self._used[slot] = True
+            self._count[slot] = 0
+            self._head[slot] = 0
+            self._hist_count[slot] = 0
+            self._speed[slot] = 0.0
+            self._velocity[slot] = 0.0
+        return slot
+
+    def _evict(self):
+        # Tracks lost for longer than lost_ttl_frames give their slot back
+        lost = np.nonzero(self._used & (self._last_seen < self.frame_count - self.lost_ttl_frames))[0]
+        for slot in lost.tolist():
+            del self._slots[self._slot_ids[slot]]
+            self._slot_ids[slot] = None
+            self._used[slot] = False
+            self._free.append(slot)
+
+    # --- Estimation ---
+
+    def estimate_speed(self, results, timestamp=None):
+        """
+        Update all tracks of this frame; returns [{'id', 'speed'}] (km/h) for tracks
+        with at least two observations. `timestamp` (seconds) defaults to frame_count / fps.
+        """
+        self.frame_count += 1
         track_ids = results.boxes.id.int().cpu().tolist() if results.boxes.id is not None else None
-        current_speeds = []
-        
         if track_ids is None:
             return []
 
-        for i, (box, cls) in enumerate(zip(results.boxes.xyxy, results.boxes.cls)):
-            vehicle_id = f"id_{track_ids[i]}"
-            center = ((box[0] + box[2])/2, (box[1] + box[3])/2)
-            
-            if vehicle_id in self.previous_positions:
-                prev_pos = self.previous_positions[vehicle_id]
-                # Distance in pixels
-                dist_px = math.sqrt((center[0] - prev_pos[0])**2 + (center[1] - prev_pos[1])**2)
-                
-                # CRITICAL FIX: Ignore tiny movements (tracking jitter on stationary objects)
-                if dist_px < 10:  # Less than 10 pixels = stationary
-                    self.speeds[vehicle_id] = 0
-                    current_speeds.append({'id': vehicle_id, 'speed': 0})
-                    continue
-                
-                # Distance in meters
-                dist_m = dist_px / actual_ppm
-                
-                # Speed in m/s
-                speed_mps = dist_m * self.fps
-                
-                # Speed in km/h
-                speed_kmh = speed_mps * 3.6
-                
-                # CRITICAL FIX: Cap ridiculous speeds (prevent 300+ km/h readings)
-                speed_kmh = min(speed_kmh, 150)  # Max 150 km/h is reasonable for city traffic
-                
-                self.speeds[vehicle_id] = speed_kmh
-                
-                # Maintain history (max 10 frames)
-                if vehicle_id not in self.speed_history:
-                    self.speed_history[vehicle_id] = []
-                self.speed_history[vehicle_id].append(speed_kmh)
-                if len(self.speed_history[vehicle_id]) > 10:
-                    self.speed_history[vehicle_id].pop(0)
-
-                current_speeds.append({
-                    'id': vehicle_id,
-                    'speed': speed_kmh
-                })
-            
-            self.previous_positions[vehicle_id] = center
-            
-        # Cleanup history for lost tracks
-        h_ids = list(self.speed_history.keys())
-        for vid in h_ids:
-            if vid not in [f"id_{tid}" for tid in track_ids]:
-                del self.speed_history[vid]
-
-        return current_speeds
+        h, w = results.orig_shape
+        now = timestamp if timestamp is not None else self.frame_count / self.fps
+        boxes = results.boxes.xyxy.cpu().numpy().astype(np.float64).reshape(-1, 4)
+        vehicle_ids = [f"id_{tid}" for tid in track_ids]
+        slots = np.fromiter((self._slot_for(vid) for vid in vehicle_ids), dtype=np.int64, count=len(vehicle_ids))
+
+        # Ground contact point (bottom center) on the road plane
+        contact = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1)
+        ground = self.to_ground(contact, h, w)
+
+        # Ring-buffer write for every track at once
+        heads = self._head[slots]
+        self._pos[slots, heads] = ground
+        self._time[slots, heads] = now
+        self._head[slots] = (heads + 1) % self.window
+        self._count[slots] = np.minimum(self._count[slots] + 1, self.window)
+        self._last_seen[slots] = self.frame_count
+
+        # Windowed least squares: velocity = cov(t, p) / var(t) over the valid samples
+        counts = self._count[slots]
+        valid = np.arange(self.window)[None, :] < counts[:, None]
+        t = self._time[slots]
+        p = self._pos[slots]
+        n = np.maximum(counts, 1)[:, None]
+        t_mean = np.where(valid, t, 0).sum(axis=1, keepdims=True) / n
+        dt = np.where(valid, t - t_mean, 0)
+        p_mean = np.where(valid[..., None], p, 0).sum(axis=1, keepdims=True) / n[..., None]
+        var_t = (dt ** 2).sum(axis=1)
+        cov = (dt[..., None] * (p - p_mean)).sum(axis=1)
+        measured = (counts >= 2) & (var_t > 0)
+        velocity = cov / np.where(measured, var_t, 1)[:, None]
+        speed_kmh = np.minimum(np.hypot(velocity[:, 0], velocity[:, 1]) * 3.6, self.max_speed_kmh)
+        speed_kmh[speed_kmh < self.min_speed_kmh] = 0.0
+
+        # Speed history ring (oldest -> newest kept by rolling the write index)
+        m_slots = slots[measured]
+        m_speed = speed_kmh[measured]
+        self._speed[m_slots] = m_speed
+        self._velocity[m_slots] = np.where((m_speed > 0)[:, None], velocity[measured], 0.0)
+        self._hist[m_slots, self._hist_count[m_slots] % self.history_length] = m_speed
+        self._hist_count[m_slots] += 1
+
+        self._evict()
+        return [{'id': vid, 'speed': float(s)} for vid, s, ok in zip(vehicle_ids, speed_kmh, measured) if ok]
 
     def get_speed_history(self, vehicle_id):
-        return self.speed_history.get(vehicle_id, [])
+        slot = self._slots.get(vehicle_id)
+        if slot is None:
+            return []
+        n = int(self._hist_count[slot])
+        if n <= self.history_length:
+            return self._hist[slot, :n].tolist()
+        start = n % self.history_length
+        hist = self._hist[slot].tolist()
+        return hist[start:] + hist[:start]
+
+    def get_kinematics(self, vehicle_ids):
+        """
+        Last ground position (m) and velocity (m/s) of each vehicle id as (n, 2) arrays,
+        plus a mask of the ids that have a measured velocity.
+        """
+        slots = np.array([self._slots.get(vid, -1) for vid in vehicle_ids], dtype=np.int64)
+        known = slots >= 0
+        s = np.where(known, slots, 0)
+        positions = self._pos[s, (self._head[s] - 1) % self.window]
+        measured = known & (self._count[s] >= 2)
+        velocities = np.where(measured[:, None], self._velocity[s], 0.0)
+        return positions, velocities, measured
 
     def get_vehicle_speed(self, vehicle_id):
-        return self.speeds.get(vehicle_id, 0)
+        slot = self._slots.get(vehicle_id)
+        return float(self._speed[slot]) if slot is not None else 0
+
+    def memory_stats(self):
+        return {"tracks": {"entries": len(self._slots), "capacity": len(self._pos)}}
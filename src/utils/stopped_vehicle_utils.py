@@ -1,17 +1,23 @@
 import math
+import numpy as np
+
+from src.utils.track_state import TrackStateCache
 
 class StoppedVehicleDetector:
-    def __init__(self, fps=30, time_threshold=60, lane_roi=None):
-        self.vehicle_positions = {}
+    def __init__(self, fps=30, time_threshold=60, lane_roi=None, lost_ttl_frames=15):
+        # Per-track state survives short detection dropouts, then is evicted (ending its violations)
+        self.vehicle_positions = TrackStateCache(lost_ttl_frames)
         self.frame_count = 0
         self.fps = fps
-        self.time_threshold = time_threshold
-        self.frame_threshold = self.fps * self.time_threshold 
+        self.time_threshold = time_threshold # Seconds stopped before a stall is flagged
+        self.jam_seconds = 30.0 # Stop duration behind jam / potential accident alerts
         self.lane_roi = lane_roi
         self.stalled_ids = set() # {vid} for ABD-03 specific tracking
 
-    def detect_stopped_vehicle(self, frame, results):
+    def detect_stopped_vehicle(self, frame, results, now=None):
+        # now: frame time in seconds (default frame_count / fps); stop durations are elapsed time
         self.frame_count += 1
+        now = now if now is not None else self.frame_count / self.fps
         current_vehicles = []
         vehicle_classes = [2, 3, 5, 7]
         h, w = results.orig_shape
@@ -19,12 +25,10 @@ class StoppedVehicleDetector:
         track_ids = results.boxes.id.int().cpu().tolist() if results.boxes.id is not None else None
         
         moving_count = 0
-        all_detected_ids = set()
 
         for i, (box, cls) in enumerate(zip(results.boxes.xyxy, results.boxes.cls)):
             if int(cls) in vehicle_classes:
                 vid = f"id_{track_ids[i]}" if track_ids is not None else f"veh_{i}"
-                all_detected_ids.add(vid)
                 center = ((box[0] + box[2])/2, (box[1] + box[3])/2)
                 
                 current_vehicles.append({
@@ -35,47 +39,61 @@ class StoppedVehicleDetector:
         
         stopped_vehicles_data = [] # Data for internal state update
         current_stopped_ids = set()
+        crossed_jam = set() # Stopped vehicles that reached jam_seconds on this frame
+        resumed = [] # END events of stalled vehicles that drove off
         
         for vehicle in current_vehicles:
             vid = vehicle['id']
             current_pos = vehicle['center']
             
             if vid in self.vehicle_positions:
-                prev_pos = self.vehicle_positions[vid]['last_pos']
+                state = self.vehicle_positions[vid]
+                prev_pos = state['last_pos']
                 movement = math.sqrt((current_pos[0] - prev_pos[0])**2 + (current_pos[1] - prev_pos[1])**2)
                 dynamic_threshold = w * 0.005 
                 
                 if movement < dynamic_threshold:
-                    self.vehicle_positions[vid]['stopped_frames'] += 1
+                    if state['stopped_since'] is None:
+                        state['stopped_since'] = state['last_time'] # Standing still since the previous sighting
+                    previous = state['stopped_seconds']
+                    state['stopped_seconds'] = now - state['stopped_since']
+                    if previous < self.jam_seconds <= state['stopped_seconds']:
+                        crossed_jam.add(vid)
                     current_stopped_ids.add(vid)
                 else:
                     moving_count += 1
                     if self.vehicle_positions[vid].get('violation_active', False):
                         # Reset if it was an active individual violation
                         self.vehicle_positions[vid]['violation_active'] = False
-                    self.vehicle_positions[vid]['stopped_frames'] = 0
+                    if vid in self.stalled_ids:
+                        self.stalled_ids.remove(vid)
+                        resumed.append({
+                            'type': 'stalled_vehicle',
+                            'status': 'VIOLATION_END',
+                            'id': vid,
+                            'bbox': vehicle['bbox'],
+                            'details': "Stalled vehicle resumed motion"
+                        })
+                    state['stopped_since'], state['stopped_seconds'] = None, 0.0
                 
-                self.vehicle_positions[vid]['last_pos'] = current_pos
-                self.vehicle_positions[vid]['last_bbox'] = vehicle['bbox']
+                state['last_pos'] = current_pos
+                state['last_bbox'] = vehicle['bbox']
+                state['last_time'] = now
+                self.vehicle_positions.touch(vid, self.frame_count)
             else:
-                self.vehicle_positions[vid] = {'last_pos': current_pos, 'last_bbox': vehicle['bbox'], 'stopped_frames': 0}
+                self.vehicle_positions.set(vid, {'last_pos': current_pos, 'last_bbox': vehicle['bbox'], 'last_time': now,
+                                                 'stopped_since': None, 'stopped_seconds': 0.0}, self.frame_count)
 
         # --- ANOMALY LOGIC ---
-        anomalies = []
+        anomalies = resumed
         
         # 0. Stationary count for other modules (InteractionDetector)
         current_stationary_ids = current_stopped_ids
 
         # 1. Traffic Jam Detection (Multi-vehicle stop)
         if len(current_stopped_ids) >= 4: # Threshold for a jam
-            # Check if these stopped vehicles are "new" in their stopped state
-            newly_jammed = False
-            for vid in current_stopped_ids:
-                if self.vehicle_positions[vid]['stopped_frames'] == (self.fps * 30): # Log jam after 30s
-                    newly_jammed = True
-                    break
-            
-            if newly_jammed:
+            # Log the jam when one of the stopped vehicles reaches 30 s stopped
+            if crossed_jam:
                 anomalies.append({
                     'type': 'traffic_jam',
                     'status': 'VIOLATION_START',
@@ -86,8 +104,8 @@ class StoppedVehicleDetector:
 
         # 2. Accident / Breakdown Detection (Isolated stop in moving traffic)
         if moving_count > 2: 
-            for vid in current_stopped_ids:
-                if self.vehicle_positions[vid]['stopped_frames'] > (self.fps * 30):
+            for vid in sorted(current_stopped_ids): # Deterministic event order
+                if self.vehicle_positions[vid]['stopped_seconds'] > self.jam_seconds:
                     if not self.vehicle_positions[vid].get('violation_active', False):
                         self.vehicle_positions[vid]['violation_active'] = True
                         anomalies.append({
@@ -99,8 +117,8 @@ class StoppedVehicleDetector:
                         })
 
         # 3. ABD-03: Stalled Vehicle (Rule-based: 45s + Lane Intersection)
-        for vid in current_stopped_ids:
-            if self.vehicle_positions[vid]['stopped_frames'] >= self.frame_threshold:
+        for vid in sorted(current_stopped_ids):
+            if self.vehicle_positions[vid]['stopped_seconds'] >= self.time_threshold:
                 if vid not in self.stalled_ids:
                     # Check ROI intersection
                     in_lane = True
@@ -121,15 +139,14 @@ class StoppedVehicleDetector:
                             'details': f"Vehicle stalled in active lane for > {self.time_threshold} seconds"
                         })
 
-        # Cleanup old vehicles
-        to_delete = [vid for vid in self.vehicle_positions if vid not in all_detected_ids]
-        for vid in to_delete:
-            if self.vehicle_positions[vid].get('violation_active', False):
+        # Cleanup vehicles whose track has been lost for longer than the TTL
+        for vid, data in self.vehicle_positions.evict(self.frame_count):
+            if data.get('violation_active', False):
                 anomalies.append({
                     'type': 'potential_accident',
                     'status': 'VIOLATION_END',
                     'id': vid,
-                    'bbox': self.vehicle_positions[vid].get('last_bbox'),
+                    'bbox': data.get('last_bbox'),
                     'details': "Resumed motion or track lost"
                 })
             if vid in self.stalled_ids:
@@ -138,10 +155,9 @@ class StoppedVehicleDetector:
                     'type': 'stalled_vehicle',
                     'status': 'VIOLATION_END',
                     'id': vid,
-                    'bbox': self.vehicle_positions[vid].get('last_bbox'),
+                    'bbox': data.get('last_bbox'),
                     'details': "Stalled vehicle cleared"
                 })
-            del self.vehicle_positions[vid]
 
         return anomalies, current_stationary_ids
 
@@ -157,7 +173,10 @@ class StoppedVehicleDetector:
                     'id': vid,
                     'bbox': data.get('last_bbox'), # Need to store last bbox
                     'confidence': 'HIGH',
-                    'stopped_frames': data['stopped_frames'],
+                    'stopped_seconds': round(data['stopped_seconds'], 1),
                     'details': "Video ended while vehicle was still stopped"
                 })
         return flush_events
+
+    def memory_stats(self):
+        return {"vehicle_positions": self.vehicle_positions.memory_stats(), "stalled_ids": len(self.stalled_ids)}
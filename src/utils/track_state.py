@@ -0,0 +1,74 @@
+from collections import OrderedDict
+
+class TrackStateCache:
+    """
+    Per-track / per-event state with one eviction policy for every module.
+    An entry expires `ttl` ticks after it was last touched (ticks are frames for
+    per-track state, seconds for wall-clock caches), i.e. once its track has
+    been lost for longer than `ttl`. `max_entries` is an LRU safety net on top.
+    Entries are kept in last-touch order, so eviction only ever pops from the
+    front: O(1) amortized per update, regardless of how many ids were seen.
+    """
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict() # {key: (last_seen, value)}
+        self.evicted = 0
+
+    def set(self, key, value, now):
+        self._data[key] = (now, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evicted += 1
+
+    def touch(self, key, now):
+        """Mark an existing entry as seen without changing its value"""
+        if key in self._data:
+            self._data[key] = (now, self._data[key][1])
+            self._data.move_to_end(key)
+
+    def __getitem__(self, key):
+        return self._data[key][1]
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        return entry[1] if entry is not None else default
+
+    def last_seen(self, key):
+        entry = self._data.get(key)
+        return entry[0] if entry is not None else None
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return entry[1] if entry is not None else default
+
+    def evict(self, now):
+        """Drop entries not touched for more than `ttl` ticks; returns the evicted (key, value) pairs"""
+        expired = []
+        while self._data:
+            key, (last_seen, value) = next(iter(self._data.items()))
+            if now - last_seen <= self.ttl:
+                break
+            self._data.popitem(last=False)
+            expired.append((key, value))
+        self.evicted += len(expired)
+        return expired
+
+    def clear(self):
+        self._data.clear()
+
+    def keys(self):
+        return self._data.keys()
+
+    def items(self):
+        return ((k, v) for k, (_, v) in self._data.items())
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def memory_stats(self):
+        return {"entries": len(self._data), "evicted": self.evicted, "max_entries": self.max_entries}
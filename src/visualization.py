@@ -2,16 +2,16 @@ import cv2
 from datetime import datetime
 import os
 
-def capture_violation_evidence(frame, violation_type, bbox, vehicle_id="unknown", output_dir="data/evidence"):
+def capture_violation_evidence(frame, violation_type, bbox, vehicle_id="unknown", output_dir=None, timestamp=None):
     """
     Safely capture violation evidence. 
     Wrap in try-except to never crash the detection loop.
+    Returns the JPEG bytes for the evidence store; a loose file is only written
+    when output_dir is given (legacy exports).
     """
     try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Ensure output directory exists
-        os.makedirs(output_dir, exist_ok=True)
+        # Async capture passes the trigger time so the stamp is not the encode time
+        timestamp = timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         # Scale visualization parameters based on resolution
         h, w = frame.shape[:2]
@@ -45,9 +45,12 @@ def capture_violation_evidence(frame, violation_type, bbox, vehicle_id="unknown"
         ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
         image_bytes = buffer.tobytes() if ret else None
         
-        # Legacy save (Re-enabled for notebook visualization)
-        filename = f"evidence_{violation_type}_{vehicle_id}_{timestamp.replace(':', '-')}.jpg"
-        cv2.imwrite(os.path.join(output_dir, filename), frame)
+        # Legacy loose-file export (the evidence store is the system of record)
+        if output_dir is not None and image_bytes is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            filename = f"evidence_{violation_type}_{vehicle_id}_{timestamp.replace(':', '-')}.jpg"
+            with open(os.path.join(output_dir, filename), 'wb') as f:
+                f.write(image_bytes)
         
         return frame, timestamp, image_bytes
     except Exception as outer_e:
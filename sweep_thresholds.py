@@ -0,0 +1,219 @@
+"""
+THRESHOLD SWEEP - Run the head stack over a grid of parameter values
+Every configuration replays the same detection recording (see
+replay_detections.py), memory-mapped once per worker process, so a grid costs
+head time only - no video decoding or YOLO. Reports per-config event counts,
+timings and a diff against a labeled reference (NDJSON of START events:
+{"frame", "type", "id"} or the output of `replay_detections.py run --events`);
+without --reference the default configuration is the reference.
+
+Usage:
+    python sweep_thresholds.py data/recordings/clip \\
+        --param collision.iou_threshold=0.1,0.15,0.2 \\
+        --param stopped.time_threshold=30,45,60 \\
+        --param interaction.persistence_seconds=1.0,1.5,2.0 \\
+        [--grid grid.json] [--reference labels.ndjson] [--workers 4] [--heads swept] [--out sweep_report.json]
+
+Parameter groups: flow, collision, conflict, stopped, lane, pedestrian, movement,
+interaction (constructor arguments of the matching detector). Values are JSON
+(e.g. movement.expected_flow_direction uses a grid file: {"movement.expected_flow_direction": [[0, 1]]}).
+--heads swept replays only the heads the swept groups configure (several times
+faster than the full stack); the diff then covers only their event types, so a
+labeled reference should hold only those.
+"""
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.core.recording import DetectionRecording
+from src.core.replay import HEAD_PARAMS, HEADS, ReplayEngine, check_head_params, default_heads, heads_for
+
+_recording = None # Per worker process, memory-mapped
+_reference = None
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def build_grid(params, grid_path=None):
+    """{'group.name': [values]} from --param KEY=V1,V2 and a JSON grid file -> list of nested configs"""
+    axes = {}
+    if grid_path:
+        with open(grid_path) as f:
+            axes.update(json.load(f))
+    for item in params or []:
+        key, _, values = item.partition('=')
+        axes[key] = [parse_value(v) for v in values.split(',')]
+    for key in axes:
+        group, _, name = key.partition('.')
+        if group not in HEAD_PARAMS or not name:
+            raise SystemExit(f"Bad parameter '{key}': expected <group>.<argument>, group one of {sorted(HEAD_PARAMS)}")
+    # Names the constructors would reject (or a typo) fail here, before the pool starts
+    names = defaultdict(dict)
+    for key in axes:
+        group, _, name = key.partition('.')
+        names[group][name] = None
+    try:
+        check_head_params(names)
+    except ValueError as e:
+        raise SystemExit(f"Bad parameter: {e}")
+
+    configs = []
+    for combo in itertools.product(*axes.values()):
+        config = defaultdict(dict)
+        for key, value in zip(axes, combo):
+            group, _, name = key.partition('.')
+            config[group][name] = value
+        configs.append(({key: value for key, value in zip(axes, combo)}, dict(config)))
+    return configs
+
+def start_events(events):
+    """{(type, id): [frames]} of the START events in replay output or labels"""
+    out = defaultdict(list)
+    for event in events:
+        data = event.get('data', event)
+        if data.get('status', 'VIOLATION_START') not in ('VIOLATION_START', 'START'):
+            continue
+        out[(event['type'], str(data.get('id', event.get('id'))))].append(int(event['frame']))
+    return {key: sorted(frames) for key, frames in out.items()}
+
+def diff_events(reference, events, tolerance):
+    """Greedy in-order match of START events with the same type/id within `tolerance` frames"""
+    found = start_events(events)
+    matched = missed = 0
+    offsets = []
+    per_type = defaultdict(lambda: {"matched": 0, "missed": 0, "extra": 0})
+    for key in set(reference) | set(found):
+        ref, got = reference.get(key, []), found.get(key, [])
+        i = j = hits = 0
+        while i < len(ref) and j < len(got):
+            if abs(ref[i] - got[j]) <= tolerance:
+                offsets.append(got[j] - ref[i])
+                hits += 1
+                i += 1
+                j += 1
+            elif got[j] < ref[i]:
+                j += 1
+            else:
+                i += 1
+        per_type[key[0]]["matched"] += hits
+        per_type[key[0]]["missed"] += len(ref) - hits
+        per_type[key[0]]["extra"] += len(got) - hits
+        matched += hits
+        missed += len(ref) - hits
+    extra = sum(len(v) for v in found.values()) - matched
+    precision = matched / (matched + extra) if matched + extra else 1.0
+    recall = matched / (matched + missed) if matched + missed else 1.0
+    return {
+        "matched": matched, "missed": missed, "extra": extra,
+        "precision": round(precision, 4), "recall": round(recall, 4),
+        "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+        "mean_frame_offset": round(sum(offsets) / len(offsets), 2) if offsets else None,
+        "by_type": dict(per_type)
+    }
+
+def _init_worker(recording_path, reference):
+    global _recording, _reference
+    _recording = DetectionRecording(recording_path) # mmap: pages shared with the other workers
+    _reference = reference
+
+def summarize(index, result, reference, tolerance):
+    summary = {key: result[key] for key in ("frames", "seconds", "fps", "event_counts", "head_errors", "digest")}
+    summary["index"] = index
+    summary["diff"] = diff_events(reference, result['events'], tolerance)
+    return summary
+
+def _run_config(index, config, tolerance, heads):
+    result = ReplayEngine(_recording, partial(default_heads, config, heads)).run()
+    return summarize(index, result, _reference, tolerance)
+
+def main():
+    parser = argparse.ArgumentParser(description="PEGASUS head threshold sweep")
+    parser.add_argument('recording', help='Recording directory (replay_detections.py record)')
+    parser.add_argument('--param', action='append', help='group.argument=v1,v2,... (repeatable)')
+    parser.add_argument('--grid', default=None, help='JSON file {"group.argument": [values]}')
+    parser.add_argument('--reference', default=None, help='Labeled START events (NDJSON)')
+    parser.add_argument('--tolerance', type=int, default=30, help='Frame tolerance when matching events')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument('--heads', default='all',
+                        help=f"all, swept (heads of the swept groups) or a comma-separated subset of {','.join(HEADS)}")
+    parser.add_argument('--out', default='sweep_report.json', help='Report file')
+    args = parser.parse_args()
+
+    configs = [({}, {})] + build_grid(args.param, args.grid) # Index 0: defaults
+    swept = heads_for({group for _, config in configs for group in config})
+    if args.heads == 'all':
+        heads = None
+    elif args.heads == 'swept':
+        heads = swept
+    else:
+        heads = tuple(args.heads.split(','))
+        if set(heads) - set(HEADS) or set(swept) - set(heads):
+            parser.error(f"--heads must be some of {','.join(HEADS)} and include the swept heads ({','.join(swept)})")
+    reference = None
+    if args.reference:
+        with open(args.reference) as f:
+            reference = start_events(json.loads(line) for line in f if line.strip())
+
+    recording = DetectionRecording(args.recording)
+    print("=" * 70)
+    print(f"THRESHOLD SWEEP: {len(configs) - 1} configs (+ defaults) x {len(recording)} frames, "
+          f"{args.workers} workers, heads: {', '.join(heads or HEADS)}")
+    print("=" * 70)
+
+    t0 = time.time()
+    results = [None] * len(configs)
+    if reference is None:
+        # Defaults first: they are the reference for everything else
+        result = ReplayEngine(recording, partial(default_heads, None, heads)).run()
+        reference = start_events(result['events'])
+        results[0] = summarize(0, result, reference, args.tolerance)
+    pending = [i for i in range(len(configs)) if results[i] is None]
+
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(args.recording, reference)) as pool:
+        futures = [pool.submit(_run_config, i, configs[i][1], args.tolerance, heads) for i in pending]
+        for done, future in enumerate(as_completed(futures), 1):
+            summary = future.result()
+            results[summary["index"]] = summary
+            print(f"  {done}/{len(futures)} configs done", end='\r')
+    wall = time.time() - t0
+
+    print(f"\n{'#':>3}  {'params':<48} {'events':>7} {'P':>6} {'R':>6} {'F1':>6} {'fps':>7}")
+    for (flat, config), summary in zip(configs, results):
+        summary["params"] = config
+        label = ", ".join(f"{k.partition('.')[2]}={v}" for k, v in flat.items()) or "(defaults)"
+        diff = summary["diff"]
+        events = sum(n for k, n in summary["event_counts"].items() if k.endswith("VIOLATION_START"))
+        print(f"{summary['index']:>3}  {label[:48]:<48} {events:>7} {diff['precision']:>6.3f} "
+              f"{diff['recall']:>6.3f} {diff['f1']:>6.3f} {summary['fps']:>7.0f}")
+
+    best = max(results[1:] or results, key=lambda r: (r["diff"]["f1"], -r["index"]))
+    replay_seconds = sum(r["seconds"] for r in results)
+    tied = [r["index"] for r in results if r is not best and r["digest"] == best["digest"]]
+    print(f"\nBest F1: #{best['index']} {best['params']} ({best['diff']['f1']:.3f})"
+          + (f" - same events as #{', #'.join(map(str, tied))}" if tied else ""))
+    print(f"Wall time {wall:.1f}s for {replay_seconds:.1f}s of replay ({replay_seconds / max(wall, 1e-9):.1f}x)")
+    with open(args.out, 'w') as f:
+        json.dump({"recording": args.recording, "frames": len(recording), "tolerance": args.tolerance,
+                   "reference": args.reference or "defaults", "heads": list(heads or HEADS), "wall_seconds": wall,
+                   "results": results}, f, indent=2)
+    print(f"📝 Report saved: {args.out}")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -122,16 +122,13 @@ def test_detector(video_path="test_video.mp4", max_frames=300):
     else:
         print("✓ No errors during processing")
     
-    # Check evidence
-    evidence_dir = "data/evidence"
-    if os.path.exists(evidence_dir):
-        evidence_files = [f for f in os.listdir(evidence_dir) if f.endswith('.jpg')]
-        if len(evidence_files) > 0:
-            print(f"✓ Evidence capture working: {len(evidence_files)} snapshots saved")
-        else:
-            print("⚠ No evidence snapshots (may be normal if no violations)")
+    # Check evidence (flush pending DB batches first)
+    detector.save_queue.join()
+    evidence_count = len(detector.db.get_all_evidence())
+    if evidence_count > 0:
+        print(f"✓ Evidence capture working: {evidence_count} snapshots in evidence store")
     else:
-        print("⚠ Evidence directory not created")
+        print("⚠ No evidence snapshots (may be normal if no violations)")
     
     print("\n" + "=" * 60)
     print("TEST COMPLETE")
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app modules as `src.*`, like the scripts in the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.utils.database import EvidenceDB
+from src.utils.evidence_store import EvidenceStore
+
+@pytest.fixture
+def store(tmp_path):
+    store = EvidenceStore(root=str(tmp_path / "evidence_store"))
+    yield store
+    store.wait()
+
+@pytest.fixture
+def db(tmp_path, store):
+    db = EvidenceDB(db_path=str(tmp_path / "pegasus.db"), store=store)
+    yield db
+    db.close()
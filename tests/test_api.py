@@ -0,0 +1,21 @@
+# Imports the real app (model, database): needs the full backend environment
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("ultralytics")
+
+from fastapi.testclient import TestClient
+
+@pytest.fixture(scope="module")
+def client():
+    from backend.main import app
+    return TestClient(app)
+
+@pytest.mark.parametrize('path', ["/api/evidence", "/api/evidence/export", "/api/incidents",
+                                  "/api/incidents/export", "/api/analytics/events"])
+def test_unparseable_timestamp_is_a_422(client, path):
+    response = client.get(path, params={"since": "yesterday"})
+    assert response.status_code == 422
+    assert "yesterday" in response.json()['detail']
+    assert client.get(path, params={"until": "2024-13-01"}).status_code == 422
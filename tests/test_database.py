@@ -0,0 +1,57 @@
+import pytest
+
+from src.utils.database import normalize_timestamp
+
+def _fill(db, n):
+    db.insert_many([{'type': 'collision' if i % 3 == 0 else 'speeding', 'vehicle_id': f"id_{i}",
+                     'timestamp': f"2024-05-01 10:{i // 60:02d}:{i % 60:02d}", 'camera_id': 'cam_1'}
+                    for i in range(n)])
+
+def test_insert_many_is_one_batch(db):
+    assert db.insert_many([]) == 0
+    _fill(db, 25)
+    rows, _ = db.query_evidence(limit=100)
+    assert len(rows) == 25
+
+def test_keyset_pages_cover_every_row_once_newest_first(db):
+    _fill(db, 23)
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = db.query_evidence(limit=5, cursor=cursor)
+        seen.extend(r['id'] for r in rows)
+        pages += 1
+        if cursor is None:
+            break
+        assert cursor == rows[-1]['id']
+    assert pages == 5
+    assert seen == sorted(seen, reverse=True)
+    assert len(set(seen)) == 23
+
+def test_last_full_page_has_no_cursor(db):
+    _fill(db, 10)
+    rows, cursor = db.query_evidence(limit=10)
+    assert len(rows) == 10 and cursor is None
+
+def test_keyset_filters(db):
+    _fill(db, 30)
+    collisions = list(db.iter_evidence(chunk_size=4, violation_type='collision'))
+    assert len(collisions) == 10
+    assert {r['violation_type'] for r in collisions} == {'collision'}
+
+    window = list(db.iter_evidence(chunk_size=4, since='2024-05-01T10:00:10', until='2024-05-01 10:00:19'))
+    assert sorted(r['vehicle_id'] for r in window) == sorted(f"id_{i}" for i in range(10, 20))
+
+def test_normalize_timestamp_formats():
+    assert normalize_timestamp('2024-05-01') == '2024-05-01 00:00:00'
+    assert normalize_timestamp('2024-05-01 10:30') == '2024-05-01 10:30:00'
+    assert normalize_timestamp(' 2024-05-01T10:30:15.250 ') == '2024-05-01 10:30:15'
+
+@pytest.mark.parametrize('value', ['yesterday', '2024-13-01', '01/05/2024', ''])
+def test_normalize_timestamp_rejects_garbage(value):
+    with pytest.raises(ValueError):
+        normalize_timestamp(value)
+
+def test_bad_filter_raises_instead_of_comparing_strings(db):
+    _fill(db, 3)
+    with pytest.raises(ValueError):
+        db.query_evidence(since='last week')
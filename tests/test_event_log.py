@@ -0,0 +1,110 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.services import event_log as event_log_module
+from src.services.event_log import EventLog
+
+T0 = datetime(2024, 5, 1, 10, 0, 0)
+
+def _event(i, event_type='collision', status='START', minutes=None, camera_id='cam_1'):
+    ts = T0 + timedelta(minutes=i if minutes is None else minutes)
+    return {'event_id': f"ev_{i}", 'event_type': event_type, 'vehicle_id': f"id_{i}", 'camera_id': camera_id,
+            'frame_number': i, 'timestamp': ts.isoformat(), 'metadata': {'status': status}}
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Names of the segment files read by queries"""
+    read = []
+    real_load = event_log_module.np.load
+    def load(path, *args, **kwargs):
+        read.append(os.path.basename(path))
+        return real_load(path, *args, **kwargs)
+    monkeypatch.setattr(event_log_module.np, 'load', load)
+    return read
+
+def _append_each(log, events):
+    for event in events:
+        log.append(event)
+
+def test_tail_rolls_into_a_segment_and_a_fresh_wal(tmp_path):
+    log = EventLog(str(tmp_path), segment_size=5)
+    _append_each(log, [_event(i) for i in range(12)])
+    assert log.stats() == {"segments": 2, "segment_events": 10, "tail_events": 2}
+    assert sorted(os.listdir(tmp_path / "segments")) == ["seg_000000.npz", "seg_000001.npz"]
+    assert sorted(n for n in os.listdir(tmp_path) if n.startswith("wal_")) == ["wal_000002.ndjson"]
+    with open(tmp_path / "wal_000002.ndjson") as f:
+        assert [json.loads(line)['event_id'] for line in f] == ["ev_10", "ev_11"]
+
+    manifest = json.load(open(tmp_path / "manifest.json"))
+    first = manifest['segments'][0]
+    assert first['count'] == 5 and first['type_counts'] == {'collision': 5}
+    assert first['t_min'] == T0.timestamp() and first['t_max'] == (T0 + timedelta(minutes=4)).timestamp()
+    log.close()
+
+def test_reopen_recovers_the_tail(tmp_path):
+    log = EventLog(str(tmp_path), segment_size=5)
+    _append_each(log, [_event(i) for i in range(7)])
+    log.close()
+    with open(tmp_path / "wal_000001.ndjson", 'a') as f:
+        f.write('{"ts": 1.0, "fra') # Torn line from a crash
+
+    log = EventLog(str(tmp_path), segment_size=5)
+    assert log.stats() == {"segments": 1, "segment_events": 5, "tail_events": 2}
+    assert log.count_by_type() == {'collision': 7}
+    log.close()
+
+    reader = EventLog(str(tmp_path), readonly=True)
+    assert reader.count_by_type() == {'collision': 7}
+    with pytest.raises(ValueError):
+        reader.append(_event(99))
+
+def test_count_by_type_answers_whole_segments_from_the_manifest(tmp_path, loads):
+    log = EventLog(str(tmp_path), segment_size=4)
+    events = [_event(i, 'collision' if i % 2 else 'speeding', status='START' if i % 4 < 2 else 'END')
+              for i in range(12)]
+    _append_each(log, events)
+    assert log.stats()['tail_events'] == 0
+
+    assert log.count_by_type() == {'collision': 3, 'speeding': 3}
+    assert log.count_by_type(starts_only=False) == {'collision': 6, 'speeding': 6}
+    assert loads == []
+
+    # Minutes 2..5 overlap segments 0 and 1 only partially: both are read, segment 2 is skipped
+    counts = log.count_by_type(since=T0 + timedelta(minutes=2), until=T0 + timedelta(minutes=5), starts_only=False)
+    assert counts == {'collision': 2, 'speeding': 2}
+    assert sorted(loads) == ["seg_000000.npz", "seg_000001.npz"]
+
+    # Segment 1 lies inside the range: only the partial segments 0 and 2 are read
+    loads.clear()
+    counts = log.count_by_type(since=T0 + timedelta(minutes=3), until=T0 + timedelta(minutes=8))
+    assert counts == {'collision': 1, 'speeding': 2}
+    assert sorted(loads) == ["seg_000000.npz", "seg_000002.npz"]
+
+def test_a_large_batch_rolls_once(tmp_path):
+    log = EventLog(str(tmp_path), segment_size=5)
+    log.append_many([_event(i) for i in range(12)])
+    assert log.stats() == {"segments": 1, "segment_events": 12, "tail_events": 0}
+
+def test_type_and_camera_filters(tmp_path, loads):
+    log = EventLog(str(tmp_path), segment_size=3)
+    log.append_many([_event(i, 'collision') for i in range(3)])
+    log.append_many([_event(i, 'speeding', camera_id='cam_2') for i in range(3, 6)])
+    assert log.count_by_type(types=['speeding']) == {'speeding': 3}
+    assert loads == [] # No speeding events in segment 0, segment 1 only speeding
+    assert log.count_by_type(camera_id='cam_2') == {'speeding': 3}
+    assert log.count_by_type(camera_id='cam_3') == {}
+
+def test_histogram_buckets(tmp_path):
+    log = EventLog(str(tmp_path), segment_size=4)
+    log.append_many([_event(i, minutes=i * 20) for i in range(6)]) # 10:00 .. 11:40
+    hourly = log.histogram(bucket_seconds=3600)
+    assert [row['counts'] for row in hourly] == [{'collision': 3}, {'collision': 3}]
+    assert hourly[0]['bucket_start'] == T0.timestamp()
+
+def test_bad_timestamp_raises(tmp_path):
+    log = EventLog(str(tmp_path))
+    with pytest.raises(ValueError):
+        log.count_by_type(since='last tuesday')
@@ -0,0 +1,70 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+def _jpeg(value=128):
+    ret, buffer = cv2.imencode('.jpg', np.full((480, 640, 3), value, np.uint8))
+    return buffer.tobytes()
+
+def _age(store, image_hash, seconds):
+    old = time.time() - seconds
+    os.utime(store.path_for(image_hash), (old, old))
+
+def test_identical_images_share_one_file(store):
+    image = _jpeg()
+    image_hash = store.put(image)
+    assert store.put(image) == image_hash
+    assert store.get(image_hash) == image
+    assert store.path_for(image_hash).endswith(os.path.join(image_hash[:2], image_hash[2:4], f"{image_hash}.jpg"))
+    store.wait()
+    thumb = cv2.imdecode(np.frombuffer(store.get_thumbnail(image_hash), np.uint8), cv2.IMREAD_COLOR)
+    assert thumb.shape[1] == store.thumb_width
+
+def test_unused_image_is_deleted(store):
+    image_hash = store.put(_jpeg())
+    store.wait()
+    _age(store, image_hash, 60)
+    assert store.delete_unless_used(image_hash, time.time() - 30, lambda h: False)
+    assert not store.exists(image_hash)
+    assert not os.path.exists(store.thumb_path_for(image_hash))
+
+def test_put_after_tombstone_keeps_the_file(store):
+    image = _jpeg()
+    image_hash = store.put(image)
+    _age(store, image_hash, 60)
+    since = time.time() - 30
+    store.put(image) # Stored again after the rows went away: mtime >= since
+    assert not store.delete_unless_used(image_hash, since, lambda h: False)
+    assert store.get(image_hash) == image
+
+def test_put_racing_the_sweep_is_not_lost(store):
+    image = _jpeg()
+    image_hash = store.put(image)
+    _age(store, image_hash, 60)
+
+    def concurrent_put(h):
+        # Runs while the file is moved aside: put() must not see a stale file
+        assert not store.exists(h)
+        store.put(image, thumbnail=False)
+        return False
+
+    store.delete_unless_used(image_hash, time.time() - 30, concurrent_put)
+    assert store.get(image_hash) == image
+    assert not any(name.endswith('.sweep') for name in os.listdir(os.path.dirname(store.path_for(image_hash))))
+
+def test_referenced_image_is_put_back(store):
+    image = _jpeg()
+    image_hash = store.put(image)
+    _age(store, image_hash, 60)
+    assert not store.delete_unless_used(image_hash, time.time() - 30, lambda h: True)
+    assert store.get(image_hash) == image
+
+def test_keep_thumbnail(store):
+    image_hash = store.put(_jpeg())
+    store.wait()
+    _age(store, image_hash, 60)
+    assert store.delete_unless_used(image_hash, time.time() - 30, lambda h: False, keep_thumbnail=True)
+    assert not store.exists(image_hash)
+    assert store.get_thumbnail(image_hash) is not None
@@ -0,0 +1,81 @@
+import os
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from src.services.retention_service import RetentionJob, RetentionPolicy
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+def _jpeg(value):
+    ret, buffer = cv2.imencode('.jpg', np.full((120, 160, 3), value, np.uint8))
+    return buffer.tobytes()
+
+def _insert(db, v_type, timestamp, image):
+    db.insert_many([{'type': v_type, 'vehicle_id': 'id_1', 'timestamp': timestamp, 'image_bytes': image}])
+    db.store.wait()
+    image_hash = db.store.hash_bytes(image)
+    old = time.time() - 3600 # Stored long before the sweep runs
+    os.utime(db.store.path_for(image_hash), (old, old))
+    return image_hash
+
+def _job(db, tmp_path, **policy):
+    policy = {'ttl_days': {'collision': 365}, 'default_ttl_days': 30, 'archive_after_days': 1000,
+              'max_store_bytes': None, **policy}
+    # Negative grace: tombstones of this run are already due for the next sweep
+    return RetentionJob(db, RetentionPolicy(**policy), archive_root=str(tmp_path / "archive"),
+                        pause_seconds=0, sweep_grace_seconds=-1.0)
+
+def test_expiry_follows_per_type_ttl(db, tmp_path):
+    old_speeding = _insert(db, 'speeding', '2024-03-01 10:00:00', _jpeg(10))
+    old_collision = _insert(db, 'collision', '2024-03-01 10:00:00', _jpeg(20))
+    _insert(db, 'speeding', '2024-05-25 10:00:00', _jpeg(30))
+
+    stats = _job(db, tmp_path).run_once(NOW)
+    assert stats['expired'] == 1
+    assert sorted(r['violation_type'] for r in db.iter_evidence()) == ['collision', 'speeding']
+    # The file goes in the next sweep, not with the row
+    assert db.tombstoned_images() == [old_speeding]
+    assert db.store.exists(old_speeding)
+
+    assert _job(db, tmp_path).run_once(NOW)['swept'] == 1
+    assert not db.store.exists(old_speeding)
+    assert db.store.exists(old_collision)
+    assert db.tombstoned_images() == []
+
+def test_shared_image_survives_until_its_last_row(db, tmp_path):
+    image = _jpeg(40)
+    image_hash = _insert(db, 'speeding', '2024-03-01 10:00:00', image)
+    _insert(db, 'speeding', '2024-05-25 10:00:00', image)
+
+    job = _job(db, tmp_path)
+    assert job.run_once(NOW)['expired'] == 1
+    assert db.tombstoned_images() == []
+    job.run_once(NOW)
+    assert db.store.get(image_hash) == image
+
+def test_grace_period_and_reinsert_keep_the_file(db, tmp_path):
+    image = _jpeg(50)
+    image_hash = _insert(db, 'speeding', '2024-03-01 10:00:00', image)
+    assert db.delete_evidence_before('2024-04-01') == 1
+    assert db.sweep_images(grace_seconds=300) == 0 # Still inside the grace period
+
+    # Same capture stored again before the sweep: a hot row references it
+    _insert(db, 'speeding', '2024-05-30 10:00:00', image)
+    assert db.sweep_images(grace_seconds=-1.0) == 0
+    assert db.store.get(image_hash) == image
+    assert db.tombstoned_images() == []
+
+def test_archive_tier_serves_images_from_the_zip(db, tmp_path):
+    image = _jpeg(60)
+    image_hash = _insert(db, 'collision', '2024-05-01 10:00:00', image)
+    evidence_id = next(db.iter_evidence())['id']
+
+    job = _job(db, tmp_path, archive_after_days=7)
+    assert job.run_once(NOW)['archived'] == 1
+    job.run_once(NOW) # Sweeps the hot copy
+    assert not db.store.exists(image_hash)
+    assert db.get_evidence_image(evidence_id) == image
+    assert db.get_evidence_thumbnail(evidence_id) is not None
@@ -0,0 +1,59 @@
+import math
+import random
+
+import pytest
+
+from src.services.safety_score import SafetyScore
+
+def test_penalty_decays_exponentially():
+    score = SafetyScore(decay_rate=0.9)
+    assert score.add('collision', 'id_1', now=0.0)
+    assert score.score(0.0) == pytest.approx(50.0)
+    assert score.score(5.0) == pytest.approx(100 - 50 * 0.9 ** 5)
+
+def test_active_violation_is_penalized_once():
+    score = SafetyScore()
+    assert score.add('speeding', 'id_1', now=0.0)
+    assert not score.add('speeding', 'id_1', now=1.0)
+    assert score.add('wrong_way', 'id_1', now=1.0) # Other type, same vehicle
+    assert score.add('speeding', None, now=1.0) and score.add('speeding', None, now=1.0) # No id: one-off
+    assert score.active_count == 4
+
+def test_penalties_expire_in_fifo_order():
+    score = SafetyScore(decay_rate=0.9, expiry_fraction=0.01)
+    lifetime = math.log(0.01) / math.log(0.9)
+    score.add('collision', 'id_1', now=0.0)
+    score.add('red_light', 'id_2', now=10.0)
+
+    t = lifetime + 1.0 # First penalty expired, second still active
+    assert score.score(t) == pytest.approx(100 - 25 * 0.9 ** (t - 10.0))
+    assert score.active_count == 1
+    assert score.add('collision', 'id_1', now=t) # Expired keys can be penalized again
+    assert not score.add('red_light', 'id_2', now=t)
+
+    assert score.score(t + lifetime) == 100.0 # Nothing active: exactly the base, no drift
+    assert score.active_count == 0
+
+def test_matches_a_full_rescan():
+    rng = random.Random(0)
+    score = SafetyScore(decay_rate=0.92, expiry_fraction=0.01)
+    live = {} # key -> (added_at, penalty), what a rescan over all violations would sum
+    t = 0.0
+    for _ in range(2000):
+        t += rng.expovariate(5.0)
+        v_type = rng.choice(list(SafetyScore.PENALTY_MAP) + ['unknown'])
+        key = (f"id_{rng.randrange(20)}", v_type)
+        live = {k: v for k, v in live.items() if t - v[0] < score.lifetime}
+        score.add(v_type, key[0], now=t)
+        if key not in live:
+            live[key] = (t, SafetyScore.PENALTY_MAP.get(v_type, SafetyScore.DEFAULT_PENALTY))
+        expected = max(0.0, 100 - sum(p * 0.92 ** (t - added) for added, p in live.values()))
+        assert score.score(t) == pytest.approx(expected, abs=1e-6)
+    assert score.active_count == len(live)
+
+def test_update_reads_head_events():
+    score = SafetyScore(decay_rate=0.9)
+    events = [{'type': 'collision', 'data': {'id': 'id_1'}}, {'type': 'collision', 'data': {'id': 'id_1'}},
+              {'type': 'stalled_vehicle', 'data': {}}]
+    assert score.update(events, now=0.0) == pytest.approx(40.0)
+    assert score.update([], now=1.0) == pytest.approx(100 - 60 * 0.9)
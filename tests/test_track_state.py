@@ -0,0 +1,62 @@
+import numpy as np
+
+from src.core.results import LiteResults
+from src.utils.stopped_vehicle_utils import StoppedVehicleDetector
+from src.utils.track_state import TrackStateCache
+
+def test_entries_expire_ttl_ticks_after_last_touch():
+    cache = TrackStateCache(ttl=5)
+    cache.set('a', 1, now=0)
+    cache.set('b', 2, now=2)
+    assert cache.evict(5) == []
+    cache.touch('a', 4) # Seen again: now newer than 'b'
+    assert cache.evict(7) == [] # Exactly ttl ticks: still kept
+    assert cache.evict(8) == [('b', 2)]
+    assert cache.evict(9) == []
+    assert cache.evict(10) == [('a', 1)]
+    assert len(cache) == 0 and cache.evicted == 2
+
+def test_lru_cap_drops_the_least_recently_touched():
+    cache = TrackStateCache(ttl=100, max_entries=3)
+    for i, key in enumerate('abc'):
+        cache.set(key, i, now=i)
+    cache.touch('a', 3)
+    cache.set('d', 3, now=4)
+    assert list(cache.keys()) == ['c', 'a', 'd']
+    assert 'b' not in cache and cache.evicted == 1
+    assert cache.memory_stats() == {"entries": 3, "evicted": 1, "max_entries": 3}
+
+def test_set_and_touch_keep_last_touch_order():
+    cache = TrackStateCache(ttl=10)
+    cache.set('a', 1, now=0)
+    cache.set('b', 2, now=1)
+    cache.set('a', 3, now=2) # Overwrite moves to the back
+    cache.touch('missing', 3)
+    assert list(cache.items()) == [('b', 2), ('a', 3)]
+    assert cache.last_seen('a') == 2 and cache.last_seen('missing') is None
+    assert cache.pop('b') == 2 and cache.get('b', 'gone') == 'gone'
+
+def test_churning_ids_stay_bounded():
+    cache = TrackStateCache(ttl=30)
+    for frame in range(10000):
+        cache.set(f"id_{frame}", frame, now=frame) # A new id every frame, none seen again
+        cache.evict(frame)
+    assert len(cache) == 31
+    assert cache.evicted == 10000 - 31
+
+def _frame(parked):
+    if not parked:
+        return LiteResults(np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+    return LiteResults(np.array([[600., 300., 660., 340.]]), np.array([2]), np.array([1]))
+
+def test_lost_track_is_evicted_and_its_stall_ended():
+    detector = StoppedVehicleDetector(fps=10, time_threshold=2, lost_ttl_frames=5)
+    events = []
+    for frame in range(60):
+        anomalies, _ = detector.detect_stopped_vehicle(None, _frame(parked=frame < 30))
+        events.extend((frame, e['type'], e['status']) for e in anomalies)
+
+    # Stalled after 2 s of video; cleared once the track was lost for more than 5 frames
+    assert events == [(20, 'stalled_vehicle', 'VIOLATION_START'), (35, 'stalled_vehicle', 'VIOLATION_END')]
+    assert detector.memory_stats() == {"vehicle_positions": {"entries": 0, "evicted": 1, "max_entries": 10000},
+                                       "stalled_ids": 0}